@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+"""Conditional and compressed JSON responses for the code-carrying endpoints.
+
+`json_response` serializes a payload once and answers `If-None-Match` with
+304 when given an ETag. It compresses the body with brotli (optional
+`brotli` package) or gzip, according to `Accept-Encoding`. Bodies below
+`compression_min_bytes` are sent as they are.
+
+`cached_json_response` is for immutable representations (the code of a
+version): the serialized and compressed bodies are kept in `body_cache`, an
+LRU bounded by total bytes and keyed on (key, encoding), so polling clients
+cost a dict lookup. Cached bodies are compressed harder (brotli 9 / gzip 9,
+~11 ms for a 130 KB page, once per version) than per-request ones (level 5).
+
+ETags get a "-br" / "-gzip" suffix per encoding, as different encodings are
+different representations. `is_not_modified` ignores the suffix. A 304
+carries the ETag the 200 would: the same encoding decision when the body
+size is known, otherwise the tag the client sent (the one a 200 gave it).
+"""
+
+import asyncio
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from app.core.config import get_settings
+
+try:  # optional: preferred over gzip when installed and accepted
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+_INLINE_BYTES = 64 * 1024  # larger bodies are compressed in a worker thread
+_LEVELS = {"br": (5, 9), "gzip": (5, 9)}  # (per request, cached)
+
+
+def negotiate(accept_encoding: str) -> str:
+    """Best supported coding in an Accept-Encoding header: "br", "gzip" or "identity"."""
+    accepted: dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name] = q
+    wildcard = accepted.get("*", 0.0)
+    for coding in ("br", "gzip"):
+        if coding == "br" and brotli is None:
+            continue
+        if accepted.get(coding, wildcard) > 0:
+            return coding
+    return "identity"
+
+
+def compress(body: bytes, encoding: str, cached: bool = False) -> bytes:
+    if encoding == "identity":
+        return body
+    level = _LEVELS[encoding][1 if cached else 0]
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    return gzip.compress(body, compresslevel=level, mtime=0)  # mtime=0: same bytes every time
+
+
+def tagged(etag: str, encoding: str) -> str:
+    if encoding == "identity":
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """True if If-None-Match names `etag` (weak comparison, any encoding suffix)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    want = _bare(etag)
+    return any(tag.strip() == "*" or _bare(tag) == want for tag in header.split(","))
+
+
+def _matching_tag(request: Request, etag: str) -> Optional[str]:
+    """The If-None-Match entry that names `etag` (with its encoding suffix), if any."""
+    want = _bare(etag)
+    for tag in request.headers.get("if-none-match", "").split(","):
+        if tag.strip() != "*" and _bare(tag) == want:
+            return tag.strip()
+    return None
+
+
+def _bare(tag: str) -> str:
+    tag = tag.strip().removeprefix("W/")
+    for suffix in ('-br"', '-gzip"'):
+        if tag.endswith(suffix):
+            return tag[: -len(suffix)] + '"'
+    return tag
+
+
+class BodyCache:
+    """LRU of encoded response bodies, bounded by total bytes (thread-safe)."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key: tuple, body: bytes) -> None:
+        if not self.max_bytes or len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+body_cache = BodyCache(get_settings().body_cache_max_bytes)
+
+
+def _dumps(payload: Any) -> bytes:
+    if isinstance(payload, BaseModel):
+        return payload.model_dump_json().encode("utf-8")
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+async def _encode(body: bytes, encoding: str, cached: bool) -> bytes:
+    if len(body) > _INLINE_BYTES:
+        return await asyncio.to_thread(compress, body, encoding, cached)
+    return compress(body, encoding, cached)
+
+
+def _encoding_for(request: Request, size: Optional[int] = None) -> str:
+    s = get_settings()
+    if not s.response_compression or (size is not None and size < s.compression_min_bytes):
+        return "identity"
+    return negotiate(request.headers.get("accept-encoding", ""))
+
+
+def _headers(etag: Optional[str], encoding: str, cache_control: Optional[str]) -> dict:
+    headers = {"Vary": "Accept-Encoding"}
+    if etag is not None:
+        headers["ETag"] = tagged(etag, encoding)
+    if cache_control is not None:
+        headers["Cache-Control"] = cache_control
+    return headers
+
+
+def _response(body: bytes, encoding: str, headers: dict, status_code: int) -> Response:
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+def not_modified(
+    request: Request, etag: str, cache_control: Optional[str] = None, size: Optional[int] = None
+) -> Response:
+    """304 for a matching If-None-Match; `size` is the uncompressed body size, if known."""
+    headers = _headers(etag, _encoding_for(request, size), cache_control)
+    if size is None:
+        headers["ETag"] = _matching_tag(request, etag) or headers["ETag"]
+    return Response(status_code=304, headers=headers)
+
+
+async def json_response(
+    request: Request,
+    payload: Any,
+    etag: Optional[str] = None,
+    cache_control: Optional[str] = None,
+    status_code: int = 200,
+) -> Response:
+    """`payload` (dict or pydantic model) as JSON, compressed per request; 304 if `etag` matches."""
+    body = _dumps(payload)
+    if etag is not None and is_not_modified(request, etag):
+        return not_modified(request, etag, cache_control, len(body))
+    encoding = _encoding_for(request, len(body))
+    body = await _encode(body, encoding, cached=False)
+    return _response(body, encoding, _headers(etag, encoding, cache_control), status_code)
+
+
+async def cached_json_response(
+    request: Request,
+    key: Hashable,
+    build: Callable[[], Awaitable[Any]],
+    etag: str,
+    cache_control: Optional[str] = None,
+) -> Response:
+    """Like `json_response` for an immutable payload: `build()` runs only on a cache miss."""
+    if is_not_modified(request, etag):
+        raw = body_cache.get((key, "identity"))
+        return not_modified(request, etag, cache_control, None if raw is None else len(raw))
+    encoding = _encoding_for(request)
+    body = body_cache.get((key, encoding))
+    if body is None:
+        raw = body_cache.get((key, "identity"))
+        if raw is None:
+            raw = _dumps(await build())
+            body_cache.put((key, "identity"), raw)
+        if len(raw) < get_settings().compression_min_bytes:
+            encoding = "identity"
+        body = raw if encoding == "identity" else await _encode(raw, encoding, cached=True)
+        if encoding != "identity":
+            body_cache.put((key, encoding), body)
+    return _response(body, encoding, _headers(etag, encoding, cache_control), 200)
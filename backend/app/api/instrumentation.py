@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+"""ASGI middleware timing every HTTP request by route template.
+
+Pure ASGI rather than `BaseHTTPMiddleware`, so streamed responses (SSE) pass
+through untouched and are timed until their last byte. WebSocket connections
+are not timed; their turns show up in the LLM and pipeline metrics.
+"""
+
+import time
+
+from app.core import metrics
+
+
+class MetricsMiddleware:
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500  # if the app raises before starting a response
+
+        async def send_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            # The router stores the matched route in the (shared) scope.
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.http_request_seconds.labels(scope["method"], route, status).observe(time.perf_counter() - start)
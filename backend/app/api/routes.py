@@ -1,10 +1,28 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+import asyncio
+import hashlib
+import time
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from starlette.requests import HTTPConnection
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from app.services.repository import repo, CodeVersion
-from app.graphs.agent import run_generation
-from app.services.llm import LLMAccessError
+from typing import AsyncIterator, Awaitable, Callable, Literal, Optional
+from app.services import diff as diff_service
+from app.services.repository import repo, VersionConflictError
+from app.services.versions import CodeVersion
+from app.services.session_locks import coordinator
+from app.services.admission import PRIORITIES, AdmissionRejected, admission, resolve_priority
+from app.graphs.agent import run_generation, stream_generation
+from app.graphs.pipeline import GenerationValidationError
+from app.services.llm import LLMAccessError, LLMUnavailableError
+from app.api import http_cache
+from app.api.ws_frames import BATCHED_TYPES, FrameSender, TokenBatcher
+from app.core import metrics
+from app.core.config import get_settings
+from vibe_core.sse import sse_event
 
 
 router = APIRouter()
@@ -16,164 +34,657 @@ class CreateSessionResponse(BaseModel):
 
 class MessageRequest(BaseModel):
     message: str
+    mode: Optional[Literal["full", "patch"]] = None  # default: Settings.edit_mode
+    # Optimistic concurrency: fail with 409 unless this is still the current version.
+    base_version: Optional[int] = None
+    cache: bool = True  # False: skip the reply cache for this request
+    # SSE only (Accept: text/event-stream): stream code_delta / diff_hunk events; default WS_LIVE_CODE.
+    live: Optional[bool] = None
+    diff: bool = True  # False: skip the diff (response diff is null); computed when the version is read
 
 
 class MessageResponse(BaseModel):
     assistant_message: str  # processed (MVP 等同 raw)
     assistant_message_raw: str
     code: str
-    diff: str
+    diff: Optional[str]  # None when the request set diff=false
+    version: int
+    mode: str = "full"  # "full" | "patch" | "patch_fallback"
+    output_tokens_saved: int = 0
+    continuations: int = 0  # "continue" calls that completed a reply cut off at GENERATION_MAX_TOKENS
+    timings: dict[str, float] = {}  # milliseconds per pipeline node
+    # prompt_tokens, cached_prompt_tokens (provider prompt cache hits), completion_tokens
+    usage: dict[str, int] = {}
+
+
+class VersionInfo(BaseModel):
     version: int
+    content_hash: str  # sha1 of the code; also the version's ETag
+    summary: Optional[str] = None
+    created_at: datetime
+    origin: str  # "generation" | "rollback"
+    size: int  # characters
+
+
+class VersionListResponse(BaseModel):
+    session_id: str
+    current_version: int
+    versions: list[VersionInfo]  # newest first
+    next_before: Optional[int] = None  # pass as ?before= to get the next (older) page
+
+
+class VersionResponse(VersionInfo):
+    code: str
+
+
+class DiffResponse(BaseModel):
+    from_version: int
+    to_version: int
+    diff: str
 
 
 @router.post("/sessions", response_model=CreateSessionResponse)
-def create_session():
-    session = repo.create_session()
+async def create_session():
+    session = await repo.acreate_session()
     return CreateSessionResponse(session_id=session.id)
 
 
+def _parse_fields(fields: Optional[str]) -> Optional[set[str]]:
+    """`fields=code,version` -> the MessageResponse fields to send (None: all)."""
+    if fields is None:
+        return None
+    wanted = {f.strip() for f in fields.split(",") if f.strip()}
+    if not wanted or not wanted <= set(MessageResponse.model_fields):
+        raise HTTPException(status_code=422, detail="invalid_fields")
+    return wanted
+
+
+def _client_id(conn: HTTPConnection) -> str:
+    return conn.client.host if conn.client else "unknown"
+
+
+def _priority(conn: HTTPConnection, default: str) -> int:
+    return resolve_priority(conn.headers.get("x-priority"), default)
+
+
+def _too_many(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+
+
 @router.post("/sessions/{session_id}/messages", response_model=MessageResponse)
-def post_message(session_id: str, req: MessageRequest):
+async def post_message(session_id: str, req: MessageRequest, request: Request, fields: Optional[str] = None):
+    """`fields` (comma-separated) limits the response to those fields; leaving out `diff` skips computing it."""
+    wanted = _parse_fields(fields)
+    with_diff = req.diff and (wanted is None or "diff" in wanted)
     try:
-        session = repo.get_session(session_id)
+        session = await repo.aget_session(session_id)
     except KeyError:
         raise HTTPException(status_code=404, detail="session_not_found")
+    streaming = "text/event-stream" in request.headers.get("accept", "")
+    if streaming and req.base_version is not None and req.base_version != session.current_version:
+        raise HTTPException(
+            status_code=409, detail="version_conflict", headers={"X-Current-Version": str(session.current_version)}
+        )
+    if streaming:
+        try:
+            admission.check(_client_id(request), session_id)
+        except AdmissionRejected as e:
+            raise _too_many(e) from e
+        return StreamingResponse(
+            _sse_stream(session_id, req, _priority(request, "interactive")),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    base = req.base_version if req.base_version is not None else session.current_version
+    priority = _priority(request, "normal")
+
+    async def generate() -> dict:
+        # The slot is taken under the session lock, so turns queued behind it hold none.
+        async with admission.slot(priority):
+            # Re-read under the session lock: a queued turn must see the previous one's result.
+            current = await repo.aget_session(session_id)
+            return await run_generation(current, req.message, req.mode, req.base_version, req.cache, with_diff)
+
     try:
-        result = run_generation(session, req.message)
-        return MessageResponse(**result)
+        # Coalesced duplicates share the leader's generation and are not charged a token.
+        result = await coordinator.run_coalesced(
+            (session_id, req.message, base, req.mode, req.cache, with_diff),
+            session_id,
+            generate,
+            admit=lambda: admission.check(_client_id(request), session_id),
+        )
+        return await http_cache.json_response(request, MessageResponse(**result).model_dump(include=wanted))
+    except AdmissionRejected as e:
+        raise _too_many(e) from e
+    except VersionConflictError as e:
+        raise HTTPException(
+            status_code=409, detail="version_conflict", headers={"X-Current-Version": str(e.actual)}
+        ) from e
     except LLMAccessError as e:
         raise HTTPException(status_code=403, detail="llm_permission_denied") from e
+    except LLMUnavailableError as e:
+        raise HTTPException(status_code=503, detail="llm_unavailable") from e
+    except GenerationValidationError as e:
+        raise HTTPException(status_code=502, detail="invalid_generation") from e
+
+
+async def _sse_stream(
+    session_id: str, req: MessageRequest, priority: int = PRIORITIES["interactive"]
+) -> AsyncIterator[str]:
+    """Server-Sent Events variant of a message turn, same events as the WebSocket.
+
+    Generation runs in a task feeding a queue, so batching timers work exactly
+    as on the socket. If the client disconnects, Starlette cancels this
+    iterator and the task (with its upstream LLM stream) is cancelled too.
+    """
+    settings = get_settings()
+    queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+
+    async def send(event: dict) -> None:
+        queue.put_nowait(sse_event(event))
+
+    async def produce() -> None:
+        batcher = TokenBatcher(send, settings.ws_batch_window_ms / 1000, settings.ws_batch_max_bytes)
+        live = settings.ws_live_code if req.live is None else req.live
+        try:
+            async with coordinator.lock(session_id):
+                try:
+                    session = await repo.aget_session(session_id)
+                except KeyError:
+                    await send({"type": "error", "detail": "session_not_found"})
+                    return
+                try:
+                    async with admission.slot(priority):
+                        events = stream_generation(
+                            session, req.message, req.base_version, req.cache, live=live, with_diff=req.diff
+                        )
+                        await _pump(events, batcher, send)
+                except AdmissionRejected as e:
+                    await send(_error_event(e))
+        finally:
+            queue.put_nowait(None)
+
+    task = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            yield item
+    finally:
+        if not task.done():
+            task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
 
 
 @router.get("/sessions/{session_id}/code")
-def get_code(session_id: str):
+async def get_code(session_id: str, request: Request):
+    """Current code; ETag per (session, version), encoded bodies cached per version."""
     try:
-        session = repo.get_session(session_id)
+        session = await repo.aget_session(session_id)
     except KeyError:
         raise HTTPException(status_code=404, detail="session_not_found")
-    return {"code": session.code or ""}
+    code = session.code or ""
 
-# ---- WebSocket streaming (MVP) ----
-from app.services import llm as llm_service, diff as diff_service
-from app.core import prompts
-from langchain_core.messages import SystemMessage, HumanMessage
-from datetime import datetime
+    async def build() -> dict:
+        return {"code": code}
+
+    version = session.current_version
+    return await http_cache.cached_json_response(
+        request, ("code", session_id, version), build, f'"{session_id}-{version}"', "no-cache"
+    )
+
+# ---- Version history ----
+def _version_info(entry: CodeVersion) -> VersionInfo:
+    return VersionInfo(
+        version=entry.version,
+        content_hash=entry.content_hash,
+        summary=entry.summary,
+        created_at=entry.created_at,
+        origin=entry.origin,
+        size=entry.size,
+    )
+
+
+@router.get("/sessions/{session_id}/versions", response_model=VersionListResponse)
+async def list_versions(
+    session_id: str,
+    request: Request,
+    before: Optional[int] = Query(None, ge=1),
+    limit: int = Query(50, ge=1, le=200),
+):
+    """Version metadata, newest first, `limit` per page (no code bodies)."""
+    try:
+        session = await repo.aget_session(session_id)
+        entries = await repo.alist_versions(session_id, before, limit)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="session_not_found")
+    oldest = entries[-1].version if entries else None
+    page = VersionListResponse(
+        session_id=session_id,
+        current_version=session.current_version,
+        versions=[_version_info(e) for e in entries],
+        next_before=oldest if oldest is not None and oldest > 1 and len(entries) == limit else None,
+    )
+    # Versions are append-only, so a page only changes when the session moves on.
+    return await http_cache.json_response(request, page, f'W/"{session.current_version}"', "no-cache")
+
+
+@router.get("/sessions/{session_id}/versions/{version}", response_model=VersionResponse)
+async def get_version(session_id: str, version: int, request: Request):
+    try:
+        entry = await repo.aget_version(session_id, version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="session_not_found")
+    if entry is None:
+        raise HTTPException(status_code=404, detail="version_not_found")
+
+    async def build() -> VersionResponse:
+        code = await repo.aget_version_code(session_id, version)
+        return VersionResponse(**_version_info(entry).model_dump(), code=code)
+
+    # A version never changes once written.
+    return await http_cache.cached_json_response(
+        request,
+        ("version", session_id, version),
+        build,
+        f'"{entry.content_hash}"',
+        "private, max-age=31536000, immutable",
+    )
+
+
+@router.get("/sessions/{session_id}/diff", response_model=DiffResponse)
+async def get_diff(
+    session_id: str,
+    request: Request,
+    from_version: Optional[int] = Query(None, alias="from", ge=0),
+    to_version: Optional[int] = Query(None, alias="to", ge=0),
+):
+    """Unified diff between two versions (0 = empty page); defaults: `to` current, `from` its predecessor.
+
+    Diffs between consecutive versions are the stored ones (computed on first
+    read if deferred); other pairs are computed on demand.
+    """
+    try:
+        session = await repo.aget_session(session_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="session_not_found")
+    to = session.current_version if to_version is None else to_version
+    frm = max(0, to - 1) if from_version is None else from_version
+    if max(frm, to) > session.current_version:
+        raise HTTPException(status_code=404, detail="version_not_found")
+    hashes = []
+    for n in (frm, to):
+        entry = await repo.aget_version(session_id, n) if n else None
+        hashes.append(entry.content_hash if entry is not None else "")
+    etag = '"' + hashlib.sha1(f"{hashes[0]}:{hashes[1]}".encode()).hexdigest() + '"'
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified(request, etag, "no-cache")
+    if hashes[0] == hashes[1]:
+        text = ""
+    elif frm == to - 1:
+        text = await repo.aget_version_diff(session_id, to)
+    else:
+        old = await repo.aget_version_code(session_id, frm) if frm else ""
+        new = await repo.aget_version_code(session_id, to) if to else ""
+        text = await diff_service.aunified_diff(old, new)
+    return await http_cache.json_response(
+        request, DiffResponse(from_version=frm, to_version=to, diff=text), etag, "no-cache"
+    )
+
+
+# ---- WebSocket streaming ----
 
 
 @router.websocket("/ws/sessions/{session_id}")
 async def websocket_session(websocket: WebSocket, session_id: str):
+    """Long-lived, multi-turn session socket.
+
+    Client frames: `user_message` {message, base_version?, diff?}, `cancel`, `ping`,
+    `resume` {version}. Server frames: ack, token (batched), assistant_message_complete,
+    code, diff, version, final per turn; cancelled, pong, ping (keepalive), sync, error.
+    With `live=1` (default `WS_LIVE_CODE`) turns also stream `code_delta` and
+    `diff_hunk` frames while tokens arrive.
+    Query parameters: `encoding` (json|msgpack), `batch_ms`, `batch_bytes`, `live`,
+    `priority` (batch lowers this socket's turns in the admission queue). A turn
+    refused by admission control gets an error frame with `retry_after`.
+    """
+    settings = get_settings()
+    params = websocket.query_params
     await websocket.accept()
+    try:
+        sender = FrameSender(websocket, params.get("encoding", "json"))
+        batch_window = float(params.get("batch_ms", settings.ws_batch_window_ms)) / 1000
+        batch_bytes = int(params.get("batch_bytes", settings.ws_batch_max_bytes))
+        live = params.get("live", "1" if settings.ws_live_code else "0") not in ("0", "false", "no")
+        priority = resolve_priority(params.get("priority"), "interactive")
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "detail": str(e) if str(e).isidentifier() else "invalid_params"})
+        await websocket.close(code=4400)
+        return
+    turn: Optional[asyncio.Task] = None
+    persisting = asyncio.Event()
     try:
         try:
-            session = repo.get_session(session_id)
+            await repo.aget_session(session_id)
         except KeyError:
-            await websocket.send_json({"type": "error", "detail": "session_not_found"})
+            await sender.send({"type": "error", "detail": "session_not_found"})
             await websocket.close(code=4404)
             return
 
-        first = await websocket.receive_json()
-        if first.get("type") != "user_message" or "message" not in first:
-            await websocket.send_json({"type": "error", "detail": "expected user_message"})
-            await websocket.close(code=4400)
-            return
-        user_message = first["message"]
-        repo.add_message(session.id, "user", user_message)
-        await websocket.send_json({"type": "ack"})
-
-        existing_code = session.code or ""
-        user_content = prompts.USER_INSTRUCTION_TEMPLATE.format(
-            message=user_message, existing_code=existing_code
-        )
-        messages = [
-            SystemMessage(content=prompts.SYSTEM_PROMPT),
-            HumanMessage(content=user_content),
-        ]
-        try:
-            model_name = next(llm_service.iter_models())
-        except StopIteration:
-            await websocket.send_json({"type": "error", "detail": "no_model_configured"})
-            await websocket.close(code=4500)
-            return
-        llm = llm_service.build_llm(model_name)
-        raw_parts: list[str] = []
-        previous_code = session.code or ""
-        try:
-            async for chunk in llm.astream(messages):  # type: ignore[attr-defined]
-                token = chunk.content
-                if token:
-                    raw_parts.append(token)
-                    await websocket.send_json({"type": "token", "text": token})
-        except Exception as e:
-            await websocket.send_json({"type": "error", "detail": str(e)})
-            await websocket.close(code=1011)
-            return
-        raw_full = "".join(raw_parts)
-        code = llm_service.extract_code_block(raw_full) or raw_full
-        repo.add_message(session.id, "assistant", raw_full)
-        repo.update_code(session.id, code)
-        diff_text = diff_service.unified_diff(previous_code, code)
-        # Versioning (mirror logic from run_generation)
-        new_version_number = session.current_version + 1
-        version_entry = CodeVersion(
-            version=new_version_number,
-            code=code,
-            diff=diff_text,
-            summary=None,
-            created_at=datetime.utcnow(),
-            origin="generation",
-        )
-        session.versions.append(version_entry)
-        session.current_version = new_version_number
-        await websocket.send_json({"type": "assistant_message_complete", "raw": raw_full})
-        await websocket.send_json({"type": "code", "code": code})
-        await websocket.send_json({"type": "diff", "diff": diff_text})
-        await websocket.send_json({"type": "version", "version": new_version_number})
-        await websocket.send_json({"type": "final"})
+        idle_since = time.monotonic()
+        while True:
+            try:
+                frame = await asyncio.wait_for(sender.receive(), timeout=settings.ws_ping_interval or None)
+            except asyncio.TimeoutError:
+                busy = turn is not None and not turn.done()
+                if not busy and settings.ws_idle_timeout and time.monotonic() - idle_since >= settings.ws_idle_timeout:
+                    await websocket.close(code=1000)
+                    return
+                await sender.send({"type": "ping"})
+                continue
+            except ValueError:
+                await sender.send({"type": "error", "detail": "invalid_frame"})
+                continue
+            idle_since = time.monotonic()
+            kind = frame.get("type") if isinstance(frame, dict) else None
+            if kind == "ping":
+                await sender.send({"type": "pong"})
+            elif kind == "pong":
+                pass
+            elif kind == "cancel":
+                if turn is None or turn.done():
+                    await sender.send({"type": "error", "detail": "no_active_turn"})
+                elif not persisting.is_set():  # past streaming the turn completes normally
+                    turn.cancel()
+            elif kind == "resume":
+                await _ws_resume(sender, session_id, frame.get("version"))
+            elif kind == "user_message" and "message" in frame:
+                if turn is not None and not turn.done():
+                    await sender.send({"type": "error", "detail": "turn_in_progress"})
+                    continue
+                try:
+                    admission.check(_client_id(websocket), session_id)
+                except AdmissionRejected as e:
+                    await sender.send(_error_event(e))
+                    continue
+                persisting = asyncio.Event()
+                batcher = TokenBatcher(sender.send, batch_window, batch_bytes)
+                turn = asyncio.create_task(
+                    _ws_turn(
+                        sender,
+                        batcher,
+                        persisting,
+                        session_id,
+                        frame["message"],
+                        frame.get("base_version"),
+                        live,
+                        frame.get("diff", True) is not False,
+                        priority,
+                    )
+                )
+                turn.add_done_callback(_consume_result)
+            else:
+                await sender.send({"type": "error", "detail": "expected user_message"})
     except WebSocketDisconnect:
         return
     finally:
+        if turn is not None and not turn.done():
+            turn.cancel()
+            await asyncio.gather(turn, return_exceptions=True)
         try:
             await websocket.close()
         except Exception:
             pass
 
 
+def _consume_result(task: asyncio.Task) -> None:
+    # Errors are reported to the client inside the turn; a send on a closed socket is not news.
+    if not task.cancelled():
+        task.exception()
+
+
+async def _ws_resume(sender: FrameSender, session_id: str, version: Optional[int]) -> None:
+    """Bring a reconnecting client from `version` up to the current one."""
+    try:
+        session = await repo.aget_session(session_id)
+    except KeyError:
+        await sender.send({"type": "error", "detail": "session_not_found"})
+        return
+    current = session.current_version
+    if version == current:
+        await sender.send({"type": "sync", "version": current, "up_to_date": True})
+        return
+    frame = {"type": "sync", "version": current, "up_to_date": False, "code": session.code or ""}
+    if isinstance(version, int) and 0 <= version < current:
+        base = await repo.aget_version_code(session.id, version) if version else ""
+        frame["diff"] = await diff_service.aunified_diff(base, session.code or "")
+    await sender.send(frame)
+
+
+async def _ws_turn(
+    sender: FrameSender,
+    batcher: TokenBatcher,
+    persisting: asyncio.Event,
+    session_id: str,
+    user_message: str,
+    base_version: Optional[int],
+    live: bool,
+    with_diff: bool = True,
+    priority: int = PRIORITIES["interactive"],
+) -> None:
+    """One generation turn; runs as a task so the socket can still receive `cancel`."""
+    try:
+        await _ws_run_turn(
+            sender, batcher, persisting, session_id, user_message, base_version, live, with_diff, priority
+        )
+    except asyncio.CancelledError:
+        try:
+            await sender.send({"type": "cancelled"})
+        except Exception:
+            pass
+        raise
+
+
+async def _ws_run_turn(
+    sender: FrameSender,
+    batcher: TokenBatcher,
+    persisting: asyncio.Event,
+    session_id: str,
+    user_message: str,
+    base_version: Optional[int],
+    live: bool,
+    with_diff: bool = True,
+    priority: int = PRIORITIES["interactive"],
+) -> None:
+    async with coordinator.lock(session_id):
+        # Re-read under the lock so this turn builds on any turn that just finished.
+        try:
+            session = await repo.aget_session(session_id)
+        except KeyError:
+            await sender.send({"type": "error", "detail": "session_not_found"})
+            return
+        try:
+            async with admission.slot(priority):
+                events = stream_generation(
+                    session, user_message, base_version, live=live, persisting=persisting, with_diff=with_diff
+                )
+                await _pump(events, batcher, sender.send)
+        except AdmissionRejected as e:
+            await sender.send(_error_event(e))
+
+
+async def _pump(events: AsyncIterator[dict], batcher: TokenBatcher, send: Callable[[dict], Awaitable[None]]) -> None:
+    """Forward generation events, batching streamed text; errors become an `error` event."""
+    try:
+        async for event in events:
+            if event["type"] in BATCHED_TYPES:
+                await batcher.add(event["text"], event["type"])
+            else:
+                await batcher.aclose()  # keep batched text ahead of the next event
+                await send(event)
+    except (asyncio.CancelledError, WebSocketDisconnect):
+        batcher.discard()
+        raise
+    except Exception as e:
+        batcher.discard()
+        await send(_error_event(e))
+    finally:
+        await events.aclose()
+
+
+def _error_event(e: Exception) -> dict:
+    if isinstance(e, VersionConflictError):
+        return {"type": "error", "detail": "version_conflict", "current_version": e.actual}
+    if isinstance(e, LLMAccessError):
+        return {"type": "error", "detail": "llm_permission_denied"}
+    if isinstance(e, LLMUnavailableError):
+        return {"type": "error", "detail": "llm_unavailable"}
+    if isinstance(e, GenerationValidationError):
+        return {"type": "error", "detail": "invalid_generation"}
+    if isinstance(e, AdmissionRejected):
+        return {"type": "error", "detail": e.reason, "retry_after": e.retry_after}
+    return {"type": "error", "detail": str(e)}
+
+
 # ---- Rollback Endpoint (MVP) ----
 @router.post("/sessions/{session_id}/rollback")
-def rollback_session(session_id: str, to: int):  # 'to' is target version number
+async def rollback_session(session_id: str, to: int, request: Request, diff: bool = True):  # 'to' is target version number
     try:
-        session = repo.get_session(session_id)
+        session = await repo.aget_session(session_id)
     except KeyError:
         raise HTTPException(status_code=404, detail="session_not_found")
-    target = next((v for v in session.versions if v.version == to), None)
-    if target is None:
-        raise HTTPException(status_code=404, detail="version_not_found")
-    if session.current_version == target.version:
-        return {
-            "version": session.current_version,
-            "code": session.code or "",
-            "diff": "",
-            "rolled_back": False,
-        }
-    previous_code = session.code or ""
-    # Apply rollback
-    session.code = target.code
-    diff_text = diff_service.unified_diff(previous_code, target.code)
-    new_version_number = session.current_version + 1
-    rollback_version = CodeVersion(
-        version=new_version_number,
-        code=target.code,
-        diff=diff_text,
-        summary=f"rollback to {target.version}",
-        created_at=datetime.utcnow(),
-        origin="rollback",
+    async with coordinator.lock(session.id):
+        with repo.pin(session.id):  # no eviction while the diff runs in a thread
+            session = await repo.aget_session(session_id)
+            target = await repo.aget_version(session.id, to)
+            if target is None:
+                raise HTTPException(status_code=404, detail="version_not_found")
+            if session.current_version == target.version:
+                return await http_cache.json_response(
+                    request,
+                    {"version": session.current_version, "code": session.code or "", "diff": "", "rolled_back": False},
+                )
+            previous_code = session.code or ""
+            # Apply rollback (the new version shares stored content with the target)
+            target_code = await repo.aget_version_code(session.id, target.version)
+            # diff=false skips it here; the new version computes it when first read.
+            diff_text = await diff_service.aunified_diff(previous_code, target_code) if diff else None
+            try:
+                rollback_version = await repo.aadd_version(
+                    session.id,
+                    target_code,
+                    diff_text,
+                    summary=f"rollback to {target.version}",
+                    origin="rollback",
+                    expected_version=session.current_version,
+                )
+            except VersionConflictError as e:
+                raise HTTPException(
+                    status_code=409, detail="version_conflict", headers={"X-Current-Version": str(e.actual)}
+                ) from e
+    return await http_cache.json_response(
+        request,
+        {
+            "version": rollback_version.version,
+            "code": target_code,
+            "diff": diff_text,
+            "rolled_back": True,
+            "rolled_back_from": target.version,
+        },
     )
-    session.versions.append(rollback_version)
-    session.current_version = new_version_number
+
+
+@router.get("/sessions/{session_id}/stats")
+async def get_session_stats(session_id: str):
+    """Memory footprint of a session (messages, current code, version history)."""
+    try:
+        session = await repo.aget_session(session_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="session_not_found")
+    footprint = await repo.afootprint(session.id)
+    return {"session_id": session.id, "current_version": session.current_version, **footprint}
+
+
+@router.get("/stats")
+async def get_stats():
+    """Process-level gauges: session store, locks, LLM client pool, model health, pipeline, repairs, diffs, caches, warm-up."""
+    from app.services.client_pool import client_pool
+    from app.services.diff import diff_stats
+    from app.services.generation_cache import generation_cache
+    from app.graphs.pipeline import pipeline_stats, repair_stats
+    from app.services.hedging import model_health
+    from app.services.warmup import warmup
+
+    sessions = await repo.astats()
     return {
-        "version": new_version_number,
-        "code": target.code,
-        "diff": diff_text,
-        "rolled_back": True,
-        "rolled_back_from": target.version,
+        "sessions": sessions,
+        "session_locks": coordinator.stats(),
+        "admission": admission.snapshot(),
+        "llm_client_pool": client_pool.snapshot(),
+        "llm_models": model_health.snapshot(),
+        "pipeline": pipeline_stats.snapshot(),
+        "repair": repair_stats.snapshot(),
+        "diff": diff_stats.snapshot(),
+        "http_body_cache": http_cache.body_cache.stats(),
+        "generation_cache": generation_cache.stats(),
+        "warmup": warmup.snapshot(),
     }
+
+
+# ---- Prometheus ----
+
+
+def _generation_cache_lookups():
+    from app.services.generation_cache import generation_cache
+
+    c = generation_cache.counters
+    return [(("memory_hit",), c["hits_memory"]), (("disk_hit",), c["hits_disk"]), (("miss",), c["misses"])]
+
+
+def _generation_cache_removals():
+    from app.services.generation_cache import generation_cache
+
+    c = generation_cache.counters
+    return [(("evicted",), c["evictions"]), (("expired",), c["expired"])]
+
+
+# Gauges are read from the stats objects at scrape time.
+metrics.Callback("vibe_admission_active", "Generations holding a slot.", lambda: [((), admission.active)])
+metrics.Callback("vibe_admission_queue_depth", "Generations waiting for a slot.", lambda: [((), admission.waiting)])
+metrics.Callback(
+    "vibe_session_locks",
+    "Sessions with a generation running or queued.",
+    lambda: [((), coordinator.stats()["locked_sessions"])],
+)
+metrics.Callback(
+    "vibe_coalesced_requests_total",
+    "Requests served by an identical in-flight generation.",
+    lambda: [((), coordinator.coalesced)],
+    kind="counter",
+)
+metrics.Callback(
+    "vibe_generation_cache_lookups_total",
+    "Reply cache lookups by result.",
+    _generation_cache_lookups,
+    ("result",),
+    kind="counter",
+)
+metrics.Callback(
+    "vibe_generation_cache_removals_total",
+    "Reply cache entries dropped, by reason (size bounds or TTL).",
+    _generation_cache_removals,
+    ("reason",),
+    kind="counter",
+)
+metrics.Callback(
+    "vibe_http_body_cache_bytes",
+    "Bytes of encoded response bodies cached.",
+    lambda: [((), http_cache.body_cache.stats()["bytes"])],
+)
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition: request, LLM, pipeline, diff, repo and admission metrics."""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+"""Framing helpers for the session WebSocket.
+
+`FrameSender` encodes frames as JSON text (default) or, with
+`?encoding=msgpack`, as msgpack binary frames (requires the optional
+`msgpack` package). Sends are serialized with a lock so frames from the token
+flush timer and the generation loop never interleave.
+
+`TokenBatcher` coalesces streamed text (tokens, and the live code deltas and
+diff hunks) into one frame per type per time window or per `max_bytes` of
+text, whichever comes first, instead of one frame per token.
+"""
+
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+try:  # optional binary framing
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    msgpack = None
+
+ENCODINGS = ("json", "msgpack")
+BATCHED_TYPES = ("token", "code_delta", "diff_hunk")
+
+
+class FrameSender:
+    def __init__(self, websocket: WebSocket, encoding: str = "json") -> None:
+        if encoding not in ENCODINGS:
+            raise ValueError("unsupported_encoding")
+        if encoding == "msgpack" and msgpack is None:
+            raise ValueError("msgpack_unavailable")
+        self.websocket = websocket
+        self.encoding = encoding
+        self._lock = asyncio.Lock()
+        self.frames = 0
+        self.bytes_sent = 0
+
+    async def send(self, frame: dict) -> None:
+        async with self._lock:
+            if self.encoding == "msgpack":
+                data = msgpack.packb(frame, use_bin_type=True)
+                await self.websocket.send_bytes(data)
+            else:
+                data = json.dumps(frame, ensure_ascii=False, separators=(",", ":"))
+                await self.websocket.send_text(data)
+            self.frames += 1
+            self.bytes_sent += len(data)
+
+    async def receive(self) -> Any:
+        """Next decoded client frame; raises WebSocketDisconnect, or ValueError on garbage."""
+        message = await self.websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        data = message.get("bytes")
+        if data is not None:
+            if self.encoding == "msgpack":
+                try:
+                    return msgpack.unpackb(data, raw=False)
+                except Exception as e:
+                    raise ValueError("invalid_frame") from e
+            return json.loads(data)
+        return json.loads(message.get("text") or "")
+
+
+class TokenBatcher:
+    def __init__(self, send: Callable[[dict], Awaitable[None]], window: float = 0.05, max_bytes: int = 2048) -> None:
+        """`window` in seconds; `window=0` and `max_bytes=0` sends one frame per token."""
+        self._send = send
+        self.window = window
+        self.max_bytes = max_bytes
+        self._parts: dict[str, list[str]] = {}  # frame type -> pending text, in arrival order
+        self._bytes = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_flush: Optional[asyncio.Future] = None
+        self.frames = 0
+        self.tokens = 0
+
+    async def add(self, text: str, kind: str = "token") -> None:
+        """Queue `text` for a `{"type": kind, "text": ...}` frame (token, code_delta, diff_hunk)."""
+        self._parts.setdefault(kind, []).append(text)
+        self._bytes += len(text.encode("utf-8"))
+        if kind == "token":
+            self.tokens += 1
+        if self.window <= 0 or (self.max_bytes and self._bytes >= self.max_bytes):
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._on_timer)
+
+    async def flush(self) -> None:
+        self._cancel_timer()
+        if not self._parts:
+            return
+        pending = self._parts
+        self._parts = {}
+        self._bytes = 0
+        for kind, parts in pending.items():
+            self.frames += 1
+            await self._send({"type": kind, "text": "".join(parts)})
+
+    async def aclose(self) -> None:
+        """Flush what is pending and wait for an in-flight timer flush."""
+        await self.flush()
+        if self._timer_flush is not None:
+            await self._timer_flush
+
+    def discard(self) -> None:
+        self._cancel_timer()
+        self._parts = {}
+        self._bytes = 0
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._timer_flush = asyncio.ensure_future(self.flush())
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
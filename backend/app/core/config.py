@@ -1,23 +1,136 @@
 from __future__ import annotations
 
 import os
-from typing import Optional
+from typing import Any, Callable, Optional
 from functools import lru_cache
-from pydantic import BaseModel
-from dotenv import load_dotenv
+from pydantic import BaseModel, Field
 
 
-load_dotenv()
+def _env(name: str, default: Optional[str], parse: Callable[[str], Any] = str) -> Any:
+    """Field read from the environment when `Settings` is instantiated, not at import."""
+
+    def read() -> Any:
+        value = os.getenv(name, default)
+        return None if value is None else parse(value)
+
+    return Field(default_factory=read)
+
+
+def _flag(value: str) -> bool:
+    return value.lower() not in ("0", "false", "no")
+
+
+def _csv(value: str) -> list[str]:
+    return [m.strip() for m in value.split(",") if m.strip()]
 
 
 class Settings(BaseModel):
-    openrouter_api_key: Optional[str] = os.getenv("OPENROUTER_API_KEY")
-    model: str = os.getenv("MODEL", "deepseek/deepseek-chat-v3-0324")
-    openrouter_base_url: str = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+    openrouter_api_key: Optional[str] = _env("OPENROUTER_API_KEY", None)
+    model: str = _env("MODEL", "deepseek/deepseek-chat-v3-0324")
+    openrouter_base_url: str = _env("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
     app_name: str = "Vibe Coding Backend"
-    generation_max_tokens: int = int(os.getenv("GENERATION_MAX_TOKENS", "2000"))
-    temperature: float = float(os.getenv("TEMPERATURE", "0.2"))
-    fallback_models: list[str] = [m.strip() for m in os.getenv("FALLBACK_MODELS", "").split(",") if m.strip()]
+    generation_max_tokens: int = _env("GENERATION_MAX_TOKENS", "2000", int)
+    temperature: float = _env("TEMPERATURE", "0.2", float)
+    fallback_models: list[str] = _env("FALLBACK_MODELS", "", _csv)
+    # Upper bound on running generations per worker process (HTTP + SSE + WebSocket);
+    # further turns wait in the admission queue.
+    max_concurrent_generations: int = _env("MAX_CONCURRENT_GENERATIONS", "256", int)
+    # Approximate token budget for the existing code in the prompt; 0 sends the full page.
+    context_token_budget: int = _env("CONTEXT_TOKEN_BUDGET", "4000", int)
+    # "full" re-emits the whole page each turn; "patch" asks for search/replace
+    # edit blocks (falls back to full on apply failure). Overridable per request.
+    edit_mode: str = _env("EDIT_MODE", "full")
+    patch_min_code_tokens: int = _env("PATCH_MIN_CODE_TOKENS", "300", int)
+    # A full-page reply cut off at GENERATION_MAX_TOKENS (finish_reason "length", unclosed
+    # fence or structural tags) is completed by up to N "continue" calls instead of being
+    # stored half-written; 0 disables the repair.
+    repair_max_continuations: int = _env("REPAIR_MAX_CONTINUATIONS", "2", int)
+    # Version history: a full snapshot every N distinct contents, deltas in between;
+    # LRU of materialized versions per session.
+    version_snapshot_interval: int = _env("VERSION_SNAPSHOT_INTERVAL", "10", int)
+    version_cache_size: int = _env("VERSION_CACHE_SIZE", "4", int)
+    # "memory" (single process) or "sqlite" (WAL; shareable by several workers).
+    repo_backend: str = _env("REPO_BACKEND", "memory")
+    sqlite_path: str = _env("SQLITE_PATH", "vibe_sessions.db")
+    sqlite_pool_size: int = _env("SQLITE_POOL_SIZE", "8", int)
+    # In-memory session store bounds (0 disables a limit). Sessions evicted under pressure
+    # are spilled to SESSION_SPILL_DIR (if set) and rehydrated on next access.
+    session_max_count: int = _env("SESSION_MAX_COUNT", "10000", int)
+    session_max_bytes: int = _env("SESSION_MAX_BYTES", str(512 * 1024 * 1024), int)
+    session_idle_ttl: float = _env("SESSION_IDLE_TTL", str(24 * 3600), float)
+    session_spill_dir: str = _env("SESSION_SPILL_DIR", "")
+    # Reply cache for deterministic generations (temperature <= max temperature).
+    generation_cache_enabled: bool = _env("GENERATION_CACHE", "1", _flag)
+    generation_cache_max_temperature: float = _env("GENERATION_CACHE_MAX_TEMPERATURE", "0.3", float)
+    generation_cache_max_entries: int = _env("GENERATION_CACHE_MAX_ENTRIES", "512", int)
+    generation_cache_max_chars: int = _env("GENERATION_CACHE_MAX_CHARS", str(64 * 1024 * 1024), int)
+    generation_cache_ttl: float = _env("GENERATION_CACHE_TTL", "3600", float)
+    generation_cache_dir: str = _env("GENERATION_CACHE_DIR", "")
+    generation_cache_disk_max_bytes: int = _env("GENERATION_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024), int)
+    # Shared HTTP pool behind the LLM clients (see app.services.client_pool).
+    llm_pool_max_connections: int = _env("LLM_POOL_MAX_CONNECTIONS", "200", int)
+    llm_pool_max_keepalive: int = _env("LLM_POOL_MAX_KEEPALIVE", "50", int)
+    llm_pool_idle_timeout: float = _env("LLM_POOL_IDLE_TIMEOUT", "60", float)
+    llm_request_timeout: float = _env("LLM_REQUEST_TIMEOUT", "120", float)
+    llm_http2: bool = _env("LLM_HTTP2", "1", _flag)
+    # Hedged requests across MODEL + FALLBACK_MODELS: seconds before starting the next
+    # model in parallel, "p95" to use the primary's recent p95 latency, or "off".
+    hedge_delay: str = _env("HEDGE_DELAY", "off")
+    hedge_min_delay: float = _env("HEDGE_MIN_DELAY", "2", float)
+    hedge_max_parallel: int = _env("HEDGE_MAX_PARALLEL", "2", int)
+    # Per-model circuit breaker: open after N consecutive failures, probe again after the timeout.
+    breaker_failure_threshold: int = _env("BREAKER_FAILURE_THRESHOLD", "5", int)
+    breaker_reset_timeout: float = _env("BREAKER_RESET_TIMEOUT", "30", float)
+    # Session WebSocket: token frames are batched per window (ms) or size (bytes),
+    # whichever comes first (0/0 = one frame per token); server pings idle sockets
+    # every WS_PING_INTERVAL seconds and closes them after WS_IDLE_TIMEOUT (0 = never).
+    ws_batch_window_ms: float = _env("WS_BATCH_WINDOW_MS", "50", float)
+    ws_batch_max_bytes: int = _env("WS_BATCH_MAX_BYTES", "2048", int)
+    ws_ping_interval: float = _env("WS_PING_INTERVAL", "20", float)
+    ws_idle_timeout: float = _env("WS_IDLE_TIMEOUT", "600", float)
+    # Stream code_delta / diff_hunk frames during WebSocket turns (per connection: ?live=0|1).
+    ws_live_code: bool = _env("WS_LIVE_CODE", "1", _flag)
+    # Generation pipeline runtime: "direct" (sequential runner over the LangGraph
+    # definition) or "langgraph" (the compiled Pregel graph).
+    pipeline_runtime: str = _env("PIPELINE_RUNTIME", "direct")
+    # LangChain / LangGraph load on first use; with LLM_WARMUP they are imported (and the
+    # pipeline built) in a background thread once the server is up, and /ready turns 200
+    # when that is done. LLM_WARMUP=0 leaves it to the first generation.
+    llm_warmup: bool = _env("LLM_WARMUP", "1", _flag)
+    # Diff engine budgets: past DIFF_TIMEOUT seconds or DIFF_MAX_BYTES of output a diff
+    # degrades to a one-line summary; lines longer than DIFF_LONG_LINE chars are diffed
+    # by tag / statement tokens.
+    diff_timeout: float = _env("DIFF_TIMEOUT", "1.0", float)
+    diff_max_bytes: int = _env("DIFF_MAX_BYTES", str(1024 * 1024), int)
+    diff_long_line: int = _env("DIFF_LONG_LINE", "1000", int)
+    # brotli (if installed) / gzip for code-carrying JSON responses at least this large;
+    # encoded bodies of immutable payloads (code per version) are cached up to the byte bound.
+    response_compression: bool = _env("RESPONSE_COMPRESSION", "1", _flag)
+    compression_min_bytes: int = _env("COMPRESSION_MIN_BYTES", "1024", int)
+    body_cache_max_bytes: int = _env("BODY_CACHE_MAX_BYTES", str(64 * 1024 * 1024), int)
+
+    # Admission control (app.services.admission): token buckets (requests/s and burst;
+    # rate 0 disables) globally, per client address and per session, then at most
+    # MAX_CONCURRENT_GENERATIONS running generations with a bounded priority queue.
+    # Waiting longer than ADMISSION_QUEUE_TIMEOUT seconds (0 = no limit) is rejected.
+    admission_global_rate: float = _env("ADMISSION_GLOBAL_RATE", "0", float)
+    admission_global_burst: float = _env("ADMISSION_GLOBAL_BURST", "100", float)
+    # Off by default: the client is the connection's address, which behind a proxy or
+    # load balancer is the proxy's, so one bucket would throttle every user at once.
+    admission_client_rate: float = _env("ADMISSION_CLIENT_RATE", "0", float)
+    admission_client_burst: float = _env("ADMISSION_CLIENT_BURST", "20", float)
+    admission_session_rate: float = _env("ADMISSION_SESSION_RATE", "0.5", float)
+    admission_session_burst: float = _env("ADMISSION_SESSION_BURST", "10", float)
+    admission_queue_max: int = _env("ADMISSION_QUEUE_MAX", "512", int)
+    admission_queue_timeout: float = _env("ADMISSION_QUEUE_TIMEOUT", "30", float)
+
+    # Prompt layout: "full" or "compact" system prompt; cache_control breakpoints on the
+    # system prompt and code block ("auto": only for providers that need explicit ones,
+    # i.e. anthropic/* and google/gemini* models); TOKEN_COUNTER=tiktoken counts with
+    # tiktoken (optional package) instead of the ~4 chars/token estimate.
+    prompt_variant: str = _env("PROMPT_VARIANT", "full")
+    prompt_cache_hints: str = _env("PROMPT_CACHE_HINTS", "auto")
+    token_counter: str = _env("TOKEN_COUNTER", "estimate")
 
     class Config:
         arbitrary_types_allowed = True
@@ -25,4 +138,7 @@ class Settings(BaseModel):
 
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
+    from dotenv import load_dotenv
+
+    load_dotenv()
     return Settings()
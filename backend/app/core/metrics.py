@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+"""Prometheus metrics (`prometheus_client`).
+
+Counters and histograms with labels live in an app-level `REGISTRY`, rendered
+in the text exposition format (0.0.4) by `render()` for `GET /metrics`.
+Recording a value is a label lookup and a locked addition (about 1 µs, see
+`benchmarks/bench_metrics.py`), so it is cheap enough for per-token paths.
+Gauges (`Callback`) read the existing stats objects at scrape time and cost
+nothing in between. `*_created` series are disabled: nothing here needs them,
+and they would double the size of every scrape.
+
+Every metric recorded on the hot path is defined at the bottom of this module,
+so the list of series is in one place. Label values must stay low-cardinality:
+route templates, model names, node names. Never use session ids.
+"""
+
+from typing import Callable, Iterable, Sequence
+
+import prometheus_client
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+prometheus_client.disable_created_metrics()
+
+REGISTRY = CollectorRegistry()
+_metrics: list = []  # recorded series, cleared by `reset`
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+RATE_BUCKETS = (5.0, 10.0, 20.0, 40.0, 60.0, 80.0, 100.0, 150.0, 200.0, 300.0, 500.0)
+
+
+def _counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    metric = Counter(name, documentation, labelnames, registry=REGISTRY)
+    _metrics.append(metric)
+    return metric
+
+
+def _histogram(
+    name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DURATION_BUCKETS
+) -> Histogram:
+    metric = Histogram(name, documentation, labelnames, registry=REGISTRY, buckets=buckets)
+    _metrics.append(metric)
+    return metric
+
+
+class Callback:
+    """Gauge (or counter) read at scrape time: `read()` yields (label values, value) pairs."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        read: Callable[[], Iterable[tuple[tuple, float]]],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge",
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.labelnames = list(labelnames)
+        self.family = CounterMetricFamily if kind == "counter" else GaugeMetricFamily
+        REGISTRY.register(self)
+
+    def collect(self):
+        family = self.family(self.name, self.documentation, labels=self.labelnames)
+        for values, value in self.read():
+            family.add_metric([str(v) for v in values], value)
+        yield family
+
+
+def render() -> str:
+    return generate_latest(REGISTRY).decode("utf-8")
+
+
+def reset() -> None:
+    """Drop every recorded series (tests); callbacks are left in place."""
+    for metric in _metrics:
+        metric.clear()
+
+
+# -- hot-path metrics --
+
+http_request_seconds = _histogram(
+    "vibe_http_request_duration_seconds",
+    "HTTP request latency until the response body is sent, by route template.",
+    ("method", "route", "status"),
+)
+llm_requests = _counter(
+    "vibe_llm_requests_total", "LLM calls by model and outcome (success, error, cancelled).", ("model", "outcome")
+)
+llm_request_seconds = _histogram("vibe_llm_request_duration_seconds", "Latency of successful LLM calls.", ("model",))
+llm_time_to_first_token_seconds = _histogram(
+    "vibe_llm_time_to_first_token_seconds", "Time to the first streamed chunk of a reply.", ("model",)
+)
+llm_output_tokens_per_second = _histogram(
+    "vibe_llm_output_tokens_per_second",
+    "Completion tokens per second (after the first token when streaming).",
+    ("model",),
+    RATE_BUCKETS,
+)
+llm_prompt_tokens = _counter(
+    "vibe_llm_prompt_tokens_total", "Prompt tokens sent (provider-reported or estimated).", ("model",)
+)
+llm_cached_prompt_tokens = _counter(
+    "vibe_llm_cached_prompt_tokens_total", "Prompt tokens the provider served from its prompt cache.", ("model",)
+)
+llm_completion_tokens = _counter(
+    "vibe_llm_completion_tokens_total", "Completion tokens received (provider-reported or estimated).", ("model",)
+)
+llm_fallbacks = _counter(
+    "vibe_llm_fallbacks_total", "Retryable failures; the call fails over to the next model, if any.", ("model",)
+)
+llm_hedges = _counter("vibe_llm_hedges_total", "Hedged calls started because the previous model was slow.", ("model",))
+generation_repairs = _counter(
+    "vibe_generation_repairs_total",
+    "Truncated replies by outcome: repaired by continuation calls (a full regeneration avoided) or stored unrepaired.",
+    ("outcome",),
+)
+pipeline_node_seconds = _histogram(
+    "vibe_pipeline_node_duration_seconds",
+    "Generation pipeline time per node.",
+    ("node",),
+    FAST_BUCKETS + (5.0, 10.0, 30.0, 60.0, 120.0),
+)
+diff_seconds = _histogram("vibe_diff_duration_seconds", "Diff computation time by result mode.", ("mode",), FAST_BUCKETS)
+repo_operation_seconds = _histogram(
+    "vibe_repo_operation_duration_seconds",
+    "Session repository call latency.",
+    ("backend", "operation"),
+    FAST_BUCKETS,
+)
+admission_wait_seconds = _histogram(
+    "vibe_admission_queue_wait_seconds", "Time a generation waited for a slot.", ("priority",)
+)
+admission_rejected = _counter("vibe_admission_rejected_total", "Generations refused by admission control.", ("reason",))
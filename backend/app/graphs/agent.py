@@ -1,44 +1,145 @@
 from __future__ import annotations
 
-from app.services.repository import repo, SessionData, CodeVersion
-from app.services import llm as llm_service
-from app.services import diff as diff_service
-from app.services.llm import LLMAccessError
-from datetime import datetime
+import asyncio
 
+from app.graphs.pipeline import GenerationState, runtime
+from app.services.context_builder import estimate_tokens
+from app.services.repository import SessionData, repo
+from typing import AsyncIterator, Optional
 
-def run_generation(session: SessionData, user_message: str) -> dict:
+
+def _initial_state(
+    session: SessionData,
+    user_message: str,
+    edit_mode: Optional[str],
+    base_version: Optional[int],
+    use_cache: bool,
+    persist: bool = True,
+    with_diff: bool = True,
+) -> GenerationState:
+    return {
+        "session": session,
+        "user_message": user_message,
+        "edit_mode": edit_mode,
+        "base_version": base_version,
+        "use_cache": use_cache,
+        "save": persist,
+        "want_diff": with_diff,
+        "usage": {},
+        "timings": {},
+    }
+
+
+def _result(state: GenerationState) -> dict:
+    """Response dict for a finished pipeline run."""
+    mode = state["mode"]
+    wasted = state.get("wasted_tokens", 0)
+    if mode == "patch":
+        saved = estimate_tokens(state["code"]) - state["completion_tokens"]
+    else:
+        saved = -wasted
+    return {
+        "assistant_message": state["text"],
+        "assistant_message_raw": state["text"],
+        "code": state["code"],
+        "diff": state["code_diff"],  # None when the caller skipped it
+        "version": state.get("version", state["session"].current_version),
+        "mode": mode,
+        "output_tokens_saved": saved,
+        "continuations": state.get("continuations") or 0,
+        "usage": {**state.get("usage", {}), "completion_tokens": state["completion_tokens"] + wasted},
+        "timings": {name: round(seconds * 1000, 3) for name, seconds in state["timings"].items()},
+    }
+
+
+async def run_generation(
+    session: SessionData,
+    user_message: str,
+    edit_mode: Optional[str] = None,
+    base_version: Optional[int] = None,
+    use_cache: bool = True,
+    with_diff: bool = True,
+) -> dict:
     """Generate/update code for a session given a user message.
 
     Returns dict including assistant_message_raw for front-end toggle.
-    MVP: assistant_message == assistant_message_raw.
+    MVP: assistant_message == assistant_message_raw. `timings` holds
+    milliseconds spent per pipeline node; `usage` the prompt tokens (and how
+    many the provider served from its prompt cache) and completion tokens
+    paid for this turn; `continuations` the "continue" calls made for a reply
+    cut off at the token limit. With `with_diff=False` the diff is not
+    computed (`diff` is None); the version computes it when first read.
+
+    Raises VersionConflictError if `base_version` is given and is not the
+    current version, or if another writer added a version meanwhile.
     """
-    previous_code = session.code or ""
-    try:
-        assistant_text, new_code = llm_service.generate_code(session, user_message)
-    except LLMAccessError:
-        raise
-    repo.add_message(session.id, "user", user_message)
-    repo.add_message(session.id, "assistant", assistant_text)
-    repo.update_code(session.id, new_code)
-    code_diff = diff_service.unified_diff(previous_code, new_code)
-
-    # --- Versioning (MVP) ---
-    new_version_number = session.current_version + 1
-    version_entry = CodeVersion(
-        version=new_version_number,
-        code=new_code,
-        diff=code_diff,
-        summary=None,
-        created_at=datetime.utcnow(),
-        origin="generation",
-    )
-    session.versions.append(version_entry)
-    session.current_version = new_version_number
-    return {
-        "assistant_message": assistant_text,
-        "assistant_message_raw": assistant_text,
-        "code": new_code,
-        "diff": code_diff,
-        "version": new_version_number,
-    }
+    with repo.pin(session.id):  # not evicted before the version is stored
+        state = await runtime().ainvoke(
+            _initial_state(session, user_message, edit_mode, base_version, use_cache, with_diff=with_diff)
+        )
+    return _result(state)
+
+
+def run_generation_sync(
+    session: SessionData,
+    user_message: str,
+    edit_mode: Optional[str] = None,
+    base_version: Optional[int] = None,
+    use_cache: bool = True,
+    persist: bool = True,
+) -> dict:
+    """Blocking `run_generation` (scripts, benchmarks); `persist=False` stores nothing."""
+    with repo.pin(session.id):
+        state = runtime().invoke(_initial_state(session, user_message, edit_mode, base_version, use_cache, persist))
+    return _result(state)
+
+
+async def stream_generation(
+    session: SessionData,
+    user_message: str,
+    base_version: Optional[int] = None,
+    use_cache: bool = True,
+    live: bool = True,
+    persisting: Optional[asyncio.Event] = None,
+    with_diff: bool = True,
+) -> AsyncIterator[dict]:
+    """Streaming `run_generation` (always full-page mode).
+
+    Yields event dicts: ack, token (and, with `live`, code_delta / diff_hunk)
+    while the reply streams, then assistant_message_complete, code, diff,
+    version and final (with per-node `timings`) once the version is stored.
+    `persisting` is set when persistence begins, i.e. when cancelling no
+    longer discards the turn. The caller holds the session lock.
+
+    Raises VersionConflictError like `run_generation`; LLM errors propagate.
+    Closing the iterator cancels the pipeline and the upstream LLM call.
+    """
+    queue: "asyncio.Queue[Optional[dict]]" = asyncio.Queue()
+
+    async def emit(event: dict) -> None:
+        queue.put_nowait(event)
+
+    config = {"configurable": {"emit": emit, "live": live, "persisting": persisting}}
+    with repo.pin(session.id):
+        task = asyncio.ensure_future(
+            runtime().ainvoke(
+                _initial_state(session, user_message, "full", base_version, use_cache, with_diff=with_diff), config
+            )
+        )
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+            result = _result(task.result())
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+    yield {"type": "assistant_message_complete", "raw": result["assistant_message_raw"]}
+    yield {"type": "code", "code": result["code"]}
+    yield {"type": "diff", "diff": result["diff"]}
+    yield {"type": "version", "version": result["version"]}
+    yield {"type": "final", "timings": result["timings"], "usage": result["usage"]}
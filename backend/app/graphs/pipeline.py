@@ -0,0 +1,503 @@
+from __future__ import annotations
+
+"""The generation pipeline as a LangGraph state graph.
+
+    context -> llm -> extract -> validate -> diff -> persist
+       ^                |   ^        |
+       +----------------+   +-repair-+
+
+extract -> context: patch edits did not apply, regenerate in full.
+validate -> repair -> extract: the reply was cut off (max tokens, unclosed
+fence or tags); ask the model to continue it and stitch the two, at most
+`Settings.repair_max_continuations` times (see `app.services.repair`).
+
+Every node has a blocking and an async body, so the same compiled graph
+serves `invoke` (scripts, benchmarks), `ainvoke` (HTTP) and streaming. Pure
+nodes run their sync body inline in async mode instead of in an executor.
+Streaming is driven through `config["configurable"]`: `emit` (async callback
+receiving ack / token / code_delta / diff_hunk events), `live` and
+`persisting` (an asyncio.Event set when persistence starts). The async diff
+node moves large diffs off the event loop.
+
+Each node adds its wall time to `state["timings"]` and to the process-wide
+`pipeline_stats`.
+
+LangGraph's Pregel runtime costs ~7-14 ms of CPU per run here, which is about
+100x the rest of the pipeline's own overhead and caps a worker at well under
+100 generations/s. `DirectRunner` therefore executes the *same* compiled
+graph definition (nodes, edges, branches, reducers) sequentially, which is all
+this graph needs. `Settings.pipeline_runtime` ("direct" or "langgraph")
+selects the runtime.
+
+Both are built on first use: importing `langgraph.graph` takes ~0.5 s
+(it loads langchain-core), which `import app.main` should not pay.
+"""
+
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Optional, TypedDict, get_type_hints
+
+from langgraph.constants import END, START
+from typing_extensions import Annotated
+
+from app.core import metrics
+from app.core.config import get_settings
+from app.services import diff as diff_service
+from app.services import llm as llm_service
+from app.services.context_builder import CodeContext, estimate_tokens
+from app.services.patch import PatchApplyError
+from app.services.repair import TRUNCATION_ISSUES, stitch, truncation_issues
+from app.services.repository import SessionData, VersionConflictError, repo
+from vibe_core.extract import InvalidGeneration, LiveCodeStream
+
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
+    from langgraph.utils import RunnableCallable
+
+
+class GenerationValidationError(InvalidGeneration):
+    """The model reply did not yield usable code."""
+
+
+def _sum_by_key(left: Optional[dict], right: Optional[dict]) -> dict:
+    merged = dict(left or {})
+    for name, value in (right or {}).items():
+        merged[name] = merged.get(name, 0) + value
+    return merged
+
+
+class GenerationState(TypedDict, total=False):
+    # inputs
+    session: SessionData
+    user_message: str
+    edit_mode: Optional[str]
+    base_version: Optional[int]  # None: the current one; `context` records the version it reads
+    use_cache: bool
+    save: bool  # False: stop after the diff, store nothing
+    want_diff: bool  # False: skip the diff; the stored version computes it on first read
+    # context
+    mode: str  # "full" | "patch" | "patch_fallback"
+    messages: list
+    code_context: CodeContext
+    # llm
+    text: str
+    finish_reason: Optional[str]
+    completion_tokens: int
+    wasted_tokens: int  # paid for a patch reply that did not apply
+    # repair
+    continuations: int  # "continue" calls made for a cut-off reply
+    continuation_tokens: int  # their completion tokens (included in completion_tokens)
+    # extract / validate / diff / persist
+    code: str
+    issues: list
+    code_diff: Optional[str]
+    version: int
+    usage: Annotated[dict, _sum_by_key]  # prompt_tokens / cached_prompt_tokens over every LLM call
+    timings: Annotated[dict, _sum_by_key]
+
+
+class PipelineStats:
+    """Per-node call counts and latency totals since process start."""
+
+    def __init__(self) -> None:
+        self._nodes: dict[str, list[float]] = {}  # name -> [count, total, max]
+
+    def observe(self, name: str, seconds: float) -> None:
+        metrics.pipeline_node_seconds.labels(name).observe(seconds)
+        entry = self._nodes.setdefault(name, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+
+    def reset(self) -> None:
+        self._nodes.clear()
+
+    def snapshot(self) -> dict:
+        return {
+            name: {"calls": int(n), "avg_ms": 1000 * total / n, "max_ms": 1000 * peak}
+            for name, (n, total, peak) in self._nodes.items()
+        }
+
+
+pipeline_stats = PipelineStats()
+
+
+class RepairStats:
+    """Cut-off replies since process start, and what the continuation calls made of them."""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.truncated = 0
+        self.continuations = 0
+        self.repaired = 0  # each one a full regeneration the user did not have to ask for
+        self.unrepaired = 0
+        self.output_tokens_saved = 0  # full-page tokens a regeneration would emit, minus the continuations
+
+    def observe(self, state: GenerationState, truncated: bool) -> None:
+        continuations = state.get("continuations") or 0
+        if truncated and not continuations:
+            self.truncated += 1
+        if not truncated and continuations:
+            self.repaired += 1
+            self.output_tokens_saved += estimate_tokens(state["text"]) - (state.get("continuation_tokens") or 0)
+            metrics.generation_repairs.labels("repaired").inc()
+        elif truncated and continuations >= get_settings().repair_max_continuations:
+            self.unrepaired += 1
+            metrics.generation_repairs.labels("unrepaired").inc()
+
+    def snapshot(self) -> dict:
+        return {
+            "truncated": self.truncated,
+            "continuations": self.continuations,
+            "regenerations_avoided": self.repaired,
+            "unrepaired": self.unrepaired,
+            "output_tokens_saved": self.output_tokens_saved,
+        }
+
+
+repair_stats = RepairStats()
+
+
+def _configurable(config: Optional[dict]) -> dict:
+    return (config or {}).get("configurable") or {}
+
+
+# -- nodes (sync bodies) --
+
+def _context(state: GenerationState, config: dict) -> dict:
+    session = state["session"]
+    mode = state.get("mode")
+    update: dict = {}
+    if mode is None:
+        base = state.get("base_version")
+        if base is not None and base != session.current_version:
+            raise VersionConflictError(base, session.current_version)
+        # `session` may be the repo's live object; persist checks against the version read here.
+        update["base_version"] = session.current_version
+        mode = llm_service.resolve_edit_mode(session, state.get("edit_mode"))
+    messages, context = llm_service.build_messages(
+        session, state["user_message"], edit_mode="patch" if mode == "patch" else "full"
+    )
+    return {**update, "mode": mode, "messages": messages, "code_context": context}
+
+
+def _usage(messages: list, resp=None, usage: Optional[dict] = None) -> dict:
+    prompt, cached = llm_service.prompt_usage(messages, resp, usage)
+    return {"prompt_tokens": prompt, "cached_prompt_tokens": cached}
+
+
+def _llm(state: GenerationState, config: dict) -> dict:
+    resp = llm_service.invoke_cached(state["messages"], state.get("use_cache", True))
+    return {
+        "text": resp.content,
+        "finish_reason": llm_service.finish_reason(resp),
+        "completion_tokens": llm_service.completion_tokens(resp),
+        "usage": _usage(state["messages"], resp),
+    }
+
+
+def _extract(state: GenerationState, config: dict) -> dict:
+    if state["mode"] != "patch":
+        try:
+            return {"code": llm_service.finalize_code(state["text"], state["code_context"])}
+        except InvalidGeneration as e:
+            raise GenerationValidationError(str(e)) from e
+    try:
+        return {"code": llm_service.finalize_patch(state["text"], state["code_context"])}
+    except PatchApplyError:
+        return {"mode": "patch_fallback", "wasted_tokens": state["completion_tokens"]}
+
+
+def _after_extract(state: GenerationState) -> str:
+    return "context" if state["mode"] == "patch_fallback" and "code" not in state else "validate"
+
+
+def _validate(state: GenerationState, config: dict) -> dict:
+    if not state["code"].strip():
+        raise GenerationValidationError("empty_code")
+    if state["mode"] == "patch":
+        return {"issues": []}
+    issues = truncation_issues(state["text"], state.get("finish_reason"))
+    repair_stats.observe(state, bool(issues))
+    return {"issues": issues}
+
+
+def _after_validate(state: GenerationState) -> str:
+    if (state.get("continuations") or 0) >= get_settings().repair_max_continuations:
+        return "diff"
+    return "repair" if any(issue in TRUNCATION_ISSUES for issue in state["issues"]) else "diff"
+
+
+def _continue_update(state: GenerationState, messages: list, resp) -> dict:
+    """State update for one continuation reply: the stitched text, tokens and usage."""
+    repair_stats.continuations += 1
+    tokens = llm_service.completion_tokens(resp)
+    return {
+        "text": stitch(state["text"], resp.content),
+        "finish_reason": llm_service.finish_reason(resp),
+        "continuations": (state.get("continuations") or 0) + 1,
+        "continuation_tokens": (state.get("continuation_tokens") or 0) + tokens,
+        "completion_tokens": state["completion_tokens"] + tokens,
+        "usage": _usage(messages, resp),
+    }
+
+
+def _repair_cache_key(state: GenerationState) -> Optional[str]:
+    # The reply cache holds the first, cut-off reply; replace it with the repaired one.
+    return llm_service.cache_key(state["messages"]) if state.get("use_cache", True) else None
+
+
+def _repair(state: GenerationState, config: dict) -> dict:
+    messages = llm_service.continuation_messages(state["messages"], state["text"])
+    update = _continue_update(state, messages, llm_service.invoke_cached(messages, use_cache=False))
+    key = _repair_cache_key(state)
+    if key is not None:
+        llm_service.generation_cache.put(key, update["text"])
+    return update
+
+
+def _diff(state: GenerationState, config: dict) -> dict:
+    if not state.get("want_diff", True):
+        return {"code_diff": None}
+    return {"code_diff": diff_service.unified_diff(state["session"].code or "", state["code"])}
+
+
+def _after_diff(state: GenerationState) -> str:
+    return "persist" if state.get("save", True) else END
+
+
+def _persist(state: GenerationState, config: dict) -> dict:
+    session = state["session"]
+    entry = repo.add_version(
+        session.id, state["code"], state.get("code_diff"), origin="generation", expected_version=state["base_version"]
+    )
+    repo.add_message(session.id, "user", state["user_message"])
+    repo.add_message(session.id, "assistant", state["text"])
+    return {"version": entry.version}
+
+
+# -- nodes (async bodies that differ) --
+
+async def _allm(state: GenerationState, config: dict) -> dict:
+    emit = _configurable(config).get("emit")
+    if emit is None:
+        resp = await llm_service.ainvoke_cached(state["messages"], state.get("use_cache", True))
+        return {
+            "text": resp.content,
+            "finish_reason": llm_service.finish_reason(resp),
+            "completion_tokens": llm_service.completion_tokens(resp),
+            "usage": _usage(state["messages"], resp),
+        }
+    return await _astream_llm(state, config, emit)
+
+
+async def _astream_llm(state: GenerationState, config: dict, emit: Callable) -> dict:
+    """Stream tokens (and live code/diff) to `emit`; the reply cache still applies."""
+    context = state["code_context"]
+    options = _configurable(config)
+    live = None
+    if options.get("live", True):
+        live = LiveCodeStream(state["session"].code or "", context.restore if context.is_sliced else None)
+    use_cache = state.get("use_cache", True)
+    key = llm_service.cache_key(state["messages"]) if use_cache else None
+    cached = await llm_service.generation_cache.aget(key) if key is not None else None
+    reported: dict = {}
+    tokens = llm_service.astream_tokens(state["messages"], reported) if cached is None else _single(cached)
+    parts: list[str] = []
+    try:
+        async for token in tokens:
+            parts.append(token)
+            await emit({"type": "token", "text": token})
+            if live is not None:
+                await _emit_live(emit, *live.feed(token))
+    finally:
+        # Close the upstream stream now (not at GC) when we are cancelled.
+        await tokens.aclose()
+    if live is not None:
+        await _emit_live(emit, *live.finish())
+    text = "".join(parts)
+    if key is not None and cached is None and text:
+        await llm_service.generation_cache.aput(key, text)
+    if cached is not None:  # nothing was sent
+        return {"text": text, "completion_tokens": 0, "usage": {"prompt_tokens": 0, "cached_prompt_tokens": 0}}
+    return {
+        "text": text,
+        "finish_reason": reported.get("finish_reason"),
+        "completion_tokens": reported.get("output_tokens") or estimate_tokens(text),
+        "usage": _usage(state["messages"], usage=reported),
+    }
+
+
+async def _single(text: str):
+    yield text
+
+
+async def _emit_live(emit: Callable, code_delta: str, hunks: str) -> None:
+    if code_delta:
+        await emit({"type": "code_delta", "text": code_delta})
+    if hunks:
+        await emit({"type": "diff_hunk", "text": hunks})
+
+
+async def _acontext(state: GenerationState, config: dict) -> dict:
+    first_pass = state.get("mode") is None
+    update = _context(state, config)
+    emit = _configurable(config).get("emit")
+    if first_pass and emit is not None:
+        await emit({"type": "ack"})
+    return update
+
+
+async def _arepair(state: GenerationState, config: dict) -> dict:
+    messages = llm_service.continuation_messages(state["messages"], state["text"])
+    update = _continue_update(state, messages, await llm_service.ainvoke_cached(messages, use_cache=False))
+    emit = _configurable(config).get("emit")
+    if emit is not None and update["text"].startswith(state["text"]):
+        # Streamed replies: send the missing tail as one more token (the code event has the full page).
+        await emit({"type": "token", "text": update["text"][len(state["text"]):]})
+    key = _repair_cache_key(state)
+    if key is not None:
+        await llm_service.generation_cache.aput(key, update["text"])
+    return update
+
+
+async def _adiff(state: GenerationState, config: dict) -> dict:
+    if not state.get("want_diff", True):
+        return {"code_diff": None}
+    return {"code_diff": await diff_service.aunified_diff(state["session"].code or "", state["code"])}
+
+
+async def _apersist(state: GenerationState, config: dict) -> dict:
+    persisting = _configurable(config).get("persisting")
+    if persisting is not None:
+        persisting.set()
+    session = state["session"]
+    entry = await repo.aadd_version(
+        session.id, state["code"], state.get("code_diff"), origin="generation", expected_version=state["base_version"]
+    )
+    await repo.aadd_message(session.id, "user", state["user_message"])
+    await repo.aadd_message(session.id, "assistant", state["text"])
+    return {"version": entry.version}
+
+
+def _node(name: str, func: Callable, afunc: Optional[Callable] = None) -> RunnableCallable:
+    """Timed node; without `afunc` the sync body also runs inline in async mode."""
+    from langgraph.utils import RunnableCallable
+
+    def run(state: GenerationState, config: dict) -> dict:
+        start = time.perf_counter()
+        update = func(state, config)
+        return _timed(name, update, start)
+
+    async def arun(state: GenerationState, config: dict) -> dict:
+        start = time.perf_counter()
+        update = await afunc(state, config) if afunc is not None else func(state, config)
+        return _timed(name, update, start)
+
+    return RunnableCallable(run, arun, name=name, trace=False)
+
+
+def _timed(name: str, update: dict, start: float) -> dict:
+    elapsed = time.perf_counter() - start
+    pipeline_stats.observe(name, elapsed)
+    return {**update, "timings": {name: elapsed}}
+
+
+def build_pipeline() -> Any:
+    from langgraph.graph import StateGraph
+
+    graph = StateGraph(GenerationState)
+    graph.add_node("context", _node("context", _context, _acontext))
+    graph.add_node("llm", _node("llm", _llm, _allm))
+    graph.add_node("extract", _node("extract", _extract))
+    graph.add_node("validate", _node("validate", _validate))
+    graph.add_node("repair", _node("repair", _repair, _arepair))
+    graph.add_node("diff", _node("diff", _diff, _adiff))
+    graph.add_node("persist", _node("persist", _persist, _apersist))
+    graph.set_entry_point("context")
+    graph.add_edge("context", "llm")
+    graph.add_edge("llm", "extract")
+    graph.add_conditional_edges("extract", _after_extract, {"context": "context", "validate": "validate"})
+    graph.add_conditional_edges("validate", _after_validate, {"repair": "repair", "diff": "diff"})
+    graph.add_edge("repair", "extract")
+    graph.add_conditional_edges("diff", _after_diff, {"persist": "persist", END: END})
+    graph.add_edge("persist", END)
+    return graph.compile()
+
+
+class DirectRunner:
+    """Runs a StateGraph whose nodes form a single path (plus branches) without Pregel.
+
+    Reads the builder's internals (`nodes`, `edges`, `branches`), so
+    langgraph is pinned exactly; tests/test_runtime_parity.py checks that
+    both runtimes visit the same nodes.
+    """
+
+    max_steps = 25  # same default recursion limit as LangGraph
+
+    def __init__(self, builder: StateGraph) -> None:
+        self.nodes = {name: spec.runnable for name, spec in builder.nodes.items()}
+        self.edges: dict[str, str] = {}
+        for start, end in builder.edges:
+            if start in self.edges:
+                raise ValueError(f"DirectRunner supports one successor per node, {start!r} has several")
+            self.edges[start] = end
+        self.branches = {start: next(iter(branches.values())) for start, branches in builder.branches.items()}
+        self.reducers = {
+            key: hint.__metadata__[0]
+            for key, hint in get_type_hints(builder.schema, include_extras=True).items()
+            if getattr(hint, "__metadata__", None)
+        }
+
+    def invoke(self, state: dict, config: Optional[dict] = None) -> dict:
+        state, name = dict(state), self.edges[START]
+        for _ in range(self.max_steps):
+            if name == END:
+                return state
+            self._apply(state, self.nodes[name].func(state, config or {}))
+            name = self._successor(name, state)
+        raise RuntimeError(f"pipeline exceeded {self.max_steps} steps")
+
+    async def ainvoke(self, state: dict, config: Optional[dict] = None) -> dict:
+        state, name = dict(state), self.edges[START]
+        for _ in range(self.max_steps):
+            if name == END:
+                return state
+            self._apply(state, await self.nodes[name].afunc(state, config or {}))
+            name = self._successor(name, state)
+        raise RuntimeError(f"pipeline exceeded {self.max_steps} steps")
+
+    def _apply(self, state: dict, update: dict) -> None:
+        for key, value in update.items():
+            reducer = self.reducers.get(key)
+            state[key] = reducer(state.get(key), value) if reducer is not None else value
+
+    def _successor(self, name: str, state: dict) -> str:
+        branch = self.branches.get(name)
+        if branch is None:
+            return self.edges[name]
+        key = branch.path.func(state)
+        return branch.ends[key] if branch.ends else key
+
+
+_built: Optional[tuple[Any, DirectRunner]] = None
+_build_lock = threading.Lock()
+
+
+def pipelines() -> tuple[Any, DirectRunner]:
+    """(compiled graph, direct runner over it), built once on first call."""
+    global _built
+    if _built is None:
+        with _build_lock:
+            if _built is None:
+                graph = build_pipeline()
+                _built = (graph, DirectRunner(graph.builder))
+    return _built
+
+
+def runtime() -> Any:
+    """The compiled graph or its direct runner, per `Settings.pipeline_runtime`."""
+    graph, direct = pipelines()
+    return graph if get_settings().pipeline_runtime == "langgraph" else direct
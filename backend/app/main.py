@@ -1,10 +1,23 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
+from app.api.instrumentation import MetricsMiddleware
 from app.api.routes import router as api_router
+from app.core.config import get_settings
+from app.services.warmup import warmup
 from pathlib import Path
 
-app = FastAPI(title="Vibe Coding Backend", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The LLM stack is imported lazily; load it now, off the event loop (see /ready).
+    if get_settings().llm_warmup:
+        warmup.start()
+    yield
+
+
+app = FastAPI(title="Vibe Coding Backend", version="0.1.0", lifespan=lifespan)
 
 # Permissive CORS for MVP (front-end opened from file:// or any origin)
 app.add_middleware(
@@ -14,13 +27,23 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/health")
 async def health():
+    """Liveness: the process serves requests (the LLM stack may still be loading)."""
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def ready():
+    """Readiness: generations will not wait for the LLM stack to load (503 until then)."""
+    if not get_settings().llm_warmup or warmup.ready:
+        return {"status": "ready", "warmup": warmup.snapshot()}
+    return JSONResponse({"status": "not_ready", "warmup": warmup.snapshot()}, status_code=503)
+
+
 # Serve the frontend index.html at root
 _INDEX_PATH = Path(__file__).resolve().parents[2] / "frontend" / "index.html"
 
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+"""Admission control in front of generations.
+
+Two stages, both process-local:
+
+- `check(client, session_id)`: token buckets, one global, one per client and
+  one per session (any of them disabled with rate 0). A request over any
+  bucket is rejected at once with `AdmissionRejected("rate_limited")` and
+  takes nothing from the others.
+- `slot(priority)`: at most `max_active` generations run at once; the rest
+  wait in a bounded priority queue (interactive, then normal, then batch;
+  FIFO within a priority). A full queue rejects at once ("queue_full"), and a
+  waiter not admitted within `queue_timeout` (the queue-time SLO) gives up
+  ("queue_timeout").
+
+`retry_after` on a rejection is a whole number of seconds: the bucket refill
+time, or the queue depth times the recent average generation time divided by
+the number of slots. Routes turn it into 429 + Retry-After (an error frame on
+the WebSocket).
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from app.core import metrics
+from app.core.config import get_settings
+
+PRIORITIES = {"interactive": 0, "normal": 1, "batch": 2}
+_PRIORITY_NAMES = {v: k for k, v in PRIORITIES.items()}
+_MAX_BUCKETS = 10000  # per table; full (idle) buckets are dropped past this
+
+
+class AdmissionRejected(Exception):
+    """A generation was refused: `reason` is rate_limited, queue_full or queue_timeout."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"{reason}, retry after {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    """`rate` tokens per second, up to `burst`; one token per request."""
+
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.stamp = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait(self, now: float) -> float:
+        """Seconds until a token is available (0: available now)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+def resolve_priority(requested: Optional[str], default: str) -> int:
+    """Priority for a request; clients may lower theirs (e.g. X-Priority: batch), never raise it."""
+    base = PRIORITIES[default]
+    return max(base, PRIORITIES.get((requested or "").strip().lower(), base))
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_active: int,
+        queue_max: int,
+        queue_timeout: float,
+        global_rate: float = 0.0,
+        global_burst: float = 1.0,
+        client_rate: float = 0.0,
+        client_burst: float = 1.0,
+        session_rate: float = 0.0,
+        session_burst: float = 1.0,
+    ) -> None:
+        self.max_active = max(1, max_active)
+        self.queue_max = queue_max
+        self.queue_timeout = queue_timeout
+        self._global_limit = (global_rate, global_burst)
+        self._client_limit = (client_rate, client_burst)
+        self._session_limit = (session_rate, session_burst)
+        self._global: Optional[TokenBucket] = None
+        self._clients: dict[str, TokenBucket] = {}
+        self._sessions: dict[str, TokenBucket] = {}
+        self.active = 0
+        self._queue: list[tuple[int, int, asyncio.Future]] = []  # may hold abandoned entries
+        self._seq = itertools.count()
+        self.waiting = 0
+        self._service = 0.0  # moving average of seconds a slot is held
+        self._waits: deque = deque(maxlen=1000)
+        self._reset_counters()
+
+    def _reset_counters(self) -> None:
+        self.admitted = 0
+        self.queued = 0
+        self.max_waiting = 0
+        self.rejected = {"rate_limited": 0, "queue_full": 0, "queue_timeout": 0}
+
+    def _reject(self, reason: str, retry_after: float) -> AdmissionRejected:
+        self.rejected[reason] += 1
+        metrics.admission_rejected.labels(reason).inc()
+        return AdmissionRejected(reason, retry_after)
+
+    def _bucket(self, table: dict, key: Optional[str], limit: tuple, now: float) -> Optional[TokenBucket]:
+        rate, burst = limit
+        if rate <= 0 or key is None:
+            return None
+        bucket = table.get(key)
+        if bucket is None:
+            if len(table) >= _MAX_BUCKETS:
+                for idle in [k for k, b in table.items() if b.full(now)]:
+                    del table[idle]
+            bucket = table[key] = TokenBucket(rate, burst, now)
+        return bucket
+
+    def check(self, client: Optional[str], session_id: Optional[str]) -> None:
+        """Take a token from every applicable bucket, or raise AdmissionRejected (taking none)."""
+        now = time.monotonic()
+        if self._global is None and self._global_limit[0] > 0:
+            self._global = TokenBucket(*self._global_limit, now)
+        buckets = [
+            b
+            for b in (
+                self._global,
+                self._bucket(self._clients, client, self._client_limit, now),
+                self._bucket(self._sessions, session_id, self._session_limit, now),
+            )
+            if b is not None
+        ]
+        wait = max((b.wait(now) for b in buckets), default=0.0)
+        if wait > 0:
+            raise self._reject("rate_limited", wait)
+        for b in buckets:
+            b.take()
+
+    def _retry_after(self) -> float:
+        return self._service * (self.waiting + 1) / self.max_active
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITIES["normal"]) -> AsyncIterator[None]:
+        """Hold one of `max_active` generation slots, queueing by priority if none is free."""
+        started = time.monotonic()
+        if self.active < self.max_active and not self.waiting:
+            self.active += 1
+        else:
+            if self.waiting >= self.queue_max:
+                raise self._reject("queue_full", self._retry_after())
+            fut: asyncio.Future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._queue, (priority, next(self._seq), fut))
+            self.waiting += 1
+            self.queued += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            try:
+                # `_release` hands its slot over by resolving the future.
+                await asyncio.wait_for(fut, self.queue_timeout if self.queue_timeout > 0 else None)
+            except asyncio.TimeoutError:
+                raise self._reject("queue_timeout", self._retry_after()) from None
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    self._release()  # granted just as we were cancelled
+                raise
+            finally:
+                self.waiting -= 1
+        acquired = time.monotonic()
+        self.admitted += 1
+        self._waits.append(acquired - started)
+        metrics.admission_wait_seconds.labels(_PRIORITY_NAMES.get(priority, str(priority))).observe(acquired - started)
+        try:
+            yield
+        finally:
+            held = time.monotonic() - acquired
+            self._service = held if not self._service else 0.8 * self._service + 0.2 * held
+            self._release()
+
+    def _release(self) -> None:
+        while self._queue:
+            _, _, fut = heapq.heappop(self._queue)
+            if not fut.done() and not fut.get_loop().is_closed():
+                fut.set_result(None)
+                return
+        self.active -= 1
+
+    def _wait_percentile(self, q: float) -> Optional[float]:
+        if not self._waits:
+            return None
+        ordered = sorted(self._waits)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+    def reset(self) -> None:
+        """Forget buckets, counters and samples (slots in use are kept)."""
+        self._global = None
+        self._clients.clear()
+        self._sessions.clear()
+        self._waits.clear()
+        self._service = 0.0
+        self._reset_counters()
+
+    def snapshot(self) -> dict:
+        p50, p95 = self._wait_percentile(0.5), self._wait_percentile(0.95)
+        return {
+            "active": self.active,
+            "max_active": self.max_active,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "queue_max": self.queue_max,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": dict(self.rejected),
+            "wait_p50_ms": None if p50 is None else 1000 * p50,
+            "wait_p95_ms": None if p95 is None else 1000 * p95,
+            "avg_generation_s": self._service,
+            "tracked_clients": len(self._clients),
+            "tracked_sessions": len(self._sessions),
+        }
+
+
+def create_controller() -> AdmissionController:
+    s = get_settings()
+    return AdmissionController(
+        max_active=s.max_concurrent_generations,
+        queue_max=s.admission_queue_max,
+        queue_timeout=s.admission_queue_timeout,
+        global_rate=s.admission_global_rate,
+        global_burst=s.admission_global_burst,
+        client_rate=s.admission_client_rate,
+        client_burst=s.admission_client_burst,
+        session_rate=s.admission_session_rate,
+        session_burst=s.admission_session_burst,
+    )
+
+
+admission = create_controller()
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+"""Process-wide registry of reusable LLM clients.
+
+Building a `ChatOpenAI` per call also builds a fresh httpx client (SSL context,
+connection pool) and pays a TCP/TLS handshake on the first request. Instead we
+keep one client per (model, base_url, temperature, max_tokens) and let every
+client share the same keep-alive httpx pools (HTTP/2 when `h2` is installed).
+
+Async httpx connections belong to the event loop that opened them, so the pool
+is rebuilt if it is used from a different running loop (tests, benchmarks).
+
+httpx and langchain-openai are imported when the first client is built.
+"""
+
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+
+from app.core.config import get_settings
+
+if TYPE_CHECKING:
+    import httpx
+    from langchain_openai import ChatOpenAI
+
+
+ClientKey = tuple[str, str, float, int]
+
+
+@dataclass
+class PoolStats:
+    hits: int = 0
+    misses: int = 0
+    resets: int = 0
+
+    def as_dict(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "resets": self.resets,
+            "hit_ratio": (self.hits / total) if total else 0.0,
+        }
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class LLMClientPool:
+    def __init__(self) -> None:
+        self._clients: dict[ClientKey, ChatOpenAI] = {}
+        self._http: Optional[httpx.Client] = None
+        self._ahttp: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self.stats = PoolStats()
+
+    def get(self, model_name: str) -> ChatOpenAI:
+        settings = get_settings()
+        key: ClientKey = (
+            model_name,
+            settings.openrouter_base_url,
+            settings.temperature,
+            settings.generation_max_tokens,
+        )
+        with self._lock:
+            self._check_loop()
+            client = self._clients.get(key)
+            if client is not None:
+                self.stats.hits += 1
+                return client
+            self.stats.misses += 1
+            from langchain_openai import ChatOpenAI
+
+            http, ahttp = self._http_clients()
+            # langchain-openai uses `model`, `api_key`, `base_url` parameter names.
+            client = ChatOpenAI(
+                model=model_name,
+                api_key=settings.openrouter_api_key,
+                base_url=settings.openrouter_base_url,
+                temperature=settings.temperature,
+                max_tokens=settings.generation_max_tokens,
+                http_client=http,
+                http_async_client=ahttp,
+                stream_usage=True,  # usage (prompt tokens) on streamed replies too
+            )
+            self._clients[key] = client
+            return client
+
+    def reset(self) -> None:
+        """Drop all clients; the next `get` rebuilds them (old pools are left to GC)."""
+        with self._lock:
+            self._reset_locked()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats.as_dict(), "clients": len(self._clients)}
+
+    # -- internals (call with the lock held) --
+
+    def _check_loop(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # sync caller: only the sync httpx client is used
+        if self._loop is None:
+            self._loop = loop
+        elif self._loop is not loop:
+            self._reset_locked()
+            self._loop = loop
+
+    def _reset_locked(self) -> None:
+        if self._clients or self._http is not None:
+            self.stats.resets += 1
+        self._clients.clear()
+        if self._http is not None:
+            self._http.close()
+        self._http = None
+        self._ahttp = None
+        self._loop = None
+
+    def _http_clients(self) -> tuple[httpx.Client, httpx.AsyncClient]:
+        if self._http is None or self._ahttp is None:
+            import httpx
+
+            settings = get_settings()
+            limits = httpx.Limits(
+                max_connections=settings.llm_pool_max_connections,
+                max_keepalive_connections=settings.llm_pool_max_keepalive,
+                keepalive_expiry=settings.llm_pool_idle_timeout,
+            )
+            timeout = httpx.Timeout(settings.llm_request_timeout, connect=10.0)
+            http2 = settings.llm_http2 and _http2_available()
+            self._http = httpx.Client(limits=limits, timeout=timeout, http2=http2)
+            self._ahttp = httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+        return self._http, self._ahttp
+
+
+client_pool = LLMClientPool()
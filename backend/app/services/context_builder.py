@@ -1,30 +1,318 @@
 from __future__ import annotations
 
-"""MVP context builder to reduce tokens by truncating large existing code.
+"""Token-budgeted context builder for the existing page.
 
-Strategy (minimal):
-1. If no code or code length <= MAX_CHARS -> return as-is.
-2. Else return head portion + tail portion with a marker comment indicating truncation.
+Sending the full `index.html` every turn makes prompt size (and latency) grow
+with the page. Instead we:
 
-Future extensions (not implemented here): structure summary, recent diffs, targeted section extraction.
+1. Split the page into sections: `<style>` / `<script>` blocks in `<head>` and
+   top-level `<body>` children (header, section, footer, scripts, ...). The
+   text between sections (doctype, meta tags, body wrapper) is the "frame" and
+   is always sent.
+2. Score each section against the user message (keyword / CJK bigram overlap,
+   id/class/heading matches, style vs script hints).
+3. Fill `Settings.context_token_budget` with the highest scoring sections and
+   replace every other section with a one-line outline marker
+   `<!-- @keep:s3 <section id="pricing"> "Pricing" ~850 tokens -->`.
+
+The model is told to copy markers verbatim for sections it leaves alone;
+`CodeContext.restore` swaps them back for the original text afterwards, so the
+stored page is always complete.
 """
 
-from typing import TYPE_CHECKING
+import re
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+from app.core.config import get_settings
 
 if TYPE_CHECKING:  # pragma: no cover
     from app.services.repository import SessionData
 
-MAX_CHARS = 6000  # rough safe size; adjust later
-HEAD_KEEP = 3500
-TAIL_KEEP = 1800
+MIN_ELIDE_TOKENS = 40  # sections smaller than this are cheaper to keep than to outline
+
+_TAG_RE = re.compile(r"<!--.*?-->|<(/?)([a-zA-Z][\w:-]*)\b[^>]*?(/?)>", re.DOTALL)
+_MARKER_RE = re.compile(r"<!--\s*@keep:(s\d+)\b.*?-->", re.DOTALL)
+_HEADING_RE = re.compile(r"<h[1-3]\b[^>]*>(.*?)</h[1-3]>", re.DOTALL | re.IGNORECASE)
+_STRIP_TAGS_RE = re.compile(r"<[^>]+>")
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9_-]{2,}")
+_CJK_RE = re.compile(r"[\u4e00-\u9fff]+")
+_VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "param", "source", "track", "wbr",
+}
+_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "make", "add", "please", "page",
+    "can", "you", "from", "into", "some", "more", "less", "change", "update", "use",
+}
+_STYLE_HINTS = {
+    "color", "colour", "style", "css", "font", "theme", "dark", "light", "layout",
+    "responsive", "spacing", "margin", "padding", "background", "颜色", "样式", "字体", "主题", "布局", "背景",
+}
+_SCRIPT_HINTS = {
+    "click", "button", "javascript", "function", "interactive", "animation", "event",
+    "validate", "submit", "toggle", "交互", "点击", "动画", "脚本", "按钮",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars per token for code/English)."""
+    return (len(text) + 3) // 4
+
+
+@dataclass
+class Section:
+    id: str
+    kind: str  # "style" | "script" | tag name of a top-level body element
+    start: int
+    end: int
+    text: str
+    label: str
+    tokens: int
+    score: float = 0.0
+
+
+@dataclass
+class CodeContext:
+    """What was sent to the model for the existing code, and how to undo elision."""
+
+    snippet: str
+    original_tokens: int
+    snippet_tokens: int
+    elided: dict[str, str] = field(default_factory=dict)  # marker id -> original section text
+
+    @property
+    def is_sliced(self) -> bool:
+        return bool(self.elided)
+
+    def restore(self, code: str) -> str:
+        """Replace `@keep` markers in model output with the original sections."""
+        if not self.elided:
+            return code
+        return _MARKER_RE.sub(lambda m: self.elided.get(m.group(1), m.group(0)), code)
+
+
+def split_sections(code: str, max_section_tokens: Optional[int] = None) -> list[Section]:
+    """Head style/script blocks and top-level body children, in document order.
+
+    Body children larger than `max_section_tokens` (e.g. a `<main>` wrapper) are
+    split into their own children so relevance can be judged at a finer grain.
+    """
+    lower = code.lower()
+    spans: list[tuple[str, int, int]] = []
+    head_open = re.search(r"<head\b[^>]*>", lower)
+    head_close = lower.find("</head", head_open.end()) if head_open else -1
+    if head_open and head_close != -1:
+        spans.extend(
+            (tag, s, e)
+            for tag, s, e, _, _ in _children(code, lower, head_open.end(), head_close)
+            if tag in ("style", "script")
+        )
+    body_open = re.search(r"<body\b[^>]*>", lower)
+    if body_open:
+        body_close = lower.rfind("</body")
+        body_range = (body_open.end(), body_close if body_close > body_open.end() else len(code))
+    elif head_open:
+        body_range = (max(head_close, head_open.end()), len(code))
+    else:
+        body_range = (0, len(code))
+    spans.extend(_split_body(code, lower, *body_range, max_section_tokens))
+    spans.sort(key=lambda t: t[1])
+    return [_make_section(code, tag, s, e, i) for i, (tag, s, e) in enumerate(spans)]
+
+
+def _split_body(
+    code: str, lower: str, start: int, end: int, max_section_tokens: Optional[int]
+) -> list[tuple[str, int, int]]:
+    spans: list[tuple[str, int, int]] = []
+    for tag, s, e, inner_s, inner_e in _children(code, lower, start, end):
+        if (
+            max_section_tokens
+            and tag not in ("style", "script")
+            and estimate_tokens(code[s:e]) > max_section_tokens
+        ):
+            nested = _split_body(code, lower, inner_s, inner_e, max_section_tokens)
+            # Only worth it if the children are big enough to be elided on their own.
+            if sum(estimate_tokens(code[ns:ne]) >= MIN_ELIDE_TOKENS for _, ns, ne in nested) > 1:
+                spans.extend(nested)
+                continue
+        spans.append((tag, s, e))
+    return spans
+
+
+def _children(code: str, lower: str, start: int, end: int) -> list[tuple[str, int, int, int, int]]:
+    """Top-level elements of `code[start:end]` as (tag, start, end, inner_start, inner_end)."""
+    found: list[tuple[str, int, int, int, int]] = []
+    stack: list[tuple[str, int, int]] = []  # (tag, start offset, inner start)
+    pos = start
+    while True:
+        m = _TAG_RE.search(code, pos, end)
+        if m is None:
+            break
+        pos = m.end()
+        if m.group(2) is None:  # comment
+            continue
+        closing, name, self_closing = m.group(1), m.group(2).lower(), m.group(3)
+        if not closing and name in ("script", "style"):
+            # Raw text element: jump straight to its closing tag.
+            close = lower.find(f"</{name}", pos, end)
+            gt = lower.find(">", close, end) if close != -1 else -1
+            close_end = end if gt == -1 else gt + 1
+            if not stack:
+                found.append((name, m.start(), close_end, pos, close if close != -1 else end))
+            pos = close_end
+            continue
+        if not closing:
+            if name not in _VOID_TAGS and not self_closing:
+                stack.append((name, m.start(), pos))
+            continue
+        # Closing tag: pop to the matching open tag (tolerates unclosed children).
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i][0] == name:
+                _, s, inner_s = stack[i]
+                del stack[i:]
+                if not stack:
+                    found.append((name, s, m.end(), inner_s, m.start()))
+                break
+    return found
+
+
+def _make_section(code: str, kind: str, start: int, end: int, index: int) -> Section:
+    text = code[start:end]
+    return Section(
+        id=f"s{index}",
+        kind=kind,
+        start=start,
+        end=end,
+        text=text,
+        label=_outline_label(kind, text).replace("-->", ""),
+        tokens=estimate_tokens(text),
+    )
+
+
+def _outline_label(kind: str, text: str) -> str:
+    open_tag = text[: text.find(">") + 1] if ">" in text else text[:80]
+    open_tag = re.sub(r"\s+", " ", open_tag)[:120]
+    if kind == "style":
+        selectors = re.findall(r"([^{}]+)\{", text[len(open_tag):])
+        names = ", ".join(s.strip() for s in selectors[:6] if s.strip())
+        return f"{open_tag} {names}"[:200]
+    if kind == "script":
+        funcs = re.findall(r"function\s+([A-Za-z_$][\w$]*)|(?:const|let)\s+([A-Za-z_$][\w$]*)\s*=", text)
+        names = ", ".join(a or b for a, b in funcs[:8])
+        return f"{open_tag} {names}".strip()[:200]
+    heading = _HEADING_RE.search(text)
+    if heading:
+        title = re.sub(r"\s+", " ", _STRIP_TAGS_RE.sub("", heading.group(1))).strip()[:60]
+        return f'{open_tag} "{title}"'
+    return open_tag
+
+
+def _query_terms(message: str) -> set[str]:
+    msg = message.lower()
+    terms = {w for w in _WORD_RE.findall(msg) if w not in _STOPWORDS}
+    for run in _CJK_RE.findall(msg):
+        terms.update(run[i:i + 2] for i in range(len(run) - 1))
+        if len(run) == 1:
+            terms.add(run)
+    return terms
+
+
+def score_sections(sections: list[Section], message: str) -> None:
+    terms = _query_terms(message)
+    wants_style = bool(terms & _STYLE_HINTS) or any(h in message for h in _STYLE_HINTS if not h.isascii())
+    wants_script = bool(terms & _SCRIPT_HINTS) or any(h in message for h in _SCRIPT_HINTS if not h.isascii())
+    for s in sections:
+        text = s.text.lower()
+        label = s.label.lower()
+        score = 0.0
+        for t in terms:
+            score += min(text.count(t), 5)
+            if t in label:
+                score += 3
+        if s.kind == "style" and wants_style:
+            score += 4
+        if s.kind == "script" and wants_script:
+            score += 4
+        s.score = score
+
+
+def build_context(code: str, user_message: str, budget_tokens: Optional[int] = None) -> CodeContext:
+    """Fit `code` into `budget_tokens` (default `Settings.context_token_budget`; <=0 disables)."""
+    budget = get_settings().context_token_budget if budget_tokens is None else budget_tokens
+    total = estimate_tokens(code)
+    if budget <= 0 or total <= budget:
+        return CodeContext(snippet=code, original_tokens=total, snippet_tokens=total)
+
+    sections = [
+        s for s in split_sections(code, max_section_tokens=max(budget // 4, MIN_ELIDE_TOKENS))
+        if s.tokens >= MIN_ELIDE_TOKENS
+    ]
+    if not sections:
+        return CodeContext(snippet=code, original_tokens=total, snippet_tokens=total)
+    score_sections(sections, user_message)
+
+    markers = {s.id: f"<!-- @keep:{s.id} {s.label} ~{s.tokens} tokens -->" for s in sections}
+    # Start from everything elided, then add back sections by relevance.
+    used = total - sum(s.tokens for s in sections) + sum(estimate_tokens(v) for v in markers.values())
+    keep: set[str] = set()
+    for s in sorted(sections, key=lambda s: (-s.score, s.start)):
+        extra = s.tokens - estimate_tokens(markers[s.id])
+        if used + extra <= budget:
+            keep.add(s.id)
+            used += extra
+
+    snippet, elided = _assemble(code, sections, keep, markers)
+    # Merged markers usually cost less than estimated above; spend the slack.
+    slack = budget - estimate_tokens(snippet)
+    added = False
+    for s in sorted(sections, key=lambda s: (-s.score, s.start)):
+        if s.id not in keep and s.tokens <= slack:
+            keep.add(s.id)
+            slack -= s.tokens
+            added = True
+    if added:
+        snippet, elided = _assemble(code, sections, keep, markers)
+    return CodeContext(
+        snippet=snippet,
+        original_tokens=total,
+        snippet_tokens=estimate_tokens(snippet),
+        elided=elided,
+    )
+
+
+def _assemble(
+    code: str, sections: list[Section], keep: set[str], markers: dict[str, str]
+) -> tuple[str, dict[str, str]]:
+    # Runs of elided siblings separated only by whitespace share one marker.
+    runs: list[list[Section]] = []
+    for s in sections:
+        if s.id in keep:
+            runs.append([s])
+        elif runs and runs[-1][-1].id not in keep and not code[runs[-1][-1].end:s.start].strip():
+            runs[-1].append(s)
+        else:
+            runs.append([s])
+
+    parts: list[str] = []
+    elided: dict[str, str] = {}
+    cursor = 0
+    for run in runs:
+        first, last = run[0], run[-1]
+        parts.append(code[cursor:first.start])
+        if first.id in keep:
+            parts.append(first.text)
+        elif len(run) == 1:
+            parts.append(markers[first.id])
+            elided[first.id] = first.text
+        else:
+            tokens = sum(s.tokens for s in run)
+            parts.append(f"<!-- @keep:{first.id} {first.label} ... +{len(run) - 1} more siblings ~{tokens} tokens -->")
+            elided[first.id] = code[first.start:last.end]
+        cursor = last.end
+    parts.append(code[cursor:])
+    return "".join(parts), elided
 
 
 def build_existing_code_snippet(session: "SessionData", user_message: str) -> str:
-    code = session.code or ""
-    if len(code) <= MAX_CHARS:
-        return code
-    head = code[:HEAD_KEEP]
-    tail = code[-TAIL_KEEP:]
-    omitted = len(code) - (len(head) + len(tail))
-    marker = f"\n<!-- TRUNCATED {omitted} chars omitted for context. Model: preserve unchanged middle sections. -->\n"
-    return head + marker + tail
+    return build_context(session.code or "", user_message).snippet
@@ -1,17 +1,96 @@
 from __future__ import annotations
 
-import difflib
+"""Unified diffs between page versions, with the DIFF_* budgets applied.
+
+The engine (histogram diff, token mode for long lines, budgets) lives in
+`vibe_core.diff`, shared with the Cloudflare worker. This module fills its
+budgets from the settings, records every call in `diff_stats` and the
+`vibe_diff_duration_seconds` histogram, and offers `aunified_diff`, which runs
+large diffs in a worker thread so the event loop keeps serving other sessions
+while they are computed.
+"""
+
+import asyncio
+import threading
 from typing import Optional
 
+from app.core import metrics
+from app.core.config import get_settings
+from vibe_core import diff as engine
+from vibe_core.diff import DiffResult
 
-def unified_diff(old: Optional[str], new: Optional[str], filename: str = "index.html") -> str:
-    old_lines = (old or "").splitlines(keepends=True)
-    new_lines = (new or "").splitlines(keepends=True)
-    diff = difflib.unified_diff(
-        old_lines,
-        new_lines,
-        fromfile=f"a/{filename}",
-        tofile=f"b/{filename}",
-        lineterm="",
+_INLINE_CHARS = 32 * 1024  # smaller inputs are diffed on the event loop
+
+
+class DiffStats:
+    """Diff calls per mode and time spent since process start (thread-safe)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def observe(self, result: DiffResult) -> None:
+        metrics.diff_seconds.labels(result.mode).observe(result.seconds)
+        with self._lock:
+            self.calls += 1
+            self.modes[result.mode] = self.modes.get(result.mode, 0) + 1
+            self.total_seconds += result.seconds
+            self.max_seconds = max(self.max_seconds, result.seconds)
+
+    def reset(self) -> None:
+        self.calls = 0
+        self.modes: dict[str, int] = {}
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "modes": dict(self.modes),
+                "avg_ms": 1000 * self.total_seconds / self.calls if self.calls else 0.0,
+                "max_ms": 1000 * self.max_seconds,
+            }
+
+
+diff_stats = DiffStats()
+
+
+def matching_blocks(a: list[str], b: list[str], timeout: Optional[float] = None) -> Optional[list[tuple[int, int, int]]]:
+    """`vibe_core.diff.matching_blocks` with the DIFF_TIMEOUT budget by default."""
+    return engine.matching_blocks(a, b, get_settings().diff_timeout if timeout is None else timeout)
+
+
+def compute_diff(
+    old: Optional[str],
+    new: Optional[str],
+    filename: str = "index.html",
+    context: int = 3,
+    timeout: Optional[float] = None,
+    max_bytes: Optional[int] = None,
+    long_line: Optional[int] = None,
+) -> DiffResult:
+    """Unified diff of `old` -> `new`; budgets default to the DIFF_* settings."""
+    s = get_settings()
+    result = engine.compute_diff(
+        old,
+        new,
+        filename,
+        context,
+        timeout=s.diff_timeout if timeout is None else timeout,
+        max_bytes=s.diff_max_bytes if max_bytes is None else max_bytes,
+        long_line=s.diff_long_line if long_line is None else long_line,
     )
-    return "\n".join(diff)
+    diff_stats.observe(result)
+    return result
+
+
+def unified_diff(old: Optional[str], new: Optional[str], filename: str = "index.html") -> str:
+    return compute_diff(old, new, filename).text
+
+
+async def aunified_diff(old: Optional[str], new: Optional[str], filename: str = "index.html") -> str:
+    """`unified_diff` off the event loop for inputs large enough to matter."""
+    if len(old or "") + len(new or "") < _INLINE_CHARS:
+        return unified_diff(old, new, filename)
+    return await asyncio.to_thread(unified_diff, old, new, filename)
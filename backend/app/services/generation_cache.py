@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+"""Content-addressed cache of LLM replies for deterministic generations.
+
+At low temperature the same (models, params, system prompt, user prompt with
+existing code) yields the same page, e.g. demo templates and client retries.
+Replies are cached under a sha256 of exactly what would be sent:
+
+- memory tier: LRU bounded by entry count and total characters;
+- optional disk tier (`Settings.generation_cache_dir`): zlib-compressed JSON
+  files, pruned oldest-first past `generation_cache_disk_max_bytes`;
+- every entry expires after `generation_cache_ttl` seconds. Expired entries
+  are dropped when next looked up and counted in `expired` (once per tier);
+  `evictions` counts memory entries pushed out by the size bounds.
+
+Disk I/O from the async API runs in a worker thread.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Optional
+
+from app.core.config import get_settings
+
+
+class GenerationCache:
+    def __init__(
+        self,
+        max_entries: int = 512,
+        max_chars: int = 64 * 1024 * 1024,
+        ttl: float = 3600.0,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 512 * 1024 * 1024,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.ttl = ttl
+        self.disk_dir: Optional[Path] = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self._mem: "OrderedDict[str, tuple[float, str]]" = OrderedDict()  # key -> (created, text)
+        self._chars = 0
+        self._disk_lock = threading.Lock()
+        self._disk_bytes = 0
+        self.counters = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "puts": 0, "evictions": 0, "expired": 0}
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(p.stat().st_size for p in self.disk_dir.glob("*.z"))
+
+    @staticmethod
+    def make_key(models: Iterable[str], temperature: float, max_tokens: int, messages: Iterable[tuple[str, str]]) -> str:
+        payload = json.dumps(
+            {"models": list(models), "temperature": temperature, "max_tokens": max_tokens, "messages": list(messages)},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # -- sync API --
+
+    def get(self, key: str) -> Optional[str]:
+        text = self._get_memory(key)
+        if text is None and self.disk_dir is not None:
+            text = self._promote(key, self._read_disk(key))
+        if text is None:
+            self.counters["misses"] += 1
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        self.counters["puts"] += 1
+        self._put_memory(key, text, time.time())
+        if self.disk_dir is not None:
+            self._put_disk(key, text)
+
+    # -- async API (disk tier off the event loop) --
+
+    async def aget(self, key: str) -> Optional[str]:
+        text = self._get_memory(key)
+        if text is None and self.disk_dir is not None:
+            text = self._promote(key, await asyncio.to_thread(self._read_disk, key))
+        if text is None:
+            self.counters["misses"] += 1
+        return text
+
+    async def aput(self, key: str, text: str) -> None:
+        self.counters["puts"] += 1
+        self._put_memory(key, text, time.time())
+        if self.disk_dir is not None:
+            await asyncio.to_thread(self._put_disk, key, text)
+
+    def clear(self) -> None:
+        self._mem.clear()
+        self._chars = 0
+        if self.disk_dir is not None:
+            with self._disk_lock:
+                for p in self.disk_dir.glob("*.z"):
+                    p.unlink(missing_ok=True)
+                self._disk_bytes = 0
+
+    def stats(self) -> dict:
+        hits = self.counters["hits_memory"] + self.counters["hits_disk"]
+        lookups = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_ratio": (hits / lookups) if lookups else 0.0,
+            "entries": len(self._mem),
+            "chars": self._chars,
+            "disk_bytes": self._disk_bytes,
+        }
+
+    # -- internals --
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        entry = self._mem.get(key)
+        if entry is None:
+            return None
+        created, text = entry
+        if self.ttl and time.time() - created > self.ttl:
+            self._evict(key)
+            self.counters["expired"] += 1
+            return None
+        self._mem.move_to_end(key)
+        self.counters["hits_memory"] += 1
+        return text
+
+    def _put_memory(self, key: str, text: str, created: float) -> None:
+        if len(text) > self.max_chars:
+            return
+        if key in self._mem:
+            self._evict(key)
+        self._mem[key] = (created, text)
+        self._chars += len(text)
+        while self._mem and (len(self._mem) > self.max_entries or self._chars > self.max_chars):
+            self._evict(next(iter(self._mem)))
+            self.counters["evictions"] += 1
+
+    def _evict(self, key: str) -> None:
+        _, text = self._mem.pop(key)
+        self._chars -= len(text)
+
+    def _disk_path(self, key: str) -> Path:
+        assert self.disk_dir is not None
+        return self.disk_dir / f"{key}.z"
+
+    def _read_disk(self, key: str) -> Optional[tuple[float, str]]:
+        path = self._disk_path(key)
+        try:
+            entry = json.loads(zlib.decompress(path.read_bytes()))
+        except (FileNotFoundError, zlib.error, ValueError):
+            return None
+        if self.ttl and time.time() - entry["created"] > self.ttl:
+            with self._disk_lock:
+                self._unlink(path)
+                self.counters["expired"] += 1
+            return None
+        return entry["created"], entry["text"]
+
+    def _promote(self, key: str, entry: Optional[tuple[float, str]]) -> Optional[str]:
+        """Count a disk hit and copy it to memory, keeping its creation time for TTL."""
+        if entry is None:
+            return None
+        self.counters["hits_disk"] += 1
+        self._put_memory(key, entry[1], entry[0])
+        return entry[1]
+
+    def _put_disk(self, key: str, text: str) -> None:
+        data = zlib.compress(json.dumps({"created": time.time(), "text": text}).encode("utf-8"))
+        path = self._disk_path(key)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with self._disk_lock:
+            self._unlink(path)
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            self._disk_bytes += len(data)
+            if self._disk_bytes > self.disk_max_bytes:
+                files = sorted(self.disk_dir.glob("*.z"), key=lambda p: p.stat().st_mtime)
+                for old in files:
+                    if self._disk_bytes <= self.disk_max_bytes * 0.9:
+                        break
+                    self._unlink(old)
+
+    def _unlink(self, path: Path) -> None:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return
+        self._disk_bytes -= size
+
+
+def create_cache() -> GenerationCache:
+    s = get_settings()
+    return GenerationCache(
+        max_entries=s.generation_cache_max_entries,
+        max_chars=s.generation_cache_max_chars,
+        ttl=s.generation_cache_ttl,
+        disk_dir=s.generation_cache_dir or None,
+        disk_max_bytes=s.generation_cache_disk_max_bytes,
+    )
+
+
+generation_cache = create_cache()
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+"""Hedged, fail-over LLM calls across the configured model list.
+
+`hedged_call` starts the first available model and, if it has not answered
+within the hedge delay (fixed, or the model's recent p95 latency), starts the
+next one in parallel. The first successful reply wins and the other calls are
+cancelled. Retryable failures (permission/region, timeouts, 429, 5xx,
+connection errors) fail over to the next model immediately; anything else is
+raised as-is.
+
+`ModelHealth` keeps per-model latency samples and a circuit breaker: after
+`failure_threshold` consecutive failures a model is skipped for
+`reset_timeout` seconds, then a single probe call is let through (half-open).
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+from app.core import metrics
+from app.core.config import get_settings
+
+
+class ModelsExhaustedError(Exception):
+    """Every candidate model failed with a retryable error."""
+
+    def __init__(self, attempted: list[str], errors: list[Exception]):
+        super().__init__(f"All models failed: {attempted}. Last error: {errors[-1] if errors else None}")
+        self.attempted = attempted
+        self.errors = errors
+
+
+@dataclass
+class ModelStats:
+    latencies: deque = field(default_factory=lambda: deque(maxlen=100))
+    successes: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    opened_at: Optional[float] = None  # circuit open since (monotonic)
+    probing: bool = False  # half-open probe in flight
+    hedge_wins: int = 0
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+class ModelHealth:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._models: dict[str, ModelStats] = {}
+        self.hedges_launched = 0
+
+    def get(self, model: str) -> ModelStats:
+        stats = self._models.get(model)
+        if stats is None:
+            stats = self._models[model] = ModelStats()
+        return stats
+
+    def allows(self, model: str) -> bool:
+        stats = self.get(model)
+        if stats.opened_at is None:
+            return True
+        return not stats.probing and time.monotonic() - stats.opened_at >= self.reset_timeout
+
+    def begin(self, model: str) -> None:
+        """Mark a call as started; on an open breaker it is the single half-open probe."""
+        stats = self.get(model)
+        if stats.opened_at is not None:
+            stats.probing = True
+
+    def available(self, models: list[str]) -> list[str]:
+        """Models whose breaker is closed (or due a probe); all of them if every breaker is open."""
+        allowed = [m for m in models if self.allows(m)]
+        return allowed or list(models)
+
+    def record_success(self, model: str, latency: float) -> None:
+        metrics.llm_requests.labels(model, "success").inc()
+        metrics.llm_request_seconds.labels(model).observe(latency)
+        stats = self.get(model)
+        stats.latencies.append(latency)
+        stats.successes += 1
+        stats.consecutive_failures = 0
+        stats.opened_at = None
+        stats.probing = False
+
+    def record_failure(self, model: str) -> None:
+        metrics.llm_requests.labels(model, "error").inc()
+        stats = self.get(model)
+        stats.failures += 1
+        stats.consecutive_failures += 1
+        if stats.probing or stats.consecutive_failures >= self.failure_threshold:
+            stats.opened_at = time.monotonic()
+        stats.probing = False
+
+    def record_cancelled(self, model: str) -> None:
+        metrics.llm_requests.labels(model, "cancelled").inc()
+        self.get(model).probing = False
+
+    def reset(self) -> None:
+        self._models.clear()
+        self.hedges_launched = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "hedges_launched": self.hedges_launched,
+            "models": {
+                name: {
+                    "state": "closed" if s.opened_at is None else ("half_open" if s.probing else "open"),
+                    "successes": s.successes,
+                    "failures": s.failures,
+                    "hedge_wins": s.hedge_wins,
+                    "p50_s": s.percentile(0.5),
+                    "p95_s": s.percentile(0.95),
+                }
+                for name, s in self._models.items()
+            },
+        }
+
+
+async def hedged_call(
+    models: list[str],
+    call: Callable[[str], Awaitable[Any]],
+    is_retryable: Callable[[Exception], bool],
+    health: ModelHealth,
+    hedge_delay: Optional[float] = None,
+    max_parallel: int = 2,
+) -> tuple[Any, str]:
+    """Return (result, model_name) of the first successful call.
+
+    Raises the first non-retryable error, or ModelsExhaustedError.
+    """
+    queue = health.available(models)
+    if not queue:
+        raise RuntimeError("No models attempted - configuration error")
+    attempted: list[str] = []
+    errors: list[Exception] = []
+    pending: dict[asyncio.Task, tuple[str, float, bool]] = {}  # task -> (model, start, hedged)
+
+    def launch(hedged: bool) -> None:
+        model = queue.pop(0)
+        if hedged:
+            metrics.llm_hedges.labels(model).inc()
+        attempted.append(model)
+        health.begin(model)
+        pending[asyncio.ensure_future(call(model))] = (model, time.monotonic(), hedged)
+
+    launch(hedged=False)
+    try:
+        while pending:
+            can_hedge = hedge_delay is not None and queue and len(pending) < max_parallel
+            done, _ = await asyncio.wait(
+                pending, timeout=hedge_delay if can_hedge else None, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:  # slow: hedge with the next model
+                health.hedges_launched += 1
+                launch(hedged=True)
+                continue
+            for task in done:
+                model, start, hedged = pending.pop(task)
+                exc = task.exception()
+                if exc is None:
+                    health.record_success(model, time.monotonic() - start)
+                    if hedged:
+                        health.get(model).hedge_wins += 1
+                    return task.result(), model
+                health.record_failure(model)
+                if not is_retryable(exc):
+                    raise exc
+                errors.append(exc)
+                metrics.llm_fallbacks.labels(model).inc()
+            # Fail over right away instead of waiting for a hedge timer.
+            while queue and len(pending) < max(1, max_parallel if hedge_delay is not None else 1):
+                launch(hedged=False)
+    finally:
+        for task, (model, _, _) in pending.items():
+            task.cancel()
+            health.record_cancelled(model)
+    raise ModelsExhaustedError(attempted, errors)
+
+
+def resolve_hedge_delay(health: ModelHealth, primary: str) -> Optional[float]:
+    """Hedge delay from `Settings.hedge_delay`; None disables hedging."""
+    s = get_settings()
+    setting = s.hedge_delay.strip().lower()
+    if setting in ("", "off", "0", "false", "no"):
+        return None
+    if setting == "p95":
+        # Too few samples for a meaningful p95: use the floor.
+        stats = health.get(primary)
+        p95 = stats.percentile(0.95) if len(stats.latencies) >= 10 else None
+        return max(s.hedge_min_delay, p95 or 0.0)
+    return max(0.0, float(setting))
+
+
+def create_health() -> ModelHealth:
+    s = get_settings()
+    return ModelHealth(failure_threshold=s.breaker_failure_threshold, reset_timeout=s.breaker_reset_timeout)
+
+
+model_health = create_health()
@@ -6,14 +6,31 @@ Updated to use the provider-specific LangChain packages (langchain-openai &
 langchain-core) instead of the legacy dynamic import path that required
 `langchain_community`. This avoids the ModuleNotFoundError the user saw
 (`No module named 'langchain_community'`) on LangChain >=0.2.x.
+
+LangChain is imported on first use rather than at import time, so that
+`import app.main` (and `/health`) does not wait for it; see
+`app.services.warmup`.
 """
 
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
+import asyncio
+import time
+from .client_pool import client_pool
+from .generation_cache import generation_cache
+from .hedging import ModelsExhaustedError, hedged_call, model_health, resolve_hedge_delay
+from .context_builder import CodeContext, build_context, estimate_tokens
+from .patch import apply_patch_reply
+from .repair import stitch, truncation_issues
+from .tokens import count_message_tokens
 from .repository import SessionData
+from app.core import metrics
 from app.core.config import get_settings
-from app.core import prompts
-from typing import Iterable, Optional
+from vibe_core import prompts
+from vibe_core.extract import page_code
+from typing import TYPE_CHECKING, AsyncIterator, Iterable, Optional
+
+if TYPE_CHECKING:
+    from langchain_core.messages import AIMessage, BaseMessage
+    from langchain_openai import ChatOpenAI
 
 
 class LLMAccessError(Exception):
@@ -25,16 +42,18 @@ class LLMAccessError(Exception):
         self.last_error = last_error
 
 
+class LLMUnavailableError(Exception):
+    """Raised when every model failed with a transient error (timeout, 429, 5xx)."""
+
+    def __init__(self, attempted: list[str], last_error: Exception):
+        super().__init__(f"No model available: {attempted}. Last error: {last_error}")
+        self.attempted = attempted
+        self.last_error = last_error
+
+
 def build_llm(model_name: str) -> ChatOpenAI:
-    settings = get_settings()
-    # langchain-openai uses `model`, `api_key`, `base_url` parameter names.
-    return ChatOpenAI(
-        model=model_name,
-        api_key=settings.openrouter_api_key,
-        base_url=settings.openrouter_base_url,
-        temperature=settings.temperature,
-        max_tokens=settings.generation_max_tokens,
-    )
+    """Return the shared client for `model_name` (see `client_pool`)."""
+    return client_pool.get(model_name)
 
 
 def iter_models() -> Iterable[str]:
@@ -46,48 +65,292 @@ def iter_models() -> Iterable[str]:
             yield m
 
 
+def pick_model() -> Optional[str]:
+    """First model whose circuit breaker lets calls through (for single-model paths like streaming)."""
+    models = model_health.available(list(iter_models()))
+    return models[0] if models else None
+
+
+def resolve_edit_mode(session: SessionData, requested: Optional[str] = None) -> str:
+    """"patch" only makes sense when there is enough existing code to edit."""
+    settings = get_settings()
+    mode = requested or settings.edit_mode
+    if mode != "patch":
+        return "full"
+    if estimate_tokens(session.code or "") < settings.patch_min_code_tokens:
+        return "full"
+    return "patch"
+
+
+_CACHE_HINT_MODELS = ("anthropic/", "google/gemini")  # OpenRouter providers without automatic prefix caching
+
+
+def cache_hints_enabled() -> bool:
+    """Whether prompts carry `cache_control` breakpoints (PROMPT_CACHE_HINTS=auto|on|off)."""
+    setting = get_settings().prompt_cache_hints.strip().lower()
+    if setting in ("on", "1", "true", "yes"):
+        return True
+    if setting in ("off", "0", "false", "no"):
+        return False
+    return any(m.startswith(_CACHE_HINT_MODELS) for m in iter_models())
+
+
+def _cached_part(text: str) -> dict:
+    return {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+
+
+def build_messages(
+    session: SessionData, user_message: str, edit_mode: str = "full"
+) -> tuple[list[BaseMessage], CodeContext]:
+    """System + user messages for one generation turn.
+
+    The existing code goes through the token-budgeted context builder; the
+    returned `CodeContext` must be used to `finalize_code` (or
+    `finalize_patch`) the model output.
+
+    Ordered for provider prefix caching, most stable first: the system
+    prompt, then the existing code, then the request. With cache hints, the
+    first two end in `cache_control` breakpoints.
+    """
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    context = build_context(session.code or "", user_message)
+    system = prompts.SYSTEM_PROMPTS.get(get_settings().prompt_variant, prompts.SYSTEM_PROMPT)
+    code_block = prompts.CODE_BLOCK_TEMPLATE.format(existing_code=context.snippet)
+    template = prompts.PATCH_INSTRUCTION_TEMPLATE if edit_mode == "patch" else prompts.USER_INSTRUCTION_TEMPLATE
+    request = template.format(message=user_message)
+    if context.is_sliced:
+        request += prompts.PATCH_ELIDED_NOTE if edit_mode == "patch" else prompts.ELIDED_SECTIONS_NOTE
+    if cache_hints_enabled():
+        return [
+            SystemMessage(content=[_cached_part(system)]),
+            HumanMessage(content=[_cached_part(code_block), {"type": "text", "text": request}]),
+        ], context
+    return [SystemMessage(content=system), HumanMessage(content=code_block + request)], context
+
+
+def finalize_code(text: str, context: CodeContext) -> str:
+    """Extract the page from a full-page reply and restore elided sections.
+
+    `vibe_core.extract.page_code` decides what counts as a page (the worker
+    applies the same rule); a reply without one raises `InvalidGeneration`.
+    """
+    return context.restore(page_code(text))
+
+
+def continuation_messages(messages: list[BaseMessage], partial: str) -> list[BaseMessage]:
+    """Prompt asking the model to continue the cut-off reply `partial` (see `app.services.repair`)."""
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    return [*messages, AIMessage(content=partial), HumanMessage(content=prompts.CONTINUE_INSTRUCTION)]
+
+
+def finalize_patch(text: str, context: CodeContext) -> str:
+    """Apply edit blocks to the code the model saw, then restore elided sections."""
+    return context.restore(apply_patch_reply(context.snippet, text))
+
+
+def finish_reason(resp) -> Optional[str]:
+    """Why the provider stopped ("stop", "length", ...), if it said."""
+    return (getattr(resp, "response_metadata", None) or {}).get("finish_reason")
+
+
+def completion_tokens(resp) -> int:
+    """Provider-reported output tokens, falling back to an estimate."""
+    usage = getattr(resp, "usage_metadata", None) or {}
+    if "output_tokens" in usage:
+        return int(usage["output_tokens"])
+    return estimate_tokens(resp.content or "")
+
+
+def prompt_usage(messages: list[BaseMessage], resp=None, usage: Optional[dict] = None) -> tuple[int, int]:
+    """(prompt tokens, of which served from the provider's prompt cache).
+
+    Provider-reported when the reply (or `usage`, the metadata collected by
+    `astream_tokens`) carries usage: OpenRouter / OpenAI
+    `prompt_tokens_details.cached_tokens`, DeepSeek `prompt_cache_hit_tokens`.
+    Otherwise counted locally with no cache hits.
+    """
+    if usage is None:
+        usage = getattr(resp, "usage_metadata", None) or {}
+    if "input_tokens" not in usage:
+        return count_message_tokens(messages), 0
+    cached = (usage.get("input_token_details") or {}).get("cache_read")
+    if cached is None:
+        raw = (getattr(resp, "response_metadata", None) or {}).get("token_usage") or {}
+        cached = (raw.get("prompt_tokens_details") or {}).get("cached_tokens") or raw.get("prompt_cache_hit_tokens")
+    return int(usage["input_tokens"]), int(cached or 0)
+
+
+def _observe_usage(model_name: str, prompt: tuple[int, int], completion: int, seconds: float) -> None:
+    metrics.llm_prompt_tokens.labels(model_name).inc(prompt[0])
+    metrics.llm_cached_prompt_tokens.labels(model_name).inc(prompt[1])
+    metrics.llm_completion_tokens.labels(model_name).inc(completion)
+    if completion and seconds > 0:
+        metrics.llm_output_tokens_per_second.labels(model_name).observe(completion / seconds)
+
+
 def generate_code(session: SessionData, user_message: str) -> tuple[str, str]:
-    """Return (assistant_text, full_code) using FULL existing code (no truncation)."""
-    existing_code = session.code or ""
-    user_content = prompts.USER_INSTRUCTION_TEMPLATE.format(
-        message=user_message, existing_code=existing_code
+    """Return (assistant_text, full_code) without storing anything.
+
+    Blocking helper for scripts and the sync benchmark baseline; the API goes
+    through the generation pipeline in `app.graphs.agent`. Truncated replies
+    are continued as in the pipeline's repair step. A reply without a code
+    fence raises `vibe_core.extract.InvalidGeneration`.
+    """
+    messages, context = build_messages(session, user_message)
+    resp = invoke_cached(messages)
+    text, reason = resp.content, finish_reason(resp)
+    for _ in range(get_settings().repair_max_continuations):
+        if not truncation_issues(text, reason):
+            break
+        more = invoke_cached(continuation_messages(messages, text), use_cache=False)
+        text, reason = stitch(text, more.content), finish_reason(more)
+    return text, finalize_code(text, context)
+
+
+def cache_key(messages: list[BaseMessage]) -> Optional[str]:
+    """Reply-cache key, or None when this generation should not be cached."""
+    s = get_settings()
+    if not s.generation_cache_enabled or s.temperature > s.generation_cache_max_temperature:
+        return None
+    return generation_cache.make_key(
+        iter_models(), s.temperature, s.generation_max_tokens, ((m.type, m.content) for m in messages)
     )
-    messages = [
-        SystemMessage(content=prompts.SYSTEM_PROMPT),
-        HumanMessage(content=user_content),
-    ]
 
+
+def _cached_reply(text: str) -> AIMessage:
+    from langchain_core.messages import AIMessage
+
+    # Nothing was generated, so no output tokens were paid for.
+    return AIMessage(content=text, usage_metadata={"input_tokens": 0, "output_tokens": 0, "total_tokens": 0})
+
+
+async def ainvoke_cached(messages: list[BaseMessage], use_cache: bool = True):
+    """One completion through the reply cache, with model failover and hedging."""
+    key = cache_key(messages) if use_cache else None
+    if key is not None:
+        cached = await generation_cache.aget(key)
+        if cached is not None:
+            return _cached_reply(cached)
+    resp = await _ainvoke_with_fallback(messages)
+    if key is not None and resp.content:
+        await generation_cache.aput(key, resp.content)
+    return resp
+
+
+def invoke_cached(messages: list[BaseMessage], use_cache: bool = True):
+    """Blocking `ainvoke_cached` (sequential failover, no hedging)."""
+    key = cache_key(messages) if use_cache else None
+    if key is not None:
+        cached = generation_cache.get(key)
+        if cached is not None:
+            return _cached_reply(cached)
+    resp = _invoke_with_fallback(messages)
+    if key is not None and resp.content:
+        generation_cache.put(key, resp.content)
+    return resp
+
+
+async def astream_tokens(messages: list[BaseMessage], usage: Optional[dict] = None) -> AsyncIterator[str]:
+    """Stream reply text from the first healthy model (no failover once tokens flow).
+
+    `usage`, if given, receives the reply's usage metadata once the stream ends
+    (input_tokens / output_tokens; only if the provider reports it) and its
+    `finish_reason`.
+    """
+    model_name = pick_model()
+    if model_name is None:
+        raise RuntimeError("No models attempted - configuration error")
+    llm = build_llm(model_name)
+    model_health.begin(model_name)
+    started = time.monotonic()
+    first: Optional[float] = None
+    chars = 0
+    try:
+        async for chunk in llm.astream(messages):  # type: ignore[attr-defined]
+            if usage is not None:
+                if getattr(chunk, "usage_metadata", None):
+                    usage.update(chunk.usage_metadata)
+                reason = finish_reason(chunk)
+                if reason:
+                    usage["finish_reason"] = reason
+            if chunk.content:
+                if first is None:
+                    first = time.monotonic()
+                    metrics.llm_time_to_first_token_seconds.labels(model_name).observe(first - started)
+                chars += len(chunk.content)
+                yield chunk.content
+    except (asyncio.CancelledError, GeneratorExit):
+        model_health.record_cancelled(model_name)
+        raise
+    except Exception:
+        model_health.record_failure(model_name)
+        raise
+    finished = time.monotonic()
+    model_health.record_success(model_name, finished - started)
+    reported = usage or {}
+    completion = reported.get("output_tokens") or (chars + 3) // 4  # estimate_tokens without joining the chunks
+    prompt = prompt_usage(messages, usage=reported)
+    _observe_usage(model_name, prompt, completion, finished - (first or started))
+
+
+def _invoke_with_fallback(messages: list[BaseMessage]):
     attempted: list[str] = []
-    last_exc: Optional[Exception] = None
-    for model_name in iter_models():
+    errors: list[Exception] = []
+    for model_name in model_health.available(list(iter_models())):
+        attempted.append(model_name)
+        model_health.begin(model_name)
+        started = time.monotonic()
         try:
-            attempted.append(model_name)
-            llm = build_llm(model_name)
-            # Use explicit invoke for clarity with new LangChain API.
-            resp = llm.invoke(messages)
-            text = resp.content
-            code = extract_code_block(text) or text
-            return text, code
+            resp = build_llm(model_name).invoke(messages)
         except Exception as e:  # Broad catch to handle different openai versions
-            if _is_permission_error(e):
-                last_exc = e
-                continue  # try next fallback
-            # Other errors propagate immediately
-            raise
-    # If we exhausted and only permission errors
-    if last_exc:
-        raise LLMAccessError(attempted, last_exc)
-    raise RuntimeError("No models attempted - configuration error")
+            model_health.record_failure(model_name)
+            if not _is_retryable(e):
+                raise
+            errors.append(e)
+            metrics.llm_fallbacks.labels(model_name).inc()
+            continue
+        seconds = time.monotonic() - started
+        model_health.record_success(model_name, seconds)
+        _observe_usage(model_name, prompt_usage(messages, resp), completion_tokens(resp), seconds)
+        return resp
+    if not errors:
+        raise RuntimeError("No models attempted - configuration error")
+    if all(_is_permission_error(err) for err in errors):
+        raise LLMAccessError(attempted, errors[-1])
+    raise LLMUnavailableError(attempted, errors[-1])
 
 
-def extract_code_block(text: str) -> Optional[str]:
-    import re
+async def _ainvoke_with_fallback(messages: list[BaseMessage]):
+    """Call the models with failover, hedging slow calls (see `app.services.hedging`)."""
+    models = list(iter_models())
+    if not models:
+        raise RuntimeError("No models attempted - configuration error")
 
-    pattern = re.compile(r"```(?:html)?\n(.*?)(?:```)", re.DOTALL)
-    m = pattern.search(text)
-    if m:
-        return m.group(1).strip()
-    return None
+    async def call(model_name: str):
+        started = time.monotonic()
+        resp = await build_llm(model_name).ainvoke(messages)
+        # Every completed call is paid for, including a hedge that finished second.
+        _observe_usage(
+            model_name, prompt_usage(messages, resp), completion_tokens(resp), time.monotonic() - started
+        )
+        return resp
+
+    try:
+        resp, _ = await hedged_call(
+            models,
+            call,
+            _is_retryable,
+            model_health,
+            hedge_delay=resolve_hedge_delay(model_health, models[0]),
+            max_parallel=get_settings().hedge_max_parallel,
+        )
+    except ModelsExhaustedError as e:
+        if all(_is_permission_error(err) for err in e.errors):
+            raise LLMAccessError(e.attempted, e.errors[-1]) from e
+        raise LLMUnavailableError(e.attempted, e.errors[-1]) from e
+    return resp
 
 
 def _is_permission_error(e: Exception) -> bool:
@@ -96,3 +359,13 @@ def _is_permission_error(e: Exception) -> bool:
     keywords = ["permission", "forbidden", "unsupported_country", "region", "territory"]
     return any(k in name or k in msg for k in keywords)
 
+
+def _is_retryable(e: Exception) -> bool:
+    """Errors worth trying another model for: permission/region, timeouts, 429, 5xx, connection."""
+    if _is_permission_error(e) or isinstance(e, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(e, "status_code", None) or getattr(getattr(e, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    name = e.__class__.__name__.lower()
+    return any(k in name for k in ("timeout", "ratelimit", "connection", "internalserver", "unavailable"))
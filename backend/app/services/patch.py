@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+"""Search/replace edit blocks for patch-mode generation.
+
+In patch mode the model answers with one or more blocks
+
+    <<<<<<< SEARCH
+    exact lines from the existing code
+    =======
+    replacement lines
+    >>>>>>> REPLACE
+
+instead of re-emitting the whole page. Each SEARCH text must match the code
+exactly once (a whitespace-insensitive line match is tried as a fallback);
+anything else raises `PatchApplyError` so the caller can fall back to a full
+regeneration.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+_SEARCH_RE = re.compile(r"^<{5,9} ?SEARCH\s*$")
+_DIVIDER_RE = re.compile(r"^={5,9}\s*$")
+_REPLACE_RE = re.compile(r"^>{5,9} ?REPLACE\s*$")
+
+
+class PatchApplyError(ValueError):
+    """Raised when edit blocks are missing, malformed or do not match the code."""
+
+
+@dataclass
+class EditBlock:
+    search: str
+    replace: str
+
+
+def parse_edit_blocks(text: str) -> list[EditBlock]:
+    blocks: list[EditBlock] = []
+    search: Optional[list[str]] = None
+    replace: Optional[list[str]] = None
+    for line in text.splitlines():
+        if search is None:
+            if _SEARCH_RE.match(line):
+                search = []
+            continue
+        if replace is None:
+            if _DIVIDER_RE.match(line):
+                replace = []
+            elif _SEARCH_RE.match(line) or _REPLACE_RE.match(line):
+                raise PatchApplyError("malformed edit block: missing ======= divider")
+            else:
+                search.append(line)
+            continue
+        if _REPLACE_RE.match(line):
+            blocks.append(EditBlock(search="\n".join(search), replace="\n".join(replace)))
+            search = replace = None
+        else:
+            replace.append(line)
+    if search is not None:
+        raise PatchApplyError("malformed edit block: missing >>>>>>> REPLACE")
+    return blocks
+
+
+def apply_edit_blocks(code: str, blocks: list[EditBlock]) -> str:
+    if not blocks:
+        raise PatchApplyError("no edit blocks found")
+    for i, block in enumerate(blocks):
+        if not block.search.strip():
+            raise PatchApplyError(f"edit block {i}: empty SEARCH")
+        count = code.count(block.search)
+        if count == 1:
+            code = code.replace(block.search, block.replace, 1)
+            continue
+        if count > 1:
+            raise PatchApplyError(f"edit block {i}: SEARCH matches {count} times")
+        code = _apply_loose(code, block, i)
+    return code
+
+
+def _apply_loose(code: str, block: EditBlock, index: int) -> str:
+    """Match SEARCH line by line ignoring leading/trailing whitespace."""
+    lines = code.split("\n")
+    needle = [ln.strip() for ln in block.search.split("\n")]
+    while needle and not needle[0]:
+        needle.pop(0)
+    while needle and not needle[-1]:
+        needle.pop()
+    stripped = [ln.strip() for ln in lines]
+    n = len(needle)
+    hits = [i for i in range(len(lines) - n + 1) if stripped[i:i + n] == needle]
+    if len(hits) != 1:
+        detail = "not found" if not hits else f"matches {len(hits)} times"
+        raise PatchApplyError(f"edit block {index}: SEARCH {detail}")
+    start = hits[0]
+    return "\n".join(lines[:start] + block.replace.split("\n") + lines[start + n:])
+
+
+def apply_patch_reply(code: str, reply: str) -> str:
+    """Parse `reply` and apply its edit blocks to `code`, with basic sanity checks."""
+    patched = apply_edit_blocks(code, parse_edit_blocks(reply))
+    if not patched.strip():
+        raise PatchApplyError("patch produced empty code")
+    if "</html>" in code.lower() and "</html>" not in patched.lower():
+        raise PatchApplyError("patch removed </html>")
+    return patched
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+"""Truncation detection and continuation stitching for full-page replies.
+
+A reply that stops at `generation_max_tokens` ends mid-page: the provider
+reports `finish_reason == "length"`, the code fence is never closed and
+structural tags (`</body>`, `</html>`, an open `<script>`) are missing.
+Asking again would regenerate the whole page, and usually hit the same limit.
+Instead the pipeline asks the model to continue where it stopped
+(`vibe_core.prompts.CONTINUE_INSTRUCTION`). The original messages and the
+partial reply come first in that prompt, so the provider's prompt cache
+serves most of it, and only the missing tail is generated. `stitch` joins
+the two and drops text the continuation repeats.
+
+Only tags that a complete page always closes are checked; `<p>`, `<li>` and
+friends have optional end tags, so counting them would flag valid pages.
+"""
+
+import re
+from typing import Optional
+
+from vibe_core.extract import extract_code_block, unclosed_code_block
+
+_OPEN_FENCE = re.compile(r"```(?:html)?\n")
+_STRUCTURAL_TAGS = ("html", "head", "body", "script", "style")
+_OPEN_TAG = re.compile(r"<(%s)[\s>]" % "|".join(_STRUCTURAL_TAGS), re.IGNORECASE)
+_CLOSE_TAG = re.compile(r"</(%s)\s*>" % "|".join(_STRUCTURAL_TAGS), re.IGNORECASE)
+
+_MAX_OVERLAP = 4000  # chars of `partial` a continuation may repeat
+_RESTART_PREFIX = 200  # chars compared to recognize a continuation that restarts the page
+
+TRUNCATION_ISSUES = ("max_tokens", "unclosed_fence", "unclosed_tags")
+
+
+def unclosed_tags(code: str) -> list[str]:
+    """Structural tags opened more often than closed, in `_STRUCTURAL_TAGS` order."""
+    opened: dict[str, int] = {}
+    for m in _OPEN_TAG.finditer(code):
+        tag = m.group(1).lower()
+        opened[tag] = opened.get(tag, 0) + 1
+    for m in _CLOSE_TAG.finditer(code):
+        tag = m.group(1).lower()
+        opened[tag] = opened.get(tag, 0) - 1
+    return [tag for tag in _STRUCTURAL_TAGS if opened.get(tag, 0) > 0]
+
+
+def truncation_issues(text: str, finish_reason: Optional[str] = None) -> list[str]:
+    """Signs that a full-page reply was cut off (empty when it looks complete).
+
+    A provider that says it stopped for another reason than the length limit
+    is trusted: continuing a finished reply would only append noise. The
+    structural checks decide when there is no finish reason (cached replies,
+    providers that do not report one).
+    """
+    if finish_reason is not None and finish_reason != "length":
+        return []
+    issues = []
+    if finish_reason == "length":
+        issues.append("max_tokens")
+    code = unclosed_code_block(text)
+    if code is not None:
+        issues.append("unclosed_fence")
+    else:
+        code = extract_code_block(text)
+    if unclosed_tags(text if code is None else code):
+        issues.append("unclosed_tags")
+    return issues
+
+
+def stitch(partial: str, continuation: str) -> str:
+    """The reply `partial` continued by `continuation`.
+
+    Drops a code fence the continuation re-opens and any text it repeats
+    from the end of `partial`. A continuation that restarts the page from the
+    top (and completes it) replaces `partial`.
+    """
+    code = unclosed_code_block(partial)
+    if code is not None:
+        fence = _OPEN_FENCE.match(continuation.lstrip())
+        if fence is not None:
+            restarted = extract_code_block(continuation)
+            head = code.lstrip()[:_RESTART_PREFIX]
+            if restarted is not None and head and restarted.startswith(head):
+                return continuation
+            continuation = continuation.lstrip()[fence.end():]
+    return partial + continuation[_overlap(partial, continuation):]
+
+
+def _overlap(partial: str, continuation: str) -> int:
+    """Length of the prefix of `continuation` that re-sends the end of `partial`.
+
+    Only a repeat of whole lines, up to and including the unfinished last
+    line, counts. A reply cut at a line end is never trimmed: a repeated line
+    cannot be told from a new one. The unfinished line alone often matches
+    by accident (indentation, an opening tag), so the shortest repeat that
+    also covers a complete line is preferred, and an unfinished line of
+    whitespace only never counts on its own. Pages repeat themselves (list
+    items, cards); at worst an identical line is then kept twice, never
+    dropped.
+    """
+    last = start = partial.rfind("\n") + 1
+    if start == len(partial):
+        return 0
+    restarted_line = partial[last:].strip() != "" and continuation.startswith(partial[last:])
+    while start > 0 and len(partial) - start < _MAX_OVERLAP:
+        start = partial.rfind("\n", 0, start - 1) + 1
+        if continuation.startswith(partial[start:]):
+            return len(partial) - start
+    return len(partial) - last if restarted_line else 0
@@ -1,9 +1,63 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import os
+import pickle
+import threading
+import time
 import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 from dataclasses import dataclass, field
-from typing import List, Optional
-from datetime import datetime
+from pathlib import Path
+from typing import ContextManager, Iterator, List, Optional
+
+from app.core import metrics
+from app.core.config import get_settings
+from app.services import diff as diff_service
+from app.services.versions import CodeVersion, VersionStore
+
+
+_op_depth = threading.local()
+
+
+def timed_op(method):
+    """Time a repo method in `vibe_repo_operation_duration_seconds`.
+
+    Only the outermost repo call on a thread is recorded, so `add_version`
+    calling `get_session` internally counts once, as add_version.
+    """
+    operation = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if getattr(_op_depth, "active", False):
+            return method(self, *args, **kwargs)
+        _op_depth.active = True
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            _op_depth.active = False
+            metrics.repo_operation_seconds.labels(self.backend, operation).observe(time.perf_counter() - started)
+
+    return wrapper
+
+
+def _new_version_store() -> VersionStore:
+    s = get_settings()
+    return VersionStore(snapshot_interval=s.version_snapshot_interval, cache_size=s.version_cache_size)
+
+
+class VersionConflictError(Exception):
+    """Raised when a write was based on a version that is no longer current."""
+
+    def __init__(self, expected: int, actual: int):
+        super().__init__(f"Expected current version {expected}, found {actual}")
+        self.expected = expected
+        self.actual = actual
 
 
 @dataclass
@@ -17,44 +71,411 @@ class SessionData:
     id: str
     messages: List[ChatMessage] = field(default_factory=list)
     code: Optional[str] = None
-    versions: List["CodeVersion"] = field(default_factory=list)
+    # In-memory history (InMemoryRepo). Persistent backends keep history in
+    # storage; always read versions through the repo API (get_version...).
+    versions: VersionStore = field(default_factory=_new_version_store)
     current_version: int = 0  # 0 means no versions yet
+    last_access: float = field(default_factory=time.monotonic)
+    size_bytes: int = 0  # accounted by the repo, see InMemoryRepo._grow
 
 
-@dataclass
-class CodeVersion:
-    version: int
-    code: str
-    diff: str
-    summary: Optional[str]
-    created_at: datetime
-    origin: str  # e.g. "generation" or "rollback"
+class BaseRepo(ABC):
+    """Session repository interface.
+
+    Handlers use the async methods. The defaults run the sync implementation
+    in a worker thread, which is right for blocking (I/O-backed) stores;
+    in-memory stores override them to skip the thread hop.
+    """
+
+    @abstractmethod
+    def create_session(self) -> SessionData: ...
+
+    @abstractmethod
+    def get_session(self, session_id: str) -> SessionData: ...
+
+    @abstractmethod
+    def add_message(self, session_id: str, role: str, content: str) -> ChatMessage: ...
+
+    @abstractmethod
+    def update_code(self, session_id: str, code: str) -> None: ...
+
+    @abstractmethod
+    def add_version(  # raises VersionConflictError if expected_version is stale
+        self,
+        session_id: str,
+        code: str,
+        diff: Optional[str],
+        summary: Optional[str] = None,
+        origin: str = "generation",
+        expected_version: Optional[int] = None,
+    ) -> CodeVersion: ...
+
+    @abstractmethod
+    def get_version(self, session_id: str, version: int) -> Optional[CodeVersion]: ...
+
+    @abstractmethod
+    def list_versions(self, session_id: str, before: Optional[int] = None, limit: int = 50) -> List[CodeVersion]:
+        """Up to `limit` versions numbered below `before` (default: all), newest first; metadata only."""
+
+    @abstractmethod
+    def get_version_code(self, session_id: str, version: int) -> str: ...
+
+    @abstractmethod
+    def get_version_diff(self, session_id: str, version: int) -> str:
+        """Diff against the previous version, computed on first read if it was stored without one."""
+
+    @abstractmethod
+    def footprint(self, session_id: str) -> dict: ...
+
+    @abstractmethod
+    def stats(self) -> dict: ...
+
+    def pin(self, session_id: str) -> ContextManager[None]:
+        """Keep the session resident while a generation works on it (a no-op for stores that never evict)."""
+        return nullcontext()
+
+    async def acreate_session(self) -> SessionData:
+        return await asyncio.to_thread(self.create_session)
+
+    async def aget_session(self, session_id: str) -> SessionData:
+        return await asyncio.to_thread(self.get_session, session_id)
+
+    async def aadd_message(self, session_id: str, role: str, content: str) -> ChatMessage:
+        return await asyncio.to_thread(self.add_message, session_id, role, content)
+
+    async def aupdate_code(self, session_id: str, code: str) -> None:
+        await asyncio.to_thread(self.update_code, session_id, code)
+
+    async def aadd_version(
+        self,
+        session_id: str,
+        code: str,
+        diff: Optional[str],
+        summary: Optional[str] = None,
+        origin: str = "generation",
+        expected_version: Optional[int] = None,
+    ) -> CodeVersion:
+        return await asyncio.to_thread(self.add_version, session_id, code, diff, summary, origin, expected_version)
+
+    async def aget_version(self, session_id: str, version: int) -> Optional[CodeVersion]:
+        return await asyncio.to_thread(self.get_version, session_id, version)
+
+    async def alist_versions(self, session_id: str, before: Optional[int] = None, limit: int = 50) -> List[CodeVersion]:
+        return await asyncio.to_thread(self.list_versions, session_id, before, limit)
+
+    async def aget_version_code(self, session_id: str, version: int) -> str:
+        return await asyncio.to_thread(self.get_version_code, session_id, version)
+
+    async def aget_version_diff(self, session_id: str, version: int) -> str:
+        return await asyncio.to_thread(self.get_version_diff, session_id, version)
+
+    async def afootprint(self, session_id: str) -> dict:
+        return await asyncio.to_thread(self.footprint, session_id)
+
+    async def astats(self) -> dict:
+        return await asyncio.to_thread(self.stats)
+
+
+class InMemoryRepo(BaseRepo):
+    """Bounded in-memory session store.
+
+    Sessions are kept in LRU order (every access moves a session to the end).
+    Sessions idle longer than `idle_ttl` seconds are dropped; when the store
+    exceeds `max_sessions` or `max_bytes` the least recently used sessions are
+    evicted. With a `spill_dir`, sessions evicted under pressure are pickled
+    to disk and transparently rehydrated by `get_session`; idle-expired
+    sessions are considered abandoned and are not spilled. Pinned sessions
+    (a generation in flight, see `pin`) are never evicted: the limits may be
+    exceeded until they are released.
+    """
 
+    backend = "memory"
 
-class InMemoryRepo:
-    def __init__(self) -> None:
-        self._sessions: dict[str, SessionData] = {}
+    def __init__(
+        self,
+        max_sessions: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        idle_ttl: Optional[float] = None,
+        spill_dir: Optional[str] = None,
+    ) -> None:
+        settings = get_settings()
+        self.max_sessions = settings.session_max_count if max_sessions is None else max_sessions
+        self.max_bytes = settings.session_max_bytes if max_bytes is None else max_bytes
+        self.idle_ttl = settings.session_idle_ttl if idle_ttl is None else idle_ttl
+        spill = settings.session_spill_dir if spill_dir is None else spill_dir
+        self.spill_dir: Optional[Path] = Path(spill) if spill else None
+        if self.spill_dir is not None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self._sessions: "OrderedDict[str, SessionData]" = OrderedDict()
+        self._bytes = 0
+        self._pins: dict[str, int] = {}
+        self._counters = {"evicted_ttl": 0, "evicted_lru": 0, "spilled": 0, "rehydrated": 0}
 
+    @timed_op
     def create_session(self) -> SessionData:
         sid = str(uuid.uuid4())
         session = SessionData(id=sid)
         self._sessions[sid] = session
+        self._enforce_limits()
         return session
 
+    @timed_op
     def get_session(self, session_id: str) -> SessionData:
-        if session_id not in self._sessions:
-            raise KeyError("session_not_found")
-        return self._sessions[session_id]
+        self._expire_idle()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._rehydrate(session_id)
+            if session is None:
+                raise KeyError("session_not_found")
+        session.last_access = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
 
+    @timed_op
     def add_message(self, session_id: str, role: str, content: str) -> ChatMessage:
         session = self.get_session(session_id)
         msg = ChatMessage(role=role, content=content)
         session.messages.append(msg)
+        self._grow(session, len(content))
         return msg
 
+    @timed_op
     def update_code(self, session_id: str, code: str) -> None:
         session = self.get_session(session_id)
+        delta = len(code) - len(session.code or "")
         session.code = code
+        self._grow(session, delta)
+
+    @timed_op
+    def add_version(
+        self,
+        session_id: str,
+        code: str,
+        diff: Optional[str],
+        summary: Optional[str] = None,
+        origin: str = "generation",
+        expected_version: Optional[int] = None,
+    ) -> CodeVersion:
+        """Record `code` as the next version and make it current."""
+        session = self.get_session(session_id)
+        if expected_version is not None and session.current_version != expected_version:
+            raise VersionConflictError(expected_version, session.current_version)
+        before = len(session.code or "") + session.versions.nbytes
+        entry = session.versions.append(code, diff, summary, origin)
+        session.code = code
+        session.current_version = entry.version
+        self._grow(session, len(code) + session.versions.nbytes - before)
+        return entry
+
+    @timed_op
+    def get_version(self, session_id: str, version: int) -> Optional[CodeVersion]:
+        return self.get_session(session_id).versions.get(version)
+
+    @timed_op
+    def list_versions(self, session_id: str, before: Optional[int] = None, limit: int = 50) -> List[CodeVersion]:
+        versions = self.get_session(session_id).versions
+        top = len(versions) if before is None else min(before - 1, len(versions))
+        return [versions.get(n) for n in range(top, max(0, top - limit), -1)]
+
+    @timed_op
+    def get_version_code(self, session_id: str, version: int) -> str:
+        session = self.get_session(session_id)
+        before = session.versions.nbytes
+        code = session.versions.code(version)  # may materialize it into the LRU
+        self._grow(session, session.versions.nbytes - before)
+        return code
+
+    @timed_op
+    def get_version_diff(self, session_id: str, version: int) -> str:
+        session = self.get_session(session_id)
+        before = session.versions.nbytes
+        text = session.versions.diff(version)
+        self._grow(session, session.versions.nbytes - before)
+        return text
+
+    def footprint(self, session_id: str) -> dict:
+        """Approximate bytes held for a session (messages, current code, history)."""
+        session = self.get_session(session_id)
+        message_bytes = sum(len(m.content) for m in session.messages)
+        code_bytes = len(session.code or "")
+        versions = session.versions.footprint()
+        total = message_bytes + code_bytes + session.versions.nbytes
+        return {
+            "messages": len(session.messages),
+            "message_bytes": message_bytes,
+            "code_bytes": code_bytes,
+            "versions": versions,
+            "total_bytes": total,
+        }
+
+    def stats(self) -> dict:
+        """Gauges and counters for the session store."""
+        return {
+            "backend": "memory",
+            "live_sessions": len(self._sessions),
+            "bytes_held": self._bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "pinned_sessions": len(self._pins),
+            **self._counters,
+        }
+
+    # -- bounds / eviction --
+
+    @contextmanager
+    def pin(self, session_id: str) -> Iterator[None]:
+        self._pins[session_id] = self._pins.get(session_id, 0) + 1
+        try:
+            yield
+        finally:
+            left = self._pins.pop(session_id) - 1
+            if left:
+                self._pins[session_id] = left
+
+    def _grow(self, session: SessionData, delta: int) -> None:
+        """Account `delta` bytes for `session`, measured by the caller at the mutation.
+
+        A session's size is its messages, current code and `VersionStore.nbytes`
+        (stored history plus the materialized-content LRU).
+        """
+        if not delta:
+            return
+        session.size_bytes += delta
+        self._bytes += delta
+        if delta > 0:
+            self._enforce_limits()
+
+    def _expire_idle(self) -> None:
+        if not self.idle_ttl:
+            return
+        cutoff = time.monotonic() - self.idle_ttl
+        # LRU order == last-access order, so expired sessions sit at the front.
+        expired = []
+        for sid, session in self._sessions.items():
+            if session.last_access >= cutoff:
+                break
+            if sid not in self._pins:
+                expired.append(sid)
+        for sid in expired:
+            self._drop(sid)
+            self._counters["evicted_ttl"] += 1
+
+    def _enforce_limits(self) -> None:
+        self._expire_idle()
+        # Never evict the most recently used session (the one being written) or a pinned one.
+        while len(self._sessions) > 1 and (
+            (self.max_sessions and len(self._sessions) > self.max_sessions)
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            sid = next((s for s in self._sessions if s not in self._pins), None)
+            if sid is None or sid == next(reversed(self._sessions)):
+                break
+            session = self._drop(sid)
+            self._counters["evicted_lru"] += 1
+            if self.spill_dir is not None:
+                self._spill(session)
+
+    def _drop(self, session_id: str) -> SessionData:
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.size_bytes
+        return session
+
+    def _spill_path(self, session_id: str) -> Path:
+        assert self.spill_dir is not None
+        return self.spill_dir / f"{session_id}.pkl"
+
+    def _spill(self, session: SessionData) -> None:
+        path = self._spill_path(session.id)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(session, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self._counters["spilled"] += 1
+
+    def _rehydrate(self, session_id: str) -> Optional[SessionData]:
+        if self.spill_dir is None:
+            return None
+        try:
+            uuid.UUID(session_id)  # never build paths from arbitrary input
+        except ValueError:
+            return None
+        path = self._spill_path(session_id)
+        try:
+            with open(path, "rb") as f:
+                session: SessionData = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        path.unlink(missing_ok=True)
+        session.last_access = time.monotonic()
+        self._sessions[session_id] = session
+        self._bytes += session.size_bytes
+        self._counters["rehydrated"] += 1
+        self._enforce_limits()
+        return session
+
+    # The in-memory store never blocks, so the async API simply delegates.
+    async def acreate_session(self) -> SessionData:
+        return self.create_session()
+
+    async def aget_session(self, session_id: str) -> SessionData:
+        return self.get_session(session_id)
+
+    async def aadd_message(self, session_id: str, role: str, content: str) -> ChatMessage:
+        return self.add_message(session_id, role, content)
+
+    async def aupdate_code(self, session_id: str, code: str) -> None:
+        self.update_code(session_id, code)
+
+    async def aadd_version(
+        self,
+        session_id: str,
+        code: str,
+        diff: Optional[str],
+        summary: Optional[str] = None,
+        origin: str = "generation",
+        expected_version: Optional[int] = None,
+    ) -> CodeVersion:
+        return self.add_version(session_id, code, diff, summary, origin, expected_version)
+
+    async def aget_version(self, session_id: str, version: int) -> Optional[CodeVersion]:
+        return self.get_version(session_id, version)
+
+    async def alist_versions(self, session_id: str, before: Optional[int] = None, limit: int = 50) -> List[CodeVersion]:
+        return self.list_versions(session_id, before, limit)
+
+    async def aget_version_code(self, session_id: str, version: int) -> str:
+        return self.get_version_code(session_id, version)
+
+    async def aget_version_diff(self, session_id: str, version: int) -> str:
+        session = self.get_session(session_id)
+        versions = session.versions
+        if versions.get(version) is not None and not versions.has_diff(version):
+            # Large diffs are computed in a worker thread; only the contents are read here.
+            # Measured on each side of the await: other writes to the session account for themselves.
+            before = versions.nbytes
+            previous, current = versions.code(version - 1) if version > 1 else "", versions.code(version)
+            self._grow(session, versions.nbytes - before)
+            text = await diff_service.aunified_diff(previous, current)
+            before = versions.nbytes
+            versions.store_diff(version, text)
+            self._grow(session, versions.nbytes - before)
+        return versions.diff(version)
+
+    async def afootprint(self, session_id: str) -> dict:
+        return self.footprint(session_id)
+
+    async def astats(self) -> dict:
+        return self.stats()
+
+
+def create_repo() -> BaseRepo:
+    """Repository selected by `Settings.repo_backend` ("memory" or "sqlite")."""
+    settings = get_settings()
+    if settings.repo_backend == "sqlite":
+        from app.services.sqlite_repo import SQLiteRepo
+
+        return SQLiteRepo(settings.sqlite_path, pool_size=settings.sqlite_pool_size)
+    return InMemoryRepo()
 
 
-repo = InMemoryRepo()
+repo = create_repo()
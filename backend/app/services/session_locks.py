@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+"""Per-session serialization and coalescing of generations.
+
+- `lock(session_id)`: one generation per session at a time (HTTP and
+  WebSocket share it), so two turns never build on the same base version.
+  Lock entries are reference counted and dropped when idle.
+- `run_coalesced(key, ...)`: identical submissions (same session, message,
+  base version and mode) that arrive while the first is in flight await its
+  result instead of paying for a second LLM call, or for admission: only the
+  leader runs `admit`.
+
+Both are process-local. Across worker processes, history stays consistent via
+the repo's `expected_version` check on `add_version`.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, Optional
+
+
+@dataclass
+class _LockEntry:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    users: int = 0
+
+
+class SessionCoordinator:
+    def __init__(self) -> None:
+        self._locks: dict[str, _LockEntry] = {}
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+        self.waited = 0  # acquisitions that had to queue behind another generation
+
+    @asynccontextmanager
+    async def lock(self, session_id: str) -> AsyncIterator[None]:
+        entry = self._locks.get(session_id)
+        if entry is None:
+            entry = self._locks[session_id] = _LockEntry()
+        entry.users += 1
+        try:
+            if entry.lock.locked():
+                self.waited += 1
+            async with entry.lock:
+                yield
+        finally:
+            entry.users -= 1
+            if entry.users == 0:
+                self._locks.pop(session_id, None)
+
+    async def run_coalesced(
+        self,
+        key: Hashable,
+        session_id: str,
+        factory: Callable[[], Awaitable[Any]],
+        admit: Optional[Callable[[], None]] = None,
+    ) -> Any:
+        """Run `factory()` under the session lock, sharing the result with duplicates of `key`.
+
+        `admit()` (e.g. a rate-limit check) runs first, and only when this
+        call does the work; an exception from it propagates and nothing runs.
+        """
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+        if admit is not None:
+            admit()
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting on a failure; don't log "exception never retrieved".
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = fut
+        try:
+            async with self.lock(session_id):
+                result = await factory()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "locked_sessions": len(self._locks),
+            "inflight": len(self._inflight),
+            "coalesced": self.coalesced,
+            "waited": self.waited,
+        }
+
+
+coordinator = SessionCoordinator()
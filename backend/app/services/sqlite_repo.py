@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+"""SQLite session repository.
+
+Lets several uvicorn workers (and restarts) share sessions: every worker opens
+the same database file in WAL mode, so readers never block the single writer.
+
+- A small pool of connections is shared by the worker threads that run the
+  sync methods (the async API hops to a thread, see `BaseRepo`).
+- All SQL is constant text, so each connection's statement cache
+  (`cached_statements`) reuses the prepared statements.
+- Version contents are zlib blobs addressed by sha1 and shared across
+  sessions (rollbacks and common templates cost nothing extra); the current
+  code is also kept uncompressed on the session row for the hot path.
+- A version stored without a diff (`diff=None`) gets it computed and
+  written back on the first `get_version_diff`.
+- `add_version` runs under `BEGIN IMMEDIATE` so version numbers stay
+  contiguous and `expected_version` checks hold even when two workers write
+  the same session.
+"""
+
+import queue
+import sqlite3
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from app.services.diff import unified_diff
+from app.services.repository import BaseRepo, ChatMessage, SessionData, VersionConflictError, timed_op
+from app.services.versions import CodeVersion, content_hash
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    code TEXT,
+    current_version INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_session ON messages(session_id, id);
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS versions (
+    session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    version INTEGER NOT NULL,
+    content_hash TEXT NOT NULL REFERENCES blobs(hash),
+    summary TEXT,
+    created_at TEXT NOT NULL,
+    origin TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    diff BLOB NOT NULL,
+    PRIMARY KEY (session_id, version)
+) WITHOUT ROWID;
+"""
+
+_INSERT_SESSION = "INSERT INTO sessions (id, code, current_version, created_at) VALUES (?, NULL, 0, ?)"
+_SELECT_SESSION = "SELECT code, current_version FROM sessions WHERE id = ?"
+_INSERT_MESSAGE = "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)"
+_UPDATE_CODE = "UPDATE sessions SET code = ? WHERE id = ?"
+_UPDATE_CURRENT = "UPDATE sessions SET code = ?, current_version = ? WHERE id = ?"
+_INSERT_BLOB = "INSERT OR IGNORE INTO blobs (hash, data) VALUES (?, ?)"
+_INSERT_VERSION = (
+    "INSERT INTO versions (session_id, version, content_hash, summary, created_at, origin, size, diff) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_SELECT_VERSION = (
+    "SELECT version, content_hash, summary, created_at, origin, size, diff "
+    "FROM versions WHERE session_id = ? AND version = ?"
+)
+_LIST_VERSIONS = (
+    "SELECT version, content_hash, summary, created_at, origin, size "
+    "FROM versions WHERE session_id = ? AND version < ? ORDER BY version DESC LIMIT ?"
+)
+_UPDATE_DIFF = "UPDATE versions SET diff = ? WHERE session_id = ? AND version = ? AND LENGTH(diff) = 0"
+_SELECT_VERSION_BLOB = (
+    "SELECT b.data FROM versions v JOIN blobs b ON b.hash = v.content_hash "
+    "WHERE v.session_id = ? AND v.version = ?"
+)
+_FOOTPRINT = """
+SELECT
+    (SELECT COUNT(*) FROM messages WHERE session_id = :sid),
+    (SELECT COALESCE(SUM(LENGTH(content)), 0) FROM messages WHERE session_id = :sid),
+    (SELECT COALESCE(LENGTH(code), 0) FROM sessions WHERE id = :sid),
+    (SELECT COUNT(*) FROM versions WHERE session_id = :sid),
+    (SELECT COUNT(DISTINCT content_hash) FROM versions WHERE session_id = :sid),
+    (SELECT COALESCE(SUM(LENGTH(diff)), 0) FROM versions WHERE session_id = :sid),
+    (SELECT COALESCE(SUM(LENGTH(b.data)), 0) FROM blobs b
+        WHERE b.hash IN (SELECT content_hash FROM versions WHERE session_id = :sid))
+"""
+
+
+class _ConnectionPool:
+    def __init__(self, path: str, size: int) -> None:
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        for _ in range(max(1, size)):
+            conn = sqlite3.connect(
+                path,
+                check_same_thread=False,
+                isolation_level=None,  # autocommit; transactions are explicit
+                cached_statements=256,
+                timeout=30,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._pool.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def close(self) -> None:
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+class SQLiteRepo(BaseRepo):
+    backend = "sqlite"
+
+    def __init__(self, path: str, pool_size: int = 8) -> None:
+        self.path = path
+        self._pool = _ConnectionPool(path, pool_size)
+        with self._pool.connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self) -> None:
+        self._pool.close()
+
+    @timed_op
+    def create_session(self) -> SessionData:
+        sid = str(uuid.uuid4())
+        with self._pool.connection() as conn:
+            conn.execute(_INSERT_SESSION, (sid, time.time()))
+        return SessionData(id=sid)
+
+    @timed_op
+    def get_session(self, session_id: str) -> SessionData:
+        """Snapshot of the session row (messages and history are not loaded)."""
+        with self._pool.connection() as conn:
+            row = conn.execute(_SELECT_SESSION, (session_id,)).fetchone()
+        if row is None:
+            raise KeyError("session_not_found")
+        return SessionData(id=session_id, code=row[0], current_version=row[1])
+
+    @timed_op
+    def add_message(self, session_id: str, role: str, content: str) -> ChatMessage:
+        try:
+            with self._pool.connection() as conn:
+                conn.execute(_INSERT_MESSAGE, (session_id, role, content))
+        except sqlite3.IntegrityError:
+            raise KeyError("session_not_found")
+        return ChatMessage(role=role, content=content)
+
+    @timed_op
+    def update_code(self, session_id: str, code: str) -> None:
+        with self._pool.connection() as conn:
+            if conn.execute(_UPDATE_CODE, (code, session_id)).rowcount == 0:
+                raise KeyError("session_not_found")
+
+    @timed_op
+    def add_version(
+        self,
+        session_id: str,
+        code: str,
+        diff: Optional[str],
+        summary: Optional[str] = None,
+        origin: str = "generation",
+        expected_version: Optional[int] = None,
+    ) -> CodeVersion:
+        h = content_hash(code)
+        blob = zlib.compress(code.encode("utf-8"))
+        # An empty blob marks a diff deferred to the first read (zlib output is never empty).
+        diff_blob = zlib.compress(diff.encode("utf-8")) if diff is not None else b""
+        created_at = datetime.utcnow()
+        with self._transaction() as conn:
+            row = conn.execute(_SELECT_SESSION, (session_id,)).fetchone()
+            if row is None:
+                raise KeyError("session_not_found")
+            if expected_version is not None and row[1] != expected_version:
+                raise VersionConflictError(expected_version, row[1])
+            version = row[1] + 1
+            conn.execute(_INSERT_BLOB, (h, blob))
+            conn.execute(
+                _INSERT_VERSION,
+                (session_id, version, h, summary, created_at.isoformat(), origin, len(code), diff_blob),
+            )
+            conn.execute(_UPDATE_CURRENT, (code, version, session_id))
+        return CodeVersion(
+            version=version,
+            content_hash=h,
+            summary=summary,
+            created_at=created_at,
+            origin=origin,
+            size=len(code),
+            diff_blob=diff_blob or None,
+        )
+
+    @timed_op
+    def get_version(self, session_id: str, version: int) -> Optional[CodeVersion]:
+        with self._pool.connection() as conn:
+            row = conn.execute(_SELECT_VERSION, (session_id, version)).fetchone()
+        if row is None:
+            return None
+        return CodeVersion(
+            version=row[0],
+            content_hash=row[1],
+            summary=row[2],
+            created_at=datetime.fromisoformat(row[3]),
+            origin=row[4],
+            size=row[5],
+            diff_blob=row[6] or None,
+        )
+
+    @timed_op
+    def list_versions(self, session_id: str, before: Optional[int] = None, limit: int = 50) -> List[CodeVersion]:
+        """Range scan on the (session_id, version) key; diffs are not loaded (`diff_blob` is None)."""
+        with self._pool.connection() as conn:
+            if conn.execute(_SELECT_SESSION, (session_id,)).fetchone() is None:
+                raise KeyError("session_not_found")
+            rows = conn.execute(_LIST_VERSIONS, (session_id, before if before is not None else 2**62, limit)).fetchall()
+        return [
+            CodeVersion(
+                version=row[0],
+                content_hash=row[1],
+                summary=row[2],
+                created_at=datetime.fromisoformat(row[3]),
+                origin=row[4],
+                size=row[5],
+                diff_blob=None,
+            )
+            for row in rows
+        ]
+
+    @timed_op
+    def get_version_code(self, session_id: str, version: int) -> str:
+        with self._pool.connection() as conn:
+            row = conn.execute(_SELECT_VERSION_BLOB, (session_id, version)).fetchone()
+        if row is None:
+            raise KeyError("version_not_found")
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    @timed_op
+    def get_version_diff(self, session_id: str, version: int) -> str:
+        entry = self.get_version(session_id, version)
+        if entry is None:
+            raise KeyError("version_not_found")
+        if entry.diff_blob is not None:
+            return zlib.decompress(entry.diff_blob).decode("utf-8")
+        previous = self.get_version_code(session_id, version - 1) if version > 1 else ""
+        text = unified_diff(previous, self.get_version_code(session_id, version))
+        with self._pool.connection() as conn:
+            conn.execute(_UPDATE_DIFF, (zlib.compress(text.encode("utf-8")), session_id, version))
+        return text
+
+    def footprint(self, session_id: str) -> dict:
+        """Bytes stored for a session (blobs shared with other sessions are counted in full)."""
+        with self._pool.connection() as conn:
+            (n_msgs, msg_bytes, code_bytes, n_versions, unique, diff_bytes, blob_bytes) = conn.execute(
+                _FOOTPRINT, {"sid": session_id}
+            ).fetchone()
+        return {
+            "messages": n_msgs,
+            "message_bytes": msg_bytes,
+            "code_bytes": code_bytes,
+            "versions": {
+                "versions": n_versions,
+                "unique_contents": unique,
+                "blob_bytes": blob_bytes,
+                "diff_bytes": diff_bytes,
+            },
+            "total_bytes": msg_bytes + code_bytes + blob_bytes + diff_bytes,
+        }
+
+    def stats(self) -> dict:
+        with self._pool.connection() as conn:
+            live = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return {"backend": "sqlite", "live_sessions": live, "bytes_held": page_count * page_size}
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+"""Prompt token counting.
+
+`count_tokens` uses the estimate from the context builder (~4 chars per
+token) unless TOKEN_COUNTER=tiktoken. In that case it uses tiktoken's
+o200k_base encoding from the optional `tiktoken` package. tiktoken downloads
+the encoding file on first use unless TIKTOKEN_CACHE_DIR already holds it.
+If it cannot be loaded, the estimate is used.
+
+Provider tokenizers differ from both, so these counts are for budgeting and
+reporting before a call. The provider-reported usage on the reply (see
+`llm.prompt_usage`) is authoritative.
+"""
+
+import logging
+import threading
+from typing import Iterable
+
+from app.core.config import get_settings
+from app.services.context_builder import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_MESSAGE_OVERHEAD = 4  # role and separators per chat message
+_lock = threading.Lock()
+_encoding = None
+_loaded = False
+
+
+def _get_encoding():
+    global _encoding, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                if get_settings().token_counter == "tiktoken":
+                    try:  # optional: exact-ish counts for OpenAI-style tokenizers
+                        import tiktoken
+
+                        _encoding = tiktoken.get_encoding("o200k_base")
+                    except ImportError:  # pragma: no cover - depends on the environment
+                        logger.warning("TOKEN_COUNTER=tiktoken but tiktoken is not installed, estimating tokens")
+                    except Exception as e:  # offline and not cached
+                        logger.warning("tiktoken encoding unavailable, estimating tokens: %s", e)
+                _loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def message_text(message) -> str:
+    """Text of a chat message, whether its content is a string or a list of parts."""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+
+def count_message_tokens(messages: Iterable) -> int:
+    return sum(count_tokens(message_text(m)) + _MESSAGE_OVERHEAD for m in messages)
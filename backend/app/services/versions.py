@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+"""Compact per-session version history.
+
+Storing the full `code` and `diff` of every version costs O(turns x page size)
+per session, and a rollback appended yet another full copy. Instead:
+
+- Contents are content-addressed (sha1 of the code). A version only points at
+  a content hash, so rolling back to an earlier version reuses its storage.
+- Each new content is stored either as a zlib-compressed full snapshot (every
+  `snapshot_interval`-th content in a chain) or as a compressed line delta
+  against the previous version's content.
+- Diffs against the predecessor are kept zlib-compressed. A version appended
+  without one computes it on first read.
+- Recently materialized contents are kept in a small LRU so the common "read
+  the last few versions" path does not replay delta chains.
+"""
+
+import hashlib
+import json
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterator, Optional, Union
+
+from app.services.diff import matching_blocks, unified_diff
+
+DeltaOp = Union[list, str]  # [i1, i2] copies base lines i1:i2, str inserts text
+
+
+@dataclass
+class CodeVersion:
+    version: int
+    content_hash: str
+    summary: Optional[str]
+    created_at: datetime
+    origin: str  # e.g. "generation" or "rollback"
+    size: int  # length of the code in characters
+    # zlib-compressed unified diff against the previous version; None until first read
+    diff_blob: Optional[bytes]
+
+
+@dataclass
+class _Blob:
+    base: Optional[str]  # content hash this delta applies to; None for a snapshot
+    data: bytes
+    depth: int  # deltas since the last snapshot in this chain
+
+
+def content_hash(code: str) -> str:
+    return hashlib.sha1(code.encode("utf-8")).hexdigest()
+
+
+def make_delta(base: str, target: str) -> list[DeltaOp]:
+    a = base.splitlines(keepends=True)
+    b = target.splitlines(keepends=True)
+    blocks = matching_blocks(a, b)
+    if blocks is None:  # over the diff time budget: store the target as one insert
+        return [target] if target else []
+    ops: list[DeltaOp] = []
+    j = 0
+    for i1, j1, n in blocks:
+        if j1 > j:
+            ops.append("".join(b[j:j1]))
+        if n:
+            ops.append([i1, i1 + n])
+        j = j1 + n
+    return ops
+
+
+def apply_delta(base: str, ops: list[DeltaOp]) -> str:
+    lines = base.splitlines(keepends=True)
+    return "".join("".join(lines[op[0]:op[1]]) if isinstance(op, list) else op for op in ops)
+
+
+class VersionStore:
+    def __init__(self, snapshot_interval: int = 10, cache_size: int = 4) -> None:
+        self.snapshot_interval = max(1, snapshot_interval)
+        self.cache_size = max(1, cache_size)
+        self._versions: list[CodeVersion] = []  # index = version number - 1
+        self._blobs: dict[str, _Blob] = {}
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._raw_bytes = 0  # what full code + diff per version would have cost
+        # Running totals, kept at each mutation so sizing a session is O(1).
+        self._blob_bytes = 0
+        self._diff_bytes = 0
+        self._cache_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._versions)
+
+    def __iter__(self) -> Iterator[CodeVersion]:
+        return iter(self._versions)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held: stored blobs and diffs plus the materialized-content LRU."""
+        return self._blob_bytes + self._diff_bytes + self._cache_bytes
+
+    def append(self, code: str, diff: Optional[str], summary: Optional[str], origin: str) -> CodeVersion:
+        """`diff=None` defers the diff against the previous version to the first `diff()` call."""
+        h = content_hash(code)
+        if h not in self._blobs:
+            prev = self._versions[-1].content_hash if self._versions else None
+            prev_blob = self._blobs.get(prev) if prev else None
+            if prev_blob is None or prev_blob.depth + 1 >= self.snapshot_interval:
+                self._blobs[h] = _Blob(base=None, data=zlib.compress(code.encode("utf-8")), depth=0)
+            else:
+                delta = json.dumps(make_delta(self.content(prev), code), separators=(",", ":"))
+                self._blobs[h] = _Blob(base=prev, data=zlib.compress(delta.encode("utf-8")), depth=prev_blob.depth + 1)
+            self._blob_bytes += len(self._blobs[h].data)
+        self._remember(h, code)
+        entry = CodeVersion(
+            version=len(self._versions) + 1,
+            content_hash=h,
+            summary=summary,
+            created_at=datetime.utcnow(),
+            origin=origin,
+            size=len(code),
+            diff_blob=zlib.compress(diff.encode("utf-8")) if diff is not None else None,
+        )
+        self._versions.append(entry)
+        self._raw_bytes += len(code) + len(diff or "")
+        self._diff_bytes += len(entry.diff_blob or b"")
+        return entry
+
+    def get(self, version: int) -> Optional[CodeVersion]:
+        if 1 <= version <= len(self._versions):
+            return self._versions[version - 1]
+        return None
+
+    def code(self, version: int) -> str:
+        entry = self.get(version)
+        if entry is None:
+            raise KeyError("version_not_found")
+        return self.content(entry.content_hash)
+
+    def diff(self, version: int) -> str:
+        entry = self.get(version)
+        if entry is None:
+            raise KeyError("version_not_found")
+        if entry.diff_blob is None:
+            previous = self.code(version - 1) if version > 1 else ""
+            return self.store_diff(version, unified_diff(previous, self.code(version)))
+        return zlib.decompress(entry.diff_blob).decode("utf-8")
+
+    def has_diff(self, version: int) -> bool:
+        entry = self.get(version)
+        return entry is not None and entry.diff_blob is not None
+
+    def store_diff(self, version: int, diff: str) -> str:
+        """Record the (lazily computed) diff of `version`; returns it."""
+        entry = self.get(version)
+        if entry is None:
+            raise KeyError("version_not_found")
+        if entry.diff_blob is None:
+            entry.diff_blob = zlib.compress(diff.encode("utf-8"))
+            self._raw_bytes += len(diff)
+            self._diff_bytes += len(entry.diff_blob)
+        return diff
+
+    def content(self, h: str) -> str:
+        cached = self._cache.get(h)
+        if cached is not None:
+            self._cache.move_to_end(h)
+            return cached
+        # Walk back to the snapshot, then replay deltas forward.
+        chain: list[_Blob] = []
+        blob = self._blobs[h]
+        while blob.base is not None:
+            chain.append(blob)
+            if blob.base in self._cache:
+                break
+            blob = self._blobs[blob.base]
+        if blob.base is None:
+            text = zlib.decompress(blob.data).decode("utf-8")
+        else:
+            text = self._cache[blob.base]
+        for delta in reversed(chain):
+            text = apply_delta(text, json.loads(zlib.decompress(delta.data)))
+        self._remember(h, text)
+        return text
+
+    def footprint(self) -> dict:
+        stored = self._blob_bytes + self._diff_bytes
+        return {
+            "versions": len(self._versions),
+            "unique_contents": len(self._blobs),
+            "snapshots": sum(1 for b in self._blobs.values() if b.base is None),
+            "blob_bytes": self._blob_bytes,
+            "diff_bytes": self._diff_bytes,
+            "cache_bytes": self._cache_bytes,
+            "uncompressed_bytes": self._raw_bytes,
+            "compression_ratio": (self._raw_bytes / stored) if stored else 1.0,
+        }
+
+    def _remember(self, h: str, text: str) -> None:
+        if h not in self._cache:
+            self._cache_bytes += len(text)
+        self._cache[h] = text
+        self._cache.move_to_end(h)
+        while len(self._cache) > self.cache_size:
+            self._cache_bytes -= len(self._cache.popitem(last=False)[1])
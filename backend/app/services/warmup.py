@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+"""Background warm-up of the LLM stack.
+
+`import app.main` does not load LangChain, LangGraph, openai or httpx: they
+take ~0.6 s to import, and `/health` should answer before that. They load
+on first use instead. So that the first generation does not pay for them
+either, `warmup.start()` (called once the server is up, when
+`Settings.llm_warmup` is set) imports them and builds the pipeline in a
+daemon thread. `GET /ready` returns 503 until it is done.
+"""
+
+import threading
+import time
+from typing import Optional
+
+
+def warm() -> None:
+    """Import everything a generation needs and build the pipeline graph."""
+    import httpx  # noqa: F401
+    import langchain_core.messages  # noqa: F401
+    import langchain_openai  # noqa: F401
+
+    from app.graphs.pipeline import pipelines
+
+    pipelines()
+
+
+class Warmup:
+    """Runs `warm()` once in a background thread and reports its state."""
+
+    def __init__(self) -> None:
+        self._thread: Optional[threading.Thread] = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self.seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="llm-warmup", daemon=True)
+                self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set() and self.error is None
+
+    def snapshot(self) -> dict:
+        if self._thread is None:
+            state = "not_started"
+        elif not self._done.is_set():
+            state = "running"
+        else:
+            state = "failed" if self.error else "done"
+        return {"state": state, "seconds": self.seconds, "error": self.error}
+
+    def _run(self) -> None:
+        started = time.perf_counter()
+        try:
+            warm()
+        except Exception as e:  # reported by /ready; the first generation will raise it again
+            self.error = f"{e.__class__.__name__}: {e}"
+        self.seconds = time.perf_counter() - started
+        self._done.set()
+
+
+warmup = Warmup()
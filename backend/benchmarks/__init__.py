@@ -0,0 +1 @@
+# Load / latency benchmarks (run from backend/: `python -m benchmarks.<name>`)
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+"""Throughput of concurrent generations: blocking threadpool path vs async path.
+
+Usage (from backend/):
+    python -m benchmarks.bench_concurrency [N_REQUESTS]
+
+Both runs hit the same stub LLM (`benchmarks.stub_llm`) with a fixed
+per-completion delay (STUB_LLM_DELAY, default 5 s here to resemble real
+generations). The baseline reproduces the old sync handler: every call
+to the blocking `generate_code` occupies one of Starlette's ~40 threadpool
+workers. The async run posts to `/sessions/{id}/messages` through the ASGI app.
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+from benchmarks.stub_llm import start_stub_server
+
+N_REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+
+async def _bench_sync_threadpool(n: int) -> float:
+    import anyio.to_thread
+    from app.services import llm as llm_service
+    from app.services.repository import repo
+
+    sessions = [repo.create_session() for _ in range(n)]
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        anyio.to_thread.run_sync(llm_service.generate_code, s, "make a page") for s in sessions
+    ))
+    return time.perf_counter() - start
+
+
+async def _bench_async_api(n: int) -> float:
+    import httpx
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        sids = [(await client.post("/sessions")).json()["session_id"] for _ in range(n)]
+        start = time.perf_counter()
+        resps = await asyncio.gather(*(
+            client.post(f"/sessions/{sid}/messages", json={"message": "make a page"}) for sid in sids
+        ))
+        elapsed = time.perf_counter() - start
+    bad = [r.status_code for r in resps if r.status_code != 200]
+    if bad:
+        raise RuntimeError(f"{len(bad)} failed requests: {bad[:5]}")
+    return elapsed
+
+
+def main() -> None:
+    os.environ.setdefault("STUB_LLM_DELAY", "5")
+    base_url = start_stub_server()
+    # Settings are read from the environment, so configure before importing `app`.
+    os.environ["OPENROUTER_BASE_URL"] = base_url
+    os.environ.setdefault("OPENROUTER_API_KEY", "stub-key")
+    os.environ.setdefault("GENERATION_CACHE", "0")  # every request must reach the stub
+    os.environ.setdefault("MAX_CONCURRENT_GENERATIONS", "1024")
+    os.environ.setdefault("ADMISSION_CLIENT_RATE", "0")  # every request comes from one client
+    os.environ.setdefault("LLM_POOL_MAX_CONNECTIONS", "1024")
+    os.environ.setdefault("LLM_POOL_MAX_KEEPALIVE", "1024")
+
+    sync_s = asyncio.run(_bench_sync_threadpool(N_REQUESTS))
+    async_s = asyncio.run(_bench_async_api(N_REQUESTS))
+    print(f"requests={N_REQUESTS} stub_delay={float(os.environ['STUB_LLM_DELAY']):.2f}s")
+    print(f"sync threadpool : {sync_s:7.2f}s  {N_REQUESTS / sync_s:8.1f} req/s")
+    print(f"async endpoint  : {async_s:7.2f}s  {N_REQUESTS / async_s:8.1f} req/s")
+    print(f"speedup         : {sync_s / async_s:7.2f}x")
+    from app.services.client_pool import client_pool
+    print(f"llm client pool : {client_pool.snapshot()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+"""Prompt-token reduction of the context builder on a corpus of large pages.
+
+Usage (from backend/):
+    python -m benchmarks.bench_context [BUDGET_TOKENS]
+
+For every (page, message) pair reports the estimated tokens of the existing
+code sent to the model with and without slicing, plus build time. Also checks
+that restoring the snippet reproduces the original page byte for byte.
+"""
+
+import statistics
+import sys
+import time
+
+from app.services.context_builder import build_context
+from benchmarks.corpus import MESSAGES, make_page
+
+
+def main() -> None:
+    budget = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    pages = [make_page(seed, n_sections=10 + seed % 5, items=14 + seed) for seed in range(8)]  # ~60-110 KB
+    ratios: list[float] = []
+    timings: list[float] = []
+    full_total = sliced_total = 0
+    for page in pages:
+        for msg in MESSAGES:
+            start = time.perf_counter()
+            ctx = build_context(page, msg, budget)
+            timings.append(time.perf_counter() - start)
+            assert ctx.restore(ctx.snippet) == page, "restore mismatch"
+            full_total += ctx.original_tokens
+            sliced_total += ctx.snippet_tokens
+            ratios.append(ctx.snippet_tokens / ctx.original_tokens)
+    print(f"pages={len(pages)} messages={len(MESSAGES)} avg_page_chars={sum(map(len, pages)) // len(pages)}")
+    print(f"existing-code tokens full   : {full_total}")
+    print(f"existing-code tokens sliced : {sliced_total}")
+    print(f"reduction                   : {100 * (1 - sliced_total / full_total):.1f}% "
+          f"(median per turn {100 * (1 - statistics.median(ratios)):.1f}%)")
+    print(f"build_context time          : median {1000 * statistics.median(timings):.2f} ms, "
+          f"max {1000 * max(timings):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
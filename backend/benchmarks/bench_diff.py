@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+"""Diff engine vs difflib on realistic page pairs.
+
+Usage (from backend/):
+    python -m benchmarks.bench_diff
+
+For each (old, new) pair prints wall time and diff size for `difflib.unified_diff`
+and for `app.services.diff` (and the mode it chose). Finally it measures the
+worst event-loop stall while another task diffs the heaviest pair through
+`aunified_diff`. The data-table pair is the one difflib is slow on: many rows
+that repeat often, but not often enough for its autojunk heuristic.
+"""
+
+import asyncio
+import difflib
+import random
+import re
+import time
+
+from app.services.diff import aunified_diff, compute_diff
+from benchmarks.corpus import make_page
+
+
+def _minify(page: str) -> str:
+    return re.sub(r"\n\s*", "", page)
+
+
+def _tag_per_line(page: str) -> str:
+    return _minify(page).replace("><", ">\n<")
+
+
+def _pairs() -> list[tuple[str, str, str]]:
+    rng = random.Random(0)
+    page = make_page(3, n_sections=14, items=30)  # ~130 KB, ~2k lines
+    lines = page.splitlines(keepends=True)
+    edited = list(lines)
+    edited[500] = '        <h3>Edited heading</h3>\n'
+    edited.insert(900, '      <p class="note">New note</p>\n')
+    sections = page.split("  <section")
+    reordered = sections[:1] + sorted(sections[1:], key=lambda _: rng.random())
+    big = make_page(11, n_sections=14, items=120)  # ~500 KB
+    minified = _minify(big)
+    tagged = _tag_per_line(big)
+    tagged_edit = tagged.replace("item 7<", "item seven<").replace("item 70<", "item seventy<")
+    variants = [
+        f'      <tr><td>Plan {k % 40}</td><td>${(k * 7) % 90}</td><td class="s{k % 3}">{k % 5}</td></tr>\n'
+        for k in range(200)
+    ]
+    rows = [rng.choice(variants) for _ in range(10000)]
+    edited_rows = [f"      <tr><td>New {k}</td></tr>\n" if k % 100 == 0 else row for k, row in enumerate(rows)]
+    return [
+        ("small edit (130 KB)", page, "".join(edited)),
+        ("reword every paragraph", page, page.replace("fast", "quick")),
+        ("sections reordered", page, "  <section".join(reordered)),
+        ("regenerated page", page, make_page(4, n_sections=14, items=30)),
+        ("minified one-liner edit (500 KB)", minified, minified.replace("item 7<", "item seven<")),
+        ("tag-per-line edit (500 KB)", tagged, tagged_edit),
+        ("tag-per-line regenerated", tagged, _tag_per_line(make_page(12, n_sections=14, items=120))),
+        ("data table, every 100th row edited", "".join(rows), "".join(edited_rows)),
+    ]
+
+
+def _difflib(old: str, new: str) -> str:
+    return "".join(difflib.unified_diff(old.splitlines(True), new.splitlines(True), "a/index.html", "b/index.html"))
+
+
+async def _loop_stall(old: str, new: str) -> float:
+    """Longest gap between 1 ms ticks of another task while `aunified_diff` runs."""
+    worst = 0.0
+    done = asyncio.Event()
+
+    async def ticker() -> None:
+        nonlocal worst
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            worst = max(worst, now - last)
+            last = now
+
+    tick = asyncio.create_task(ticker())
+    await aunified_diff(old, new)
+    done.set()
+    await tick
+    return worst
+
+
+def main() -> None:
+    print(f"{'pair':36} {'old KB':>7} | {'difflib s':>9} {'KB':>7} | {'engine s':>8} {'KB':>7} {'mode':>8}")
+    heaviest = None
+    for name, old, new in _pairs():
+        start = time.perf_counter()
+        reference = _difflib(old, new)
+        base_s = time.perf_counter() - start
+        result = compute_diff(old, new)
+        print(
+            f"{name:36} {len(old) / 1024:7.0f} | {base_s:9.3f} {len(reference) / 1024:7.0f} | "
+            f"{result.seconds:8.3f} {len(result.text) / 1024:7.0f} {result.mode:>8}"
+        )
+        if heaviest is None or result.seconds > heaviest[0]:
+            heaviest = (result.seconds, name, old, new)
+    assert heaviest is not None
+    stall = asyncio.run(_loop_stall(heaviest[2], heaviest[3]))
+    print(f"\nevent-loop stall while diffing '{heaviest[1]}' via aunified_diff: {stall * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
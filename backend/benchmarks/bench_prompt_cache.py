@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+"""Prompt size and provider prefix-cache reuse per prompt layout.
+
+Usage (from backend/):
+    python -m benchmarks.bench_prompt_cache
+
+Replays editing sessions on the corpus pages. Each session makes one edit per
+message in `MESSAGES` and retries every other turn on the same version, as a
+regenerate would. Prompts come from `build_messages`, except for the "legacy"
+layout, which rebuilds the pre-caching order: the request first, then the
+code.
+
+There is no provider in the loop. The cache is simulated like automatic
+prefix caching (OpenAI, DeepSeek): a prompt reuses its longest common prefix
+with any earlier prompt in 128-token blocks, and only if that prefix is at
+least 1024 tokens. Earlier prompts from other sessions count too, since the
+system prompt is shared. Tokens are the ~4 chars/token estimate.
+"""
+
+import random
+from contextlib import contextmanager
+from typing import Iterator
+
+from app.core.config import get_settings
+from app.services import llm as llm_service
+from app.services.context_builder import build_context, estimate_tokens
+from app.services.repository import SessionData
+from app.services.tokens import message_text
+from benchmarks.corpus import MESSAGES, make_page
+from vibe_core import prompts
+
+_BLOCK = 128
+_MIN_CACHED = 1024
+
+
+@contextmanager
+def _settings(**values) -> Iterator[None]:
+    s = get_settings()
+    saved = {k: getattr(s, k) for k in values}
+    for k, v in values.items():
+        setattr(s, k, v)
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            setattr(s, k, v)
+
+
+def _legacy_prompt(session: SessionData, message: str) -> str:
+    ctx = build_context(session.code or "", message)
+    user = f"User request:\n{message}\n\nExisting code (may be empty):\n```html\n{ctx.snippet}\n```\n\n"
+    user += "Return ONLY the new full file in a fenced code block."
+    if ctx.is_sliced:
+        user += prompts.ELIDED_SECTIONS_NOTE
+    return prompts.SYSTEM_PROMPT + "\n" + user
+
+
+def _prompt(session: SessionData, message: str) -> str:
+    messages, _ = llm_service.build_messages(session, message)
+    return "\n".join(message_text(m) for m in messages)
+
+
+def _edit(page: str, rng: random.Random) -> str:
+    lines = page.splitlines(keepends=True)
+    at = rng.randrange(len(lines) // 4, len(lines))  # models rarely touch the <head>
+    lines[at] = f'      <p class="edit">Edit {rng.random():.6f}</p>\n'
+    return "".join(lines)
+
+
+def _common_prefix(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    lo, hi = 0, n
+    while lo < hi:  # a[:lo] == b[:lo]
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _replay(build) -> tuple[int, int, int]:
+    """(turns, prompt tokens, cached tokens) over every session."""
+    seen: list[str] = []
+    turns = total = cached = 0
+    for seed in range(6):
+        rng = random.Random(seed)
+        code = make_page(seed, n_sections=10 + seed % 5, items=14 + seed)
+        for i, message in enumerate(MESSAGES):
+            session = SessionData(id=str(seed), code=code, current_version=i + 1)
+            for _ in range(2 if i % 2 else 1):
+                prompt = build(session, message)
+                tokens = estimate_tokens(prompt)
+                prefix = estimate_tokens(prompt[: max((_common_prefix(prompt, p) for p in seen), default=0)])
+                hit = prefix // _BLOCK * _BLOCK if prefix >= _MIN_CACHED else 0
+                turns, total, cached = turns + 1, total + tokens, cached + min(hit, tokens)
+                seen.append(prompt)
+            code = _edit(code, rng)
+    return turns, total, cached
+
+
+def main() -> None:
+    configs = [
+        ("legacy layout, full prompt", _legacy_prompt, {}),
+        ("cache layout, full prompt", _prompt, {}),
+        ("cache layout, compact prompt", _prompt, {"prompt_variant": "compact"}),
+    ]
+    budgets = [("sliced", get_settings().context_token_budget), ("whole page", 0)]
+    print(f"{'layout':30} {'context':>10} | {'tokens/turn':>11} {'cached %':>8} {'billed/turn':>11}")
+    for budget_name, budget in budgets:
+        for name, build, overrides in configs:
+            with _settings(prompt_cache_hints="off", context_token_budget=budget, **overrides):
+                turns, total, cached = _replay(build)
+            # Cached input is billed at roughly a quarter of the normal price or less.
+            billed = (total - cached + cached / 4) / turns
+            print(f"{name:30} {budget_name:>10} | {total / turns:11.0f} {100 * cached / total:8.1f} {billed:11.0f}")
+
+
+if __name__ == "__main__":
+    main()
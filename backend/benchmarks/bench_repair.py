@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+"""Cost of completing cut-off replies by continuation instead of regeneration.
+
+Usage (from backend/):
+    python -m benchmarks.bench_repair [MAX_TOKENS]
+
+A fake model writes corpus pages of ~1600-5000 tokens as fenced replies, and
+stops after MAX_TOKENS (default `generation_max_tokens`, ~4 chars/token) with
+finish_reason "length". Asked to continue, it picks up where it stopped;
+every other time it first re-sends the unfinished line, as real models
+often do, so stitching is exercised. Each page runs once through the
+pipeline (`run_generation_sync`, nothing stored).
+
+"re-ask" is what a user without the repair pays: the cut-off reply, then
+one full regeneration. That is a lower bound: a page over the limit is cut
+off again on every retry and never completes ("fits" is no). The first
+page fits and shows that complete replies cost nothing extra.
+"""
+
+import sys
+
+from app.core.config import get_settings
+from app.graphs.agent import run_generation_sync
+from app.graphs.pipeline import repair_stats
+from app.services import llm as llm_service
+from app.services.context_builder import estimate_tokens
+from app.services.repository import SessionData
+from benchmarks.corpus import make_page
+from vibe_core import prompts
+
+
+class _Reply:
+    def __init__(self, content: str, finish_reason: str) -> None:
+        self.content = content
+        self.response_metadata = {"finish_reason": finish_reason}
+
+
+class _CuttingModel:
+    def __init__(self, page: str, max_chars: int) -> None:
+        self.reply = f"Here is the page:\n```html\n{page}\n```"
+        self.max_chars = max_chars
+        self.sent = 0
+        self.calls = 0
+
+    def invoke(self, messages) -> _Reply:
+        self.calls += 1
+        start = self.sent
+        if messages[-1].content == prompts.CONTINUE_INSTRUCTION and self.calls % 2:
+            start = self.reply.rfind("\n", 0, self.sent) + 1  # re-send the unfinished line
+        elif messages[-1].content != prompts.CONTINUE_INSTRUCTION:
+            start = 0
+        text = self.reply[start:start + self.max_chars]
+        self.sent = start + len(text)
+        return _Reply(text, "length" if self.sent < len(self.reply) else "stop")
+
+
+def main() -> None:
+    settings = get_settings()
+    max_tokens = int(sys.argv[1]) if len(sys.argv) > 1 else settings.generation_max_tokens
+    settings.generation_cache_enabled = False
+    pages = [make_page(seed, n_sections=3 + seed, items=3 + seed // 2).strip() for seed in range(6)]
+    print(f"max tokens {max_tokens}, up to {settings.repair_max_continuations} continuations per turn\n")
+    print(f"{'page tok':>8} {'calls':>5} {'complete':>8} | {'repair out':>10} {'repair in':>10} | "
+          f"{'re-ask out':>10} {'re-ask in':>10} {'fits':>5}")
+    totals = [0, 0, 0, 0]
+    for page in pages:
+        model = _CuttingModel(page, 4 * max_tokens)
+        llm_service.build_llm = lambda model_name, m=model: m
+        result = run_generation_sync(SessionData(id="bench"), "Build the landing page", persist=False)
+        usage = result["usage"]
+        reply_tokens = estimate_tokens(model.reply)
+        messages, _ = llm_service.build_messages(SessionData(id="bench"), "Build the landing page")
+        prompt = llm_service.prompt_usage(messages)[0]
+        fits = reply_tokens <= max_tokens
+        reask = [reply_tokens, prompt] if fits else [max_tokens + reply_tokens, 2 * prompt]
+        row = [usage["completion_tokens"], usage["prompt_tokens"], *reask]
+        totals = [t + v for t, v in zip(totals, row)]
+        print(f"{estimate_tokens(page):8d} {model.calls:5d} {str(result['code'] == page):>8} | "
+              f"{row[0]:10d} {row[1]:10d} | {row[2]:10d} {row[3]:10d} {'yes' if fits else 'no':>5}")
+    print(f"{'total':>23} | {totals[0]:10d} {totals[1]:10d} | {totals[2]:10d} {totals[3]:10d}")
+    print(f"\nrepair stats: {repair_stats.snapshot()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+"""Per-operation latency of the session repositories.
+
+Usage (from backend/):
+    python -m benchmarks.bench_repository [N_OPS]
+
+Times the async API (what the handlers call) of the in-memory store and the
+SQLite store (temporary WAL database) for the operations of a typical turn.
+"""
+
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app.services.repository import BaseRepo, InMemoryRepo
+from app.services.sqlite_repo import SQLiteRepo
+from benchmarks.corpus import make_page
+
+N_OPS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+
+async def _time(fn, *args) -> float:
+    start = time.perf_counter()
+    await fn(*args)
+    return time.perf_counter() - start
+
+
+async def bench(repo: BaseRepo) -> dict[str, float]:
+    page = make_page(1)
+    timings: dict[str, list[float]] = {k: [] for k in ("create", "get", "add_message", "add_version", "version_code")}
+    sids = []
+    for _ in range(N_OPS):
+        start = time.perf_counter()
+        sids.append((await repo.acreate_session()).id)
+        timings["create"].append(time.perf_counter() - start)
+    for i, sid in enumerate(sids):
+        timings["get"].append(await _time(repo.aget_session, sid))
+        timings["add_message"].append(await _time(repo.aadd_message, sid, "user", "make the hero bigger"))
+        code = page.replace("Page 1", f"Page {i}")
+        timings["add_version"].append(await _time(repo.aadd_version, sid, code, "diff"))
+        timings["version_code"].append(await _time(repo.aget_version_code, sid, 1))
+    return {k: statistics.median(v) * 1e6 for k, v in timings.items()}
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {
+            "memory": asyncio.run(bench(InMemoryRepo(max_sessions=0, max_bytes=0, idle_ttl=0, spill_dir=""))),
+            "sqlite": asyncio.run(bench(SQLiteRepo(str(Path(tmp) / "bench.db")))),
+        }
+    ops = list(results["memory"])
+    print(f"median latency per op (us), n={N_OPS}")
+    print(f"{'op':<14}" + "".join(f"{name:>12}" for name in results))
+    for op in ops:
+        print(f"{op:<14}" + "".join(f"{results[name][op]:12.1f}" for name in results))
+
+
+if __name__ == "__main__":
+    main()
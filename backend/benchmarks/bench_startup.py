@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+"""Import (cold start) time of the backend, the shared core and the worker.
+
+Usage (from backend/):
+    python -m benchmarks.bench_startup [RUNS]
+
+Each target is imported in a fresh interpreter (median of RUNS, default 5),
+timed from inside the process, so interpreter startup is not counted. The
+worker is imported under CPython with `cloudflare_py_worker/benchmarks/
+local_runtime.py` standing in for the Workers `js` module. "app.main, then
+warm-up" adds what the background warm-up loads (LangChain, LangGraph, the
+pipeline graph): the time until `/ready` would answer 200. Finally, the
+slowest top-level packages behind `import app.main` are listed, from
+`python -X importtime`. `tests/test_startup.py` checks that the LLM stack
+stays out of that list.
+"""
+
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_WORKER = os.path.join(os.path.dirname(_BACKEND), "cloudflare_py_worker")
+
+_TARGETS = [
+    ("vibe_core (package only)", _BACKEND, "import vibe_core"),
+    ("vibe_core.prompts", _BACKEND, "import vibe_core.prompts"),
+    ("vibe_core, every module", _BACKEND, "import vibe_core.prompts, vibe_core.extract, vibe_core.diff, vibe_core.sse"),
+    ("worker.py", _WORKER, "import worker"),
+    ("app.main (backend)", _BACKEND, "import app.main"),
+    ("app.main, then warm-up", _BACKEND, "import app.main; from app.services.warmup import warm; warm()"),
+]
+
+# The worker needs its `js` stand-in (and asyncio, which the Workers runtime has loaded anyway) first.
+_SETUP = {_WORKER: "from benchmarks import local_runtime; local_runtime.install(); "}
+_TIMED = "{setup}import time; t = time.perf_counter(); {stmt}; print(time.perf_counter() - t)"
+
+
+def _import_seconds(cwd: str, stmt: str) -> float:
+    code = _TIMED.format(setup=_SETUP.get(cwd, ""), stmt=stmt)
+    out = subprocess.run([sys.executable, "-c", code], cwd=cwd, check=True, capture_output=True, text=True).stdout
+    return float(out.split()[-1])
+
+
+def _slowest_packages(n: int = 8) -> list[tuple[str, int]]:
+    """(top-level package, µs) for `import app.main`, slowest first: self time summed per package."""
+    cmd = [sys.executable, "-X", "importtime", "-c", "import app.main"]
+    err = subprocess.run(cmd, cwd=_BACKEND, check=True, capture_output=True, text=True).stderr
+    totals: dict[str, int] = {}
+    for line in err.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+\d+ \| *(\S+)", line)
+        if m:
+            package = m.group(2).split(".")[0]
+            totals[package] = totals.get(package, 0) + int(m.group(1))
+    return sorted(totals.items(), key=lambda kv: -kv[1])[:n]
+
+
+def main() -> None:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'import':28} {'median ms':>10} {'min ms':>8}")
+    for name, cwd, stmt in _TARGETS:
+        samples = [_import_seconds(cwd, stmt) for _ in range(runs)]
+        print(f"{name:28} {1000 * statistics.median(samples):10.1f} {1000 * min(samples):8.1f}")
+    print("\nslowest packages behind `import app.main` (own import time, ms):")
+    for package, us in _slowest_packages():
+        print(f"  {package:24} {us / 1000:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
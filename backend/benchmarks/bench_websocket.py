@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+"""Frames and server CPU per generation on the session WebSocket.
+
+Usage (from backend/):
+    python -m benchmarks.bench_websocket [N_TOKENS] [TURNS]
+
+Runs the app under uvicorn in a child process with a fake LLM that streams an
+N_TOKENS reply (default 2000 chunks at ~2000 chunks/s), then drives TURNS
+generations over one persistent connection per framing configuration and
+reports token frames and server CPU time per generation.
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.stub_llm import _free_port
+
+CONFIGS = [
+    ("per-token (json)", "batch_ms=0&batch_bytes=0"),
+    ("50ms / 2KB (json)", "batch_ms=50&batch_bytes=2048"),
+    ("50ms / 2KB (msgpack)", "batch_ms=50&batch_bytes=2048&encoding=msgpack"),
+]
+
+
+def _serve(port: int, n_tokens: int) -> None:
+    import uvicorn
+
+    from app.main import app
+    from app.services import llm as llm_service
+
+    class Chunk:
+        def __init__(self, content: str):
+            self.content = content
+
+    class StreamingLLM:
+        async def astream(self, messages):
+            yield Chunk("```html\n<html><body>\n")
+            for i in range(n_tokens):
+                if i % 10 == 0:
+                    await asyncio.sleep(0.005)
+                yield Chunk(f"<p>{i}</p>")
+            yield Chunk("\n</body></html>\n```")
+
+    llm_service.build_llm = lambda model_name: StreamingLLM()
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def _run(base: str, query: str, turns: int) -> int:
+    import httpx
+    import websockets
+
+    binary = "encoding=msgpack" in query
+    if binary:
+        import msgpack
+    async with httpx.AsyncClient() as client:
+        sid = (await client.post(f"http://{base}/sessions")).json()["session_id"]
+    frames = 0
+    async with websockets.connect(f"ws://{base}/ws/sessions/{sid}?{query}", max_size=None) as ws:
+        for _ in range(turns):
+            request = {"type": "user_message", "message": "make a page"}
+            await ws.send(msgpack.packb(request) if binary else json.dumps(request))
+            while True:
+                raw = await ws.recv()
+                frame = msgpack.unpackb(raw) if binary else json.loads(raw)
+                if frame["type"] == "token":
+                    frames += 1
+                elif frame["type"] in ("final", "error"):
+                    break
+    return frames
+
+
+def main() -> None:
+    n_tokens = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    turns = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, "-m", "benchmarks.bench_websocket", "--serve", str(port), str(n_tokens)])
+    base = f"127.0.0.1:{port}"
+    try:
+        import socket
+
+        deadline = time.time() + 15
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise RuntimeError("server failed to start")
+                time.sleep(0.05)
+        print(f"tokens per reply={n_tokens} turns per connection={turns}")
+        print(f"{'config':<24}{'token frames/gen':>18}{'server cpu ms/gen':>20}")
+        for name, query in CONFIGS:
+            before = _cpu_seconds(proc.pid)
+            try:
+                frames = asyncio.run(_run(base, query, turns))
+            except ImportError as e:
+                print(f"{name:<24}  (skipped: {e.name} not installed)")
+                continue
+            cpu = _cpu_seconds(proc.pid) - before
+            print(f"{name:<24}{frames / turns:>18.0f}{cpu * 1000 / turns:>20.1f}")
+    finally:
+        proc.terminate()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        _serve(int(sys.argv[2]), int(sys.argv[3]))
+    else:
+        main()
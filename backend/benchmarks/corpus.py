@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+"""Synthetic large single-file pages shared by the benchmarks.
+
+Deterministic (seeded) so numbers are comparable between runs.
+"""
+
+import random
+
+_TOPICS = [
+    "hero", "features", "pricing", "testimonials", "faq", "team", "gallery",
+    "contact", "blog", "stats", "partners", "timeline", "newsletter", "careers",
+]
+
+MESSAGES = [
+    "Change the pricing section to have three tiers and highlight the middle one",
+    "Make the hero title bigger and use a dark theme colour",
+    "Add form validation when the contact form is submitted",
+    "Add a new testimonial from a happy customer",
+    "把 FAQ 部分的问题改成中文",
+    "Fix the gallery layout on mobile",
+]
+
+
+def _css(rng: random.Random, topics: list[str]) -> str:
+    rules = [":root { --primary: #4f46e5; --bg: #ffffff; --text: #111827; }"]
+    for t in topics:
+        for suffix in ("", "__title", "__item", "__grid", ":hover"):
+            rules.append(
+                f".{t}{suffix} {{ padding: {rng.randint(4, 64)}px; margin: 0 auto; "
+                f"color: var(--text); display: {rng.choice(['grid', 'flex', 'block'])}; "
+                f"gap: {rng.randint(4, 32)}px; transition: all .{rng.randint(1, 9)}s ease; }}"
+            )
+        rules.append(f"@media (max-width: 768px) {{ .{t}__grid {{ grid-template-columns: 1fr; }} }}")
+    return "\n".join(rules)
+
+
+def _section(rng: random.Random, topic: str, items: int) -> str:
+    cards = "\n".join(
+        f'      <article class="{topic}__item" data-idx="{i}">\n'
+        f"        <h3>{topic.title()} item {i}</h3>\n"
+        f"        <p>{' '.join(rng.choice(['fast', 'simple', 'modern', 'secure', 'lovely', 'robust']) for _ in range(24))}</p>\n"
+        f"      </article>"
+        for i in range(items)
+    )
+    return (
+        f'  <section id="{topic}" class="{topic}">\n'
+        f'    <h2 class="{topic}__title">{topic.title()}</h2>\n'
+        f'    <div class="{topic}__grid">\n{cards}\n    </div>\n'
+        f"  </section>"
+    )
+
+
+def _js(topics: list[str]) -> str:
+    funcs = []
+    for t in topics:
+        name = t.title().replace("-", "")
+        funcs.append(
+            f"function init{name}() {{\n"
+            f"  const root = document.getElementById('{t}');\n"
+            f"  if (!root) return;\n"
+            f"  root.addEventListener('click', (e) => {{\n"
+            f"    const item = e.target.closest('.{t}__item');\n"
+            f"    if (item) item.classList.toggle('active');\n"
+            f"  }});\n"
+            f"}}"
+        )
+    calls = "\n".join(f"  init{t.title()}();" for t in topics)
+    return "\n".join(funcs) + f"\ndocument.addEventListener('DOMContentLoaded', () => {{\n{calls}\n}});"
+
+
+def make_page(seed: int, n_sections: int = 10, items: int = 6) -> str:
+    rng = random.Random(seed)
+    topics = rng.sample(_TOPICS, min(n_sections, len(_TOPICS)))
+    body = "\n".join(_section(rng, t, items) for t in topics)
+    return (
+        "<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n"
+        "  <meta charset=\"UTF-8\">\n  <meta name=\"viewport\" content=\"width=device-width, initial-scale=1.0\">\n"
+        f"  <title>Page {seed}</title>\n  <style>\n{_css(rng, topics)}\n  </style>\n</head>\n<body>\n"
+        f"  <header class=\"site-header\"><nav><a href=\"#\">Home</a></nav></header>\n"
+        f"  <main>\n{body}\n  </main>\n"
+        f"  <footer class=\"site-footer\"><p>&copy; 2025</p></footer>\n"
+        f"  <script>\n{_js(topics)}\n  </script>\n</body>\n</html>\n"
+    )
+
+
+def corpus(n_pages: int = 8) -> list[str]:
+    return [make_page(seed, n_sections=8 + seed % 6, items=4 + seed % 5) for seed in range(n_pages)]
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+"""OpenAI-compatible stub LLM server for benchmarks.
+
+Serves `POST /chat/completions` (plain and `stream=true` SSE) with a fixed
+artificial latency so generation throughput can be measured without a real
+provider. Start standalone with `python -m benchmarks.stub_llm`, or from a
+benchmark via `start_stub_server()` (separate process, so the stub does not
+compete with the code under test for the GIL).
+"""
+
+import asyncio
+import atexit
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+STUB_DELAY = float(os.getenv("STUB_LLM_DELAY", "0.5"))  # seconds per completion
+STUB_CODE = "<!DOCTYPE html>\n<html>\n<head><title>Stub</title></head>\n<body><h1>Hello</h1></body>\n</html>"
+
+stub_app = FastAPI(title="stub-llm")
+
+
+def _reply_text() -> str:
+    return f"Here is the page:\n```html\n{STUB_CODE}\n```"
+
+
+@stub_app.post("/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "stub")
+    text = _reply_text()
+    if body.get("stream"):
+        tokens = [text[i:i + 8] for i in range(0, len(text), 8)]
+        per_token = STUB_DELAY / max(len(tokens), 1)
+
+        async def events():
+            for tok in tokens:
+                await asyncio.sleep(per_token)
+                chunk = {
+                    "id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {"content": tok}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            done = {
+                "id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }
+            yield f"data: {json.dumps(done)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep(STUB_DELAY)
+    return JSONResponse({
+        "id": "stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": len(text) // 4, "total_tokens": 100 + len(text) // 4},
+    })
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stub_server(port: Optional[int] = None) -> str:
+    """Run the stub in a child process; returns its base URL once it accepts connections."""
+    port = port or _free_port()
+    env = {**os.environ, "STUB_LLM_PORT": str(port)}
+    proc = subprocess.Popen([sys.executable, "-m", "benchmarks.stub_llm"], env=env)
+    atexit.register(proc.terminate)
+    deadline = time.time() + 15
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            break
+        except OSError:
+            if proc.poll() is not None or time.time() > deadline:
+                raise RuntimeError("stub LLM server failed to start")
+            time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+if __name__ == "__main__":
+    uvicorn.run(
+        stub_app,
+        host="127.0.0.1",
+        port=int(os.getenv("STUB_LLM_PORT", "9009")),
+        log_level="warning",
+        backlog=4096,
+    )
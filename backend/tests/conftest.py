@@ -0,0 +1,29 @@
+import pytest
+
+from app.services.admission import admission
+from app.services.generation_cache import generation_cache
+from app.services.hedging import model_health
+
+
+@pytest.fixture(autouse=True)
+def _clear_generation_cache():
+    # Tests reuse prompts with different fake replies; never serve a cached one.
+    generation_cache.clear()
+    yield
+    generation_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def _reset_model_health():
+    # Failures injected by one test must not leave a circuit breaker open for the next.
+    model_health.reset()
+    yield
+    model_health.reset()
+
+
+@pytest.fixture(autouse=True)
+def _reset_admission():
+    # Every test posts from the same client address; start each with full buckets.
+    admission.reset()
+    yield
+    admission.reset()
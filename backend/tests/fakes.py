@@ -0,0 +1,59 @@
+"""Stand-ins for LangChain chat models, shared by the test modules."""
+import asyncio
+from typing import Optional
+
+
+class FakeResponse:
+    """A chat model reply: content plus the metadata LangChain attaches."""
+
+    def __init__(
+        self,
+        content: str,
+        usage_metadata: Optional[dict] = None,
+        response_metadata: Optional[dict] = None,
+        finish_reason: Optional[str] = None,
+    ):
+        self.content = content
+        self.usage_metadata = usage_metadata
+        self.response_metadata = dict(response_metadata or {})
+        if finish_reason is not None:
+            self.response_metadata["finish_reason"] = finish_reason
+
+
+class FakeLLM:
+    """Answers call n with `replies[n]` (the last one once they run out), sync or async."""
+
+    def __init__(self, *replies):
+        self.replies = [r if isinstance(r, FakeResponse) else FakeResponse(r) for r in replies]
+        self.calls = 0
+
+    def invoke(self, messages):
+        reply = self.replies[min(self.calls, len(self.replies) - 1)]
+        self.calls += 1
+        return reply
+
+    async def ainvoke(self, messages):
+        return self.invoke(messages)
+
+
+class FakeChunk:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeStreamingLLM:
+    """Streams `tokens`, one chunk each `delay` seconds; `closed` once the stream is closed."""
+
+    def __init__(self, tokens, delay: float = 0.0):
+        self.tokens = tokens
+        self.delay = delay
+        self.closed = False
+
+    async def astream(self, messages):
+        try:
+            for tok in self.tokens:
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                yield FakeChunk(tok)
+        finally:
+            self.closed = True
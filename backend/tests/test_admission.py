@@ -0,0 +1,164 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import Settings
+from app.main import app
+from app.services import llm as llm_service
+from app.services.admission import (
+    PRIORITIES,
+    AdmissionController,
+    AdmissionRejected,
+    TokenBucket,
+    create_controller,
+)
+from tests.fakes import FakeLLM
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=2.0, burst=3, now=0.0)
+    for _ in range(3):
+        assert bucket.wait(0.0) == 0
+        bucket.take()
+    assert bucket.wait(0.0) == pytest.approx(0.5)
+    assert bucket.wait(0.5) == 0
+
+
+def test_rejected_check_takes_no_tokens():
+    ctl = AdmissionController(max_active=1, queue_max=1, queue_timeout=1, client_rate=1, client_burst=5,
+                              session_rate=1, session_burst=1)
+    ctl.check("c1", "s1")
+    with pytest.raises(AdmissionRejected) as exc:
+        ctl.check("c1", "s1")  # session bucket empty
+    assert exc.value.reason == "rate_limited" and exc.value.retry_after == 1
+    for i in range(4):  # the client bucket still has its 4 remaining tokens
+        ctl.check("c1", f"other{i}")
+    assert ctl.snapshot()["rejected"]["rate_limited"] == 1
+
+
+def test_queue_admits_by_priority_then_fifo():
+    ctl = AdmissionController(max_active=1, queue_max=10, queue_timeout=5)
+    order = []
+
+    async def run(name, priority, hold=0.01):
+        async with ctl.slot(priority):
+            order.append(name)
+            await asyncio.sleep(hold)
+
+    async def main():
+        first = asyncio.create_task(run("first", PRIORITIES["normal"]))
+        await asyncio.sleep(0)
+        waiters = [
+            asyncio.create_task(run(name, PRIORITIES[prio]))
+            for name, prio in [("batch", "batch"), ("n1", "normal"), ("i1", "interactive"), ("n2", "normal")]
+        ]
+        await asyncio.sleep(0)
+        assert ctl.snapshot()["queue_depth"] == 4
+        await asyncio.gather(first, *waiters)
+
+    asyncio.run(main())
+    assert order == ["first", "i1", "n1", "n2", "batch"]
+    stats = ctl.snapshot()
+    assert stats["active"] == 0 and stats["queue_depth"] == 0
+    assert stats["admitted"] == 5 and stats["queued"] == 4 and stats["max_queue_depth"] == 4
+
+
+def test_full_queue_and_slo_reject_with_retry_after():
+    ctl = AdmissionController(max_active=1, queue_max=1, queue_timeout=0.05)
+
+    async def hold(seconds):
+        async with ctl.slot():
+            await asyncio.sleep(seconds)
+
+    async def main():
+        holder = asyncio.create_task(hold(0.2))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold(0))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as full:
+            async with ctl.slot():
+                pass
+        with pytest.raises(AdmissionRejected) as late:
+            await waiter
+        await holder
+        return full.value, late.value
+
+    full, late = asyncio.run(main())
+    assert full.reason == "queue_full" and late.reason == "queue_timeout"
+    assert full.retry_after >= 1
+    assert ctl.snapshot()["rejected"] == {"rate_limited": 0, "queue_full": 1, "queue_timeout": 1}
+    assert ctl.active == 0
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    ctl = AdmissionController(max_active=1, queue_max=5, queue_timeout=5)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def holder():
+            async with ctl.slot():
+                await release.wait()
+
+        h = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        w = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        w.cancel()
+        await asyncio.gather(w, return_exceptions=True)
+        release.set()
+        await h
+
+    asyncio.run(main())
+    assert ctl.active == 0 and ctl.waiting == 0
+
+
+def test_burst_from_one_client_gets_429(monkeypatch):
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeLLM("```html\n<p>x</p>\n```"))
+    ctl = AdmissionController(max_active=4, queue_max=4, queue_timeout=5, client_rate=0.1, client_burst=2)
+    monkeypatch.setattr("app.api.routes.admission", ctl)
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    codes = [client.post(f"/sessions/{sid}/messages", json={"message": f"m{i}"}) for i in range(3)]
+    assert [r.status_code for r in codes] == [200, 200, 429]
+    assert codes[2].json()["detail"] == "rate_limited"
+    assert int(codes[2].headers["retry-after"]) >= 1
+    stats = client.get("/stats").json()["admission"]
+    assert stats["admitted"] == 2 and stats["rejected"]["rate_limited"] == 1
+
+
+def test_client_bucket_is_off_by_default():
+    # Keyed on the connection address: behind a proxy every user would share one bucket.
+    assert Settings().admission_client_rate == 0
+    ctl = create_controller()
+    for _ in range(50):
+        ctl.check("10.0.0.1", None)
+    assert ctl.snapshot()["tracked_clients"] == 0
+
+
+def test_coalesced_duplicates_take_no_token(monkeypatch):
+    class SlowLLM(FakeLLM):
+        async def ainvoke(self, messages):
+            await asyncio.sleep(0.05)  # the duplicates arrive while the first is in flight
+            return self.invoke(messages)
+
+    fake = SlowLLM("```html\n<p>x</p>\n```")
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: fake)
+    ctl = AdmissionController(max_active=4, queue_max=4, queue_timeout=5, session_rate=0.01, session_burst=1)
+    monkeypatch.setattr("app.api.routes.admission", ctl)
+    sid = TestClient(app).post("/sessions").json()["session_id"]
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            url = f"/sessions/{sid}/messages"
+            same = await asyncio.gather(*(client.post(url, json={"message": "same"}) for _ in range(3)))
+            other = await client.post(url, json={"message": "other"})
+            return same, other
+
+    same, other = asyncio.run(main())
+    assert [r.status_code for r in same] == [200] * 3 and fake.calls == 1
+    assert other.status_code == 429  # the leader took the session's only token
+    assert ctl.snapshot()["rejected"]["rate_limited"] == 1
@@ -0,0 +1,130 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import llm as llm_service
+from app.services.repository import repo
+from tests.fakes import FakeLLM
+
+
+def test_post_message_generates_version(monkeypatch):
+    reply = "```html\n<html><body>Hi</body></html>\n```"
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeLLM(reply))
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    r = client.post(f"/sessions/{sid}/messages", json={"message": "say hi"})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["code"] == "<html><body>Hi</body></html>"
+    assert body["version"] == 1
+    assert client.get(f"/sessions/{sid}/code").json()["code"] == body["code"]
+
+
+def test_diff_can_be_skipped_and_read_later(monkeypatch):
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeLLM("```html\n<p>lazy</p>\n```"))
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    body = client.post(f"/sessions/{sid}/messages", json={"message": "hi", "diff": False}).json()
+    assert body["diff"] is None
+    assert "+<p>lazy</p>" in asyncio.run(repo.aget_version_diff(sid, 1))
+
+
+def test_post_message_unknown_session():
+    client = TestClient(app)
+    r = client.post("/sessions/nope/messages", json={"message": "x"})
+    assert r.status_code == 404
+
+
+PAGE = "<html>\n<body>\n" + "  <p>filler paragraph</p>\n" * 200 + "  <h1>Title</h1>\n</body>\n</html>"
+
+
+def _session_with_page(client, monkeypatch):
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeLLM(f"```html\n{PAGE}\n```"))
+    sid = client.post("/sessions").json()["session_id"]
+    client.post(f"/sessions/{sid}/messages", json={"message": "make a page"})
+    return sid
+
+
+def test_patch_mode_applies_edit_blocks(monkeypatch):
+    client = TestClient(app)
+    sid = _session_with_page(client, monkeypatch)
+    patch = "<<<<<<< SEARCH\n  <h1>Title</h1>\n=======\n  <h1>New Title</h1>\n>>>>>>> REPLACE"
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeLLM(patch))
+    body = client.post(f"/sessions/{sid}/messages", json={"message": "rename title", "mode": "patch"}).json()
+    assert body["mode"] == "patch"
+    assert body["code"] == PAGE.replace("<h1>Title</h1>", "<h1>New Title</h1>")
+    assert body["output_tokens_saved"] > 0
+
+
+def test_patch_mode_falls_back_to_full_generation(monkeypatch):
+    client = TestClient(app)
+    sid = _session_with_page(client, monkeypatch)
+    fake = FakeLLM("<<<<<<< SEARCH\nnot in page\n=======\nx\n>>>>>>> REPLACE", "```html\n<html>full</html>\n```")
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: fake)
+    body = client.post(f"/sessions/{sid}/messages", json={"message": "rename title", "mode": "patch"}).json()
+    assert body["mode"] == "patch_fallback"
+    assert body["code"] == "<html>full</html>"
+    assert fake.calls == 2
+
+
+def test_rollback_creates_new_version_with_target_code(monkeypatch):
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    for body in ("<p>one</p>", "<p>two</p>"):
+        monkeypatch.setattr(llm_service, "build_llm", lambda model_name, b=body: FakeLLM(f"```html\n{b}\n```"))
+        client.post(f"/sessions/{sid}/messages", json={"message": "x"})
+    r = client.post(f"/sessions/{sid}/rollback", params={"to": 1}).json()
+    assert r["rolled_back"] and r["version"] == 3 and r["code"] == "<p>one</p>"
+    assert client.get(f"/sessions/{sid}/code").json()["code"] == "<p>one</p>"
+    stats = client.get(f"/sessions/{sid}/stats").json()
+    assert stats["versions"]["versions"] == 3 and stats["versions"]["unique_contents"] == 2
+
+
+def test_stale_base_version_is_rejected(monkeypatch):
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeLLM("```html\n<p>x</p>\n```"))
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    assert client.post(f"/sessions/{sid}/messages", json={"message": "a", "base_version": 0}).status_code == 200
+    r = client.post(f"/sessions/{sid}/messages", json={"message": "b", "base_version": 0})
+    assert r.status_code == 409
+    assert r.headers["X-Current-Version"] == "1"
+
+
+def test_identical_prompt_is_served_from_cache(monkeypatch):
+    fake = FakeLLM("```html\n<p>cached</p>\n```")
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: fake)
+    client = TestClient(app)
+    for _ in range(2):
+        sid = client.post("/sessions").json()["session_id"]
+        assert client.post(f"/sessions/{sid}/messages", json={"message": "same"}).json()["code"] == "<p>cached</p>"
+    assert fake.calls == 1
+    sid = client.post("/sessions").json()["session_id"]
+    client.post(f"/sessions/{sid}/messages", json={"message": "same", "cache": False})
+    assert fake.calls == 2
+
+
+class FailingLLM:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+    async def ainvoke(self, messages):
+        err = RuntimeError(f"HTTP {self.status_code}")
+        err.status_code = self.status_code
+        raise err
+
+
+def test_transient_errors_fail_over_then_503(monkeypatch):
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    monkeypatch.setattr(llm_service, "iter_models", lambda: iter(["primary", "backup"]))
+    models = {"primary": FailingLLM(503), "backup": FakeLLM("```html\n<p>backup</p>\n```")}
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: models[model_name])
+    r = client.post(f"/sessions/{sid}/messages", json={"message": "x"})
+    assert r.json()["code"] == "<p>backup</p>"
+
+    models["backup"] = FailingLLM(429)
+    r = client.post(f"/sessions/{sid}/messages", json={"message": "y"})
+    assert r.status_code == 503
+    assert r.json()["detail"] == "llm_unavailable"
+    assert client.get("/stats").json()["llm_models"]["models"]["primary"]["failures"] == 2
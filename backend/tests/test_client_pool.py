@@ -0,0 +1,18 @@
+from app.core.config import Settings
+from app.services import client_pool as pool_module
+from app.services.client_pool import LLMClientPool
+
+
+def test_pool_reuses_clients_per_model(monkeypatch):
+    monkeypatch.setattr(pool_module, "get_settings", lambda: Settings(openrouter_api_key="test-key"))
+    pool = LLMClientPool()
+    a = pool.get("model-a")
+    assert pool.get("model-a") is a
+    b = pool.get("model-b")
+    assert b is not a
+    # Every client shares the same underlying httpx pool.
+    assert a.http_client is b.http_client
+    snap = pool.snapshot()
+    assert (snap["hits"], snap["misses"], snap["clients"]) == (1, 2, 2)
+    pool.reset()
+    assert pool.get("model-a") is not a
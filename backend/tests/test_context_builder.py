@@ -0,0 +1,41 @@
+from app.services.context_builder import build_context, split_sections
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+  <title>Demo</title>
+  <style>
+    .hero { color: red; }
+  </style>
+</head>
+<body>
+  <header><h1>Site</h1></header>
+  <section id="pricing"><h2>Pricing</h2>{pricing}</section>
+  <section id="faq"><h2>FAQ</h2>{faq}</section>
+  <script>
+    function initFaq() {{ return 1; }}
+  </script>
+</body>
+</html>
+""".replace("{pricing}", "<p>plan</p>" * 60).replace("{faq}", "<p>question</p>" * 60)
+
+
+def test_split_sections_finds_landmarks():
+    kinds = [s.kind for s in split_sections(PAGE)]
+    assert kinds == ["style", "header", "section", "section", "script"]
+
+
+def test_small_page_is_sent_unchanged():
+    ctx = build_context(PAGE, "anything", budget_tokens=100_000)
+    assert ctx.snippet == PAGE and not ctx.is_sliced
+
+
+def test_budget_keeps_relevant_section_and_restores():
+    ctx = build_context(PAGE, "Add a fourth pricing plan", budget_tokens=300)
+    assert ctx.is_sliced
+    assert "<h2>Pricing</h2>" in ctx.snippet
+    assert "<h2>FAQ</h2>" not in ctx.snippet
+    assert "@keep:" in ctx.snippet
+    assert ctx.snippet_tokens < ctx.original_tokens
+    # Model output that copies markers verbatim round-trips to the full page.
+    assert ctx.restore(ctx.snippet) == PAGE
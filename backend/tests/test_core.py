@@ -0,0 +1,21 @@
+import subprocess
+import sys
+
+import vibe_core
+from vibe_core import extract, prompts
+
+
+def test_lazy_exports_resolve_to_their_modules():
+    assert vibe_core.extract_code_block is extract.extract_code_block
+    assert vibe_core.SYSTEM_PROMPTS is prompts.SYSTEM_PROMPTS
+    assert vibe_core.compute_diff("a\n", "b\n").mode == "lines"
+
+
+def test_core_is_dependency_free():
+    # The worker bundles vibe_core as is: it must not pull in the backend stack.
+    code = (
+        "import sys, vibe_core.prompts, vibe_core.extract, vibe_core.diff, vibe_core.sse; "
+        "print(sorted(m for m in ('app', 'pydantic', 'langchain_core', 'fastapi', 'dataclasses') if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    assert out.strip() == "[]"
@@ -1,4 +1,6 @@
-from app.services.diff import unified_diff
+import random
+
+from app.services.diff import compute_diff, unified_diff
 
 
 def test_unified_diff_added():
@@ -13,3 +15,70 @@ def test_unified_diff_removed():
     new = "<html>\n<body></body>\n</html>\n"
     d = unified_diff(old, new)
     assert "-<body>Hi</body>" in d
+
+
+def _apply(old: str, diff: str) -> str:
+    """Apply a line-mode unified diff (as produced by `unified_diff`) to `old`."""
+    src = old.splitlines(keepends=True)
+    out, pos = [], 0
+    lines = diff.splitlines(keepends=True)[2:]
+    for k, line in enumerate(lines):
+        if line.startswith("@@"):
+            start, _, count = line.split()[1][1:].partition(",")
+            start = int(start) if count == "0" else int(start) - 1
+            out.extend(src[pos:start])
+            pos = start
+        elif not line.startswith("\\"):
+            text = line[1:]
+            if k + 1 < len(lines) and lines[k + 1].startswith("\\"):
+                text = text[:-1]  # "\ No newline at end of file"
+            if line[0] != "+":
+                pos += 1
+            if line[0] != "-":
+                out.append(text)
+    return "".join(out + src[pos:])
+
+
+def test_diff_round_trips_on_repetitive_pages():
+    rng = random.Random(7)
+    vocab = ["<div>\n", "</div>\n", "<p>x</p>\n", "<li>\n", "</li>\n", "<span>y</span>\n"]
+    for _ in range(200):
+        old = "".join(rng.choice(vocab) for _ in range(rng.randint(0, 60)))
+        new_lines = [ln for ln in old.splitlines(keepends=True) if rng.random() > 0.2]
+        for _ in range(rng.randint(0, 4)):
+            new_lines.insert(rng.randint(0, len(new_lines)), rng.choice(vocab + ["<b>new</b>\n"]))
+        new = "".join(new_lines)
+        if rng.random() < 0.3:
+            new = new.rstrip("\n")
+        assert _apply(old, unified_diff(old, new)) == new
+
+
+def test_frequent_lines_still_align():
+    # Every line repeats far more often than any anchor may; runs of lines still match.
+    rng = random.Random(0)
+    old = [f"<i{rng.randrange(20)}>\n" for _ in range(3000)]
+    new = list(old)
+    for k in range(0, 3000, 300):
+        new[k] = f"<b>changed {k}</b>\n"
+    d = unified_diff("".join(old), "".join(new))
+    assert d.count("\n-") == 10 and d.count("\n+") == 11  # 10 changes, plus the +++ header
+
+
+def test_long_lines_are_diffed_by_tokens():
+    page = "".join(f'<div class="c{i}"><p>item {i}</p></div>' for i in range(2000))
+    result = compute_diff(page, page.replace("item 7<", "item seven<"), long_line=1000)
+    assert result.mode == "tokens"
+    assert "@@ tokens" in result.text
+    assert "-item 7\n" in result.text and "+item seven\n" in result.text
+    assert len(result.text) < 500
+
+
+def test_budgets_degrade_to_a_summary():
+    old = "".join(f"<p>{i}</p>\n" for i in range(500))
+    new = "".join(f"<p>{i}!</p>\n" for i in range(500))
+    over_size = compute_diff(old, new, max_bytes=1000)
+    assert over_size.mode == "summary"
+    assert "diff omitted (size_budget): 500 -> 500 lines" in over_size.text
+    over_time = compute_diff(old, new.replace("<p>250!", "<p>250"), timeout=0)
+    assert over_time.mode == "summary" and "time_budget" in over_time.text
+    assert compute_diff(old, old).text == ""
@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+from app.services.generation_cache import GenerationCache
+
+
+def _key(text: str) -> str:
+    return GenerationCache.make_key(["m"], 0.0, 100, [("human", text)])
+
+
+def test_memory_lru_and_stats():
+    cache = GenerationCache(max_entries=2)
+    cache.put(_key("a"), "A")
+    cache.put(_key("b"), "B")
+    assert cache.get(_key("a")) == "A"
+    cache.put(_key("c"), "C")  # evicts b (least recently used)
+    assert cache.get(_key("b")) is None
+    stats = cache.stats()
+    assert stats["hits_memory"] == 1 and stats["misses"] == 1 and stats["evictions"] == 1
+
+
+def test_ttl_expiry():
+    cache = GenerationCache(ttl=0.05)
+    cache.put(_key("a"), "A")
+    time.sleep(0.1)
+    assert cache.get(_key("a")) is None
+    stats = cache.stats()
+    assert stats["expired"] == 1 and stats["entries"] == 0 and stats["evictions"] == 0
+
+
+def test_ttl_expiry_on_disk_is_counted(tmp_path):
+    cache = GenerationCache(ttl=0.05, disk_dir=str(tmp_path))
+    cache.put(_key("a"), "A")
+    time.sleep(0.1)
+    assert cache.get(_key("a")) is None  # expired in memory, then on disk
+    assert cache.stats()["expired"] == 2 and cache.stats()["disk_bytes"] == 0
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    first = GenerationCache(disk_dir=str(tmp_path))
+    asyncio.run(first.aput(_key("a"), "A" * 1000))
+    second = GenerationCache(disk_dir=str(tmp_path))
+    assert asyncio.run(second.aget(_key("a"))) == "A" * 1000
+    assert second.stats()["hits_disk"] == 1
+    assert second.get(_key("a")) == "A" * 1000  # promoted to memory
+    assert second.stats()["hits_memory"] == 1
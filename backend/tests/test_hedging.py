@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from app.services.hedging import ModelHealth, ModelsExhaustedError, hedged_call
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def retryable(e: Exception) -> bool:
+    return isinstance(e, StatusError) and (e.status_code == 429 or e.status_code >= 500)
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    health = ModelHealth()
+    cancelled = []
+
+    async def call(model):
+        try:
+            await asyncio.sleep(1.0 if model == "a" else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+        return model
+
+    result, model = asyncio.run(hedged_call(["a", "b"], call, retryable, health, hedge_delay=0.02))
+    assert (result, model) == ("b", "b")
+    assert cancelled == ["a"]
+    assert health.hedges_launched == 1
+    assert health.get("b").hedge_wins == 1
+
+
+def test_no_hedge_when_primary_is_fast():
+    health = ModelHealth()
+    started = []
+
+    async def call(model):
+        started.append(model)
+        return model
+
+    assert asyncio.run(hedged_call(["a", "b"], call, retryable, health, hedge_delay=0.5)) == ("a", "a")
+    assert started == ["a"]
+
+
+def test_fails_over_on_429_and_5xx_but_not_on_4xx():
+    health = ModelHealth()
+    errors = {"a": StatusError(429), "b": StatusError(503)}
+
+    async def call(model):
+        if model in errors:
+            raise errors[model]
+        return model
+
+    assert asyncio.run(hedged_call(["a", "b", "c"], call, retryable, health))[1] == "c"
+
+    async def bad_request(model):
+        raise StatusError(400)
+
+    with pytest.raises(StatusError):
+        asyncio.run(hedged_call(["a", "b"], bad_request, retryable, health))
+
+
+def test_exhausted_models_report_all_attempts():
+    async def call(model):
+        raise StatusError(502)
+
+    with pytest.raises(ModelsExhaustedError) as info:
+        asyncio.run(hedged_call(["a", "b"], call, retryable, ModelHealth()))
+    assert info.value.attempted == ["a", "b"]
+    assert len(info.value.errors) == 2
+
+
+def test_circuit_breaker_skips_failing_model_then_probes(monkeypatch):
+    health = ModelHealth(failure_threshold=2, reset_timeout=10)
+    now = [100.0]
+    monkeypatch.setattr("app.services.hedging.time.monotonic", lambda: now[0])
+    for _ in range(2):
+        health.record_failure("a")
+    assert health.available(["a", "b"]) == ["b"]
+    now[0] += 11
+    assert health.available(["a", "b"]) == ["a", "b"]
+    health.begin("a")
+    assert not health.allows("a")  # one probe at a time
+    health.record_success("a", 0.5)
+    assert health.snapshot()["models"]["a"]["state"] == "closed"
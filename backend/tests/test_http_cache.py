@@ -0,0 +1,90 @@
+
+from fastapi.testclient import TestClient
+
+from app.api import http_cache
+from app.main import app
+from app.services import llm as llm_service
+from app.services.repository import repo
+from tests.fakes import FakeLLM
+
+PAGE = "<html><body>" + "<p>compressible paragraph</p>\n" * 200 + "</body></html>"
+
+
+def _session(client, monkeypatch, page=PAGE):
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeLLM(f"```html\n{page}\n```"))
+    sid = client.post("/sessions").json()["session_id"]
+    client.post(f"/sessions/{sid}/messages", json={"message": "make a page"})
+    return sid
+
+
+def test_negotiate_prefers_brotli_then_gzip(monkeypatch):
+    monkeypatch.setattr(http_cache, "brotli", object())
+    assert http_cache.negotiate("gzip, deflate, br") == "br"
+    assert http_cache.negotiate("br;q=0, gzip;q=0.5") == "gzip"
+    assert http_cache.negotiate("*") == "br"
+    assert http_cache.negotiate("identity") == "identity"
+    monkeypatch.setattr(http_cache, "brotli", None)
+    assert http_cache.negotiate("br, gzip") == "gzip"
+    assert http_cache.negotiate("") == "identity"
+
+
+def test_code_is_compressed_cached_and_conditional(monkeypatch):
+    client = TestClient(app)
+    sid = _session(client, monkeypatch)
+    hits = http_cache.body_cache.stats()["hits"]
+    r = client.get(f"/sessions/{sid}/code", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["vary"] == "Accept-Encoding"
+    assert int(r.headers["content-length"]) < len(PAGE) // 10
+    assert r.json()["code"] == PAGE
+    etag = r.headers["etag"]
+    assert etag.endswith('-gzip"')
+
+    again = client.get(f"/sessions/{sid}/code", headers={"Accept-Encoding": "gzip"})
+    assert again.content == r.content
+    assert http_cache.body_cache.stats()["hits"] > hits
+    plain = client.get(f"/sessions/{sid}/code", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert plain.status_code == 304
+
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeLLM("```html\n<p>new</p>\n```"))
+    client.post(f"/sessions/{sid}/messages", json={"message": "replace it"})
+    changed = client.get(f"/sessions/{sid}/code", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.json()["code"] == "<p>new</p>"
+    assert "content-encoding" not in changed.headers  # below COMPRESSION_MIN_BYTES
+
+
+def test_message_response_is_compressed(monkeypatch):
+    client = TestClient(app)
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeLLM(f"```html\n{PAGE}\n```"))
+    sid = client.post("/sessions").json()["session_id"]
+    r = client.post(
+        f"/sessions/{sid}/messages", json={"message": "page"}, headers={"Accept-Encoding": "gzip"}
+    )
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.json()["code"] == PAGE
+    assert int(r.headers["content-length"]) * 5 < len(r.content)  # httpx decodes the body
+
+
+def test_fields_limit_the_message_response(monkeypatch):
+    client = TestClient(app)
+    sid = _session(client, monkeypatch, "<p>one</p>")
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeLLM("```html\n<p>two</p>\n```"))
+    r = client.post(f"/sessions/{sid}/messages", params={"fields": "code,version"}, json={"message": "two"})
+    assert r.json() == {"code": "<p>two</p>", "version": 2}
+    # The diff was not asked for, so it was not computed; the version gets it on first read.
+    assert repo.get_version(sid, 2).diff_blob is None
+    bad = client.post(f"/sessions/{sid}/messages", params={"fields": "code,nope"}, json={"message": "x"})
+    assert bad.status_code == 422 and bad.json()["detail"] == "invalid_fields"
+
+
+def test_not_modified_repeats_the_etag_of_small_bodies(monkeypatch):
+    # Bodies below COMPRESSION_MIN_BYTES are sent as they are: no encoding suffix on 200 or 304.
+    client = TestClient(app)
+    sid = _session(client, monkeypatch, page="<p>tiny</p>")
+    gzip = {"Accept-Encoding": "gzip"}
+    for path in (f"/sessions/{sid}/code", f"/sessions/{sid}/versions", f"/sessions/{sid}/diff"):
+        ok = client.get(path, headers=gzip)
+        assert "content-encoding" not in ok.headers and "-gzip" not in ok.headers["etag"], path
+        http_cache.body_cache.clear()  # a cold cache does not know the size either
+        again = client.get(path, headers={**gzip, "If-None-Match": ok.headers["etag"]})
+        assert again.status_code == 304 and again.headers["etag"] == ok.headers["etag"], path
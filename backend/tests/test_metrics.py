@@ -0,0 +1,155 @@
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import metrics
+from app.main import app
+from app.services import llm as llm_service
+from app.services.repository import repo
+from tests.fakes import FakeLLM, FakeStreamingLLM
+from tests.test_api import FailingLLM
+
+
+@pytest.fixture(autouse=True)
+def _reset_metrics():
+    metrics.reset()
+    yield
+
+
+def _sample(text: str, name: str, **labels) -> float:
+    """Value of the series `name` whose labels include `labels` (0 if absent)."""
+    for line in text.splitlines():
+        m = re.match(r"^([a-z_]+)(?:\{(.*)\})? (\S+)$", line)
+        if not m or m.group(1) != name:
+            continue
+        found = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', m.group(2) or ""))
+        if all(found.get(k) == str(v) for k, v in labels.items()):
+            return float(m.group(3))
+    return 0.0
+
+
+def test_histogram_exposition_is_cumulative():
+    metrics.diff_seconds.labels("lines").observe(0.0003)
+    metrics.diff_seconds.labels("lines").observe(0.002)
+    metrics.diff_seconds.labels("lines").observe(99)
+    text = metrics.render()
+    assert "# TYPE vibe_diff_duration_seconds histogram" in text
+    assert _sample(text, "vibe_diff_duration_seconds_bucket", mode="lines", le="0.0001") == 0
+    assert _sample(text, "vibe_diff_duration_seconds_bucket", mode="lines", le="0.0005") == 1
+    assert _sample(text, "vibe_diff_duration_seconds_bucket", mode="lines", le="2.5") == 2
+    assert _sample(text, "vibe_diff_duration_seconds_bucket", mode="lines", le="+Inf") == 3
+    assert _sample(text, "vibe_diff_duration_seconds_count", mode="lines") == 3
+    assert _sample(text, "vibe_diff_duration_seconds_sum", mode="lines") == pytest.approx(99.0023)
+
+
+def test_label_values_are_escaped():
+    metrics.llm_hedges.labels('we"ird\\model\n').inc(2)
+    assert 'vibe_llm_hedges_total{model="we\\"ird\\\\model\\n"} 2.0' in metrics.render()
+
+
+_NAME = r"[a-zA-Z_:][a-zA-Z0-9_:]*"
+_LABEL = r'[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\[\\"n])*"'
+_SAMPLE = re.compile(rf"^({_NAME})(?:\{{((?:{_LABEL})(?:,{_LABEL})*)?\}})? (\S+)$")
+_SUFFIXES = {"counter": ("",), "gauge": ("",), "histogram": ("_bucket", "_sum", "_count")}
+
+
+def _check_exposition(text: str) -> int:
+    """Validate Prometheus text format 0.0.4; returns the number of samples."""
+    assert text.endswith("\n")
+    typed: dict[str, str] = {}
+    helped: set[str] = set()
+    family = None
+    histograms: dict[tuple, dict] = {}
+    samples = 0
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            name = line.split(" ", 3)[2]
+            assert re.fullmatch(_NAME, name) and name not in helped, line
+            helped.add(name)
+        elif line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert kind in _SUFFIXES and name not in typed, line
+            typed[name], family = kind, name
+        else:
+            m = _SAMPLE.match(line)
+            assert m, line
+            name, labels, value = m.groups()
+            assert family is not None and name in {family + s for s in _SUFFIXES[typed[family]]}, line
+            float(value)  # also +Inf, -Inf, NaN
+            samples += 1
+            if typed[family] == "histogram":
+                pairs = re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', labels or "")
+                key = (family, tuple(p for p in pairs if p[0] != "le"))
+                series = histograms.setdefault(key, {"le": [], "counts": []})
+                if name.endswith("_bucket"):
+                    series["le"].append(dict(pairs)["le"])
+                    series["counts"].append(float(value))
+                else:
+                    series[name[len(family):]] = float(value)
+    for (name, _), series in histograms.items():
+        bounds = [float(b) for b in series["le"]]
+        assert series["le"][-1] == "+Inf" and bounds == sorted(bounds), name
+        assert series["counts"] == sorted(series["counts"]), name  # cumulative
+        assert series["counts"][-1] == series["_count"] and "_sum" in series, name
+    return samples
+
+
+def test_exposition_follows_the_text_format():
+    metrics.diff_seconds.labels("lines").observe(0.002)
+    metrics.diff_seconds.labels("chars").observe(7)
+    metrics.llm_hedges.labels('we"ird\\model\n').inc()
+    metrics.http_request_seconds.labels("GET", "/sessions/{session_id}/code", 200).observe(0.01)
+    text = TestClient(app).get("/metrics").text
+    assert _check_exposition(text) > 20
+    assert 'vibe_diff_duration_seconds_bucket{le="+Inf",mode="chars"} 1.0' in text
+    assert "# TYPE vibe_admission_active gauge" in text
+
+
+def test_generation_is_instrumented_end_to_end(monkeypatch):
+    monkeypatch.setattr(llm_service, "iter_models", lambda: iter(["primary", "backup"]))
+    models = {"primary": FailingLLM(503), "backup": FakeLLM("```html\n<p>" + "x" * 400 + "</p>\n```")}
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: models[model_name])
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    assert client.post(f"/sessions/{sid}/messages", json={"message": "page"}).status_code == 200
+    r = client.get("/metrics")
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = r.text
+    route = "/sessions/{session_id}/messages"
+    assert _sample(text, "vibe_http_request_duration_seconds_count", method="POST", route=route, status=200) == 1
+    assert _sample(text, "vibe_llm_requests_total", model="primary", outcome="error") == 1
+    assert _sample(text, "vibe_llm_requests_total", model="backup", outcome="success") == 1
+    assert _sample(text, "vibe_llm_fallbacks_total", model="primary") == 1
+    assert _sample(text, "vibe_llm_completion_tokens_total", model="backup") > 100
+    assert _sample(text, "vibe_llm_prompt_tokens_total", model="backup") > 0
+    assert _sample(text, "vibe_llm_output_tokens_per_second_count", model="backup") == 1
+    assert _sample(text, "vibe_pipeline_node_duration_seconds_count", node="llm") == 1
+    assert _sample(text, "vibe_diff_duration_seconds_count", mode="lines") == 1
+    assert _sample(text, "vibe_repo_operation_duration_seconds_count", backend=repo.backend, operation="add_version") == 1
+    assert _sample(text, "vibe_admission_queue_wait_seconds_count", priority="normal") == 1
+    assert _sample(text, "vibe_admission_active") == 0
+
+
+def test_streaming_records_time_to_first_token(monkeypatch):
+    fake = FakeStreamingLLM(["```html\n", "<p>hi</p>\n", "```"])
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: fake)
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    with client.stream(
+        "POST", f"/sessions/{sid}/messages", json={"message": "hi"}, headers={"Accept": "text/event-stream"}
+    ) as r:
+        r.read()
+    text = client.get("/metrics").text
+    model = llm_service.pick_model()
+    assert _sample(text, "vibe_llm_time_to_first_token_seconds_count", model=model) == 1
+    assert _sample(text, "vibe_admission_queue_wait_seconds_count", priority="interactive") == 1
+    assert _sample(text, "vibe_http_request_duration_seconds_count", route="/sessions/{session_id}/messages") == 1
+
+
+def test_unmatched_paths_share_one_series():
+    client = TestClient(app)
+    client.get("/no/such/path")
+    client.get("/another/missing")
+    text = client.get("/metrics").text
+    assert _sample(text, "vibe_http_request_duration_seconds_count", route="unmatched", status=404) == 2
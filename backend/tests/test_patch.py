@@ -0,0 +1,38 @@
+import pytest
+
+from app.services.patch import PatchApplyError, apply_patch_reply, parse_edit_blocks
+
+CODE = "<html>\n<body>\n  <h1>Hello</h1>\n  <p>Old text</p>\n</body>\n</html>"
+
+
+def test_apply_single_block():
+    reply = "<<<<<<< SEARCH\n  <p>Old text</p>\n=======\n  <p>New text</p>\n>>>>>>> REPLACE\n"
+    assert apply_patch_reply(CODE, reply) == CODE.replace("Old text", "New text")
+
+
+def test_apply_tolerates_indentation_drift():
+    reply = "<<<<<<< SEARCH\n<h1>Hello</h1>\n=======\n  <h1>Hi</h1>\n>>>>>>> REPLACE"
+    assert "<h1>Hi</h1>" in apply_patch_reply(CODE, reply)
+
+
+def test_parse_multiple_blocks():
+    reply = (
+        "<<<<<<< SEARCH\na\n=======\nb\n>>>>>>> REPLACE\n"
+        "text between\n"
+        "<<<<<<< SEARCH\nc\n=======\n>>>>>>> REPLACE\n"
+    )
+    blocks = parse_edit_blocks(reply)
+    assert [(b.search, b.replace) for b in blocks] == [("a", "b"), ("c", "")]
+
+
+@pytest.mark.parametrize(
+    "reply",
+    [
+        "no blocks here",
+        "<<<<<<< SEARCH\n<p>Missing</p>\n=======\nx\n>>>>>>> REPLACE",
+        "<<<<<<< SEARCH\n<p>Old text</p>\n=======\nx\n",
+    ],
+)
+def test_apply_failures_raise(reply):
+    with pytest.raises(PatchApplyError):
+        apply_patch_reply(CODE, reply)
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from app.core.config import get_settings
+from app.graphs.agent import run_generation, run_generation_sync
+from app.graphs.pipeline import GenerationValidationError, pipeline_stats
+from app.services import llm as llm_service
+from app.services.repository import InMemoryRepo, VersionConflictError, repo
+from tests.fakes import FakeLLM
+
+NODES = {"context", "llm", "extract", "validate", "diff", "persist"}
+
+
+@pytest.fixture(autouse=True, params=["direct", "langgraph"])
+def runtime(request, monkeypatch):
+    # Both runtimes execute the same graph and must behave identically.
+    monkeypatch.setattr(get_settings(), "pipeline_runtime", request.param)
+    return request.param
+
+
+def test_sync_run_goes_through_every_node(monkeypatch):
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeLLM("```html\n<p>sync</p>\n```"))
+    pipeline_stats.reset()
+    session = repo.create_session()
+    result = run_generation_sync(session, "hi")
+    assert result["code"] == "<p>sync</p>"
+    assert result["version"] == 1
+    assert set(result["timings"]) == NODES
+    assert set(pipeline_stats.snapshot()) == NODES
+    assert repo.get_session(session.id).code == "<p>sync</p>"
+
+
+def test_without_persist_nothing_is_stored(monkeypatch):
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeLLM("```html\n<p>x</p>\n```"))
+    session = repo.create_session()
+    result = run_generation_sync(session, "hi", persist=False)
+    assert result["code"] == "<p>x</p>" and "persist" not in result["timings"]
+    assert repo.get_session(session.id).current_version == 0
+
+
+def test_patch_fallback_loops_back_to_context(monkeypatch):
+    page = "<html>\n<body>\n" + "  <p>filler paragraph</p>\n" * 200 + "</body>\n</html>"
+    fake = FakeLLM(f"```html\n{page}\n```", "<<<<<<< SEARCH\nmissing\n=======\nx\n>>>>>>> REPLACE", "```html\n<p>full</p>\n```")
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: fake)
+    session = repo.create_session()
+    run_generation_sync(session, "page")
+    pipeline_stats.reset()
+    result = run_generation_sync(repo.get_session(session.id), "edit", edit_mode="patch")
+    assert result["mode"] == "patch_fallback" and result["code"] == "<p>full</p>"
+    assert pipeline_stats.snapshot()["llm"]["calls"] == 2
+
+
+def test_empty_code_fails_validation(monkeypatch):
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeLLM("```html\n\n```"))
+    session = repo.create_session()
+    with pytest.raises(GenerationValidationError):
+        run_generation_sync(session, "hi")
+    assert repo.get_session(session.id).current_version == 0
+
+
+def test_async_run_through_api_reports_timings(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeLLM("```html\n<p>async</p>\n```"))
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    body = client.post(f"/sessions/{sid}/messages", json={"message": "x"}).json()
+    assert set(body["timings"]) == NODES
+    assert set(client.get("/stats").json()["pipeline"]) >= NODES
+
+
+def test_concurrent_writers_conflict_on_the_in_memory_repo(monkeypatch):
+    # The in-memory repo hands out its live SessionData: persist must check the version
+    # the turn was built on, not the one the session holds by then.
+    class SlowLLM(FakeLLM):
+        async def ainvoke(self, messages):
+            await asyncio.sleep(0.02)
+            return self.invoke(messages)
+
+    memory = InMemoryRepo()
+    monkeypatch.setattr("app.graphs.pipeline.repo", memory)
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: SlowLLM("```html\n<p>a</p>\n```"))
+    session = memory.create_session()
+
+    async def main():
+        # No session lock here: both turns read version 0 before either persists.
+        writers = (run_generation(memory.get_session(session.id), f"edit {i}", use_cache=False) for i in range(2))
+        return await asyncio.gather(*writers, return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert [r["version"] for r in results if isinstance(r, dict)] == [1]
+    assert [type(r) for r in results if not isinstance(r, dict)] == [VersionConflictError]
+    assert memory.get_session(session.id).current_version == 1 and len(memory.get_session(session.id).messages) == 2
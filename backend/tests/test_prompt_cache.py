@@ -0,0 +1,82 @@
+from fastapi.testclient import TestClient
+
+from app.core.config import get_settings
+from app.main import app
+from app.services import llm as llm_service
+from app.services.repository import SessionData
+from app.services.tokens import count_message_tokens, message_text
+from tests.fakes import FakeLLM, FakeResponse
+from vibe_core import prompts
+
+PAGE = "<html>\n<body>\n" + "  <p>filler paragraph</p>\n" * 50 + "</body>\n</html>"
+
+
+def _session(code: str = PAGE) -> SessionData:
+    return SessionData(id="s", code=code, current_version=1)
+
+
+def test_code_comes_before_the_request(monkeypatch):
+    monkeypatch.setattr(get_settings(), "prompt_cache_hints", "off")
+    first, _ = llm_service.build_messages(_session(), "make the title red")
+    second, _ = llm_service.build_messages(_session(), "add a footer", edit_mode="patch")
+    a, b = message_text(first[1]), message_text(second[1])
+    assert first[0].content == second[0].content == prompts.SYSTEM_PROMPT
+    assert a.index("filler paragraph") < a.index("make the title red")
+    # Everything up to the request is shared by every turn on the same version.
+    shared = prompts.CODE_BLOCK_TEMPLATE.format(existing_code=PAGE)
+    assert a.startswith(shared) and b.startswith(shared)
+
+
+def test_cache_hints_mark_system_prompt_and_code(monkeypatch):
+    monkeypatch.setattr(get_settings(), "prompt_cache_hints", "on")
+    messages, _ = llm_service.build_messages(_session(), "make the title red")
+    system, user = messages
+    assert system.content[0]["cache_control"] == {"type": "ephemeral"}
+    assert [("cache_control" in part) for part in user.content] == [True, False]
+    assert "make the title red" in user.content[1]["text"]
+    monkeypatch.setattr(get_settings(), "prompt_cache_hints", "auto")
+    monkeypatch.setattr(get_settings(), "model", "openai/gpt-4o-mini")
+    monkeypatch.setattr(get_settings(), "fallback_models", [])
+    assert not llm_service.cache_hints_enabled()
+    monkeypatch.setattr(get_settings(), "fallback_models", ["anthropic/claude-3.5-sonnet"])
+    assert llm_service.cache_hints_enabled()
+
+
+def test_compact_prompt_is_smaller(monkeypatch):
+    monkeypatch.setattr(get_settings(), "prompt_cache_hints", "off")
+    full, _ = llm_service.build_messages(_session(""), "landing page")
+    monkeypatch.setattr(get_settings(), "prompt_variant", "compact")
+    compact, _ = llm_service.build_messages(_session(""), "landing page")
+    assert compact[0].content == prompts.SYSTEM_PROMPT_COMPACT
+    assert count_message_tokens(compact) * 2 < count_message_tokens(full)
+
+
+def test_prompt_usage_reads_cached_tokens():
+    messages, _ = llm_service.build_messages(_session(), "x")
+    openai_style = FakeResponse(
+        "",
+        {"input_tokens": 2000, "output_tokens": 10},
+        {"token_usage": {"prompt_tokens_details": {"cached_tokens": 1536}}},
+    )
+    deepseek_style = FakeResponse(
+        "", {"input_tokens": 2000, "output_tokens": 10}, {"token_usage": {"prompt_cache_hit_tokens": 1024}}
+    )
+    langchain_style = FakeResponse("", {"input_tokens": 2000, "input_token_details": {"cache_read": 768}})
+    assert llm_service.prompt_usage(messages, openai_style) == (2000, 1536)
+    assert llm_service.prompt_usage(messages, deepseek_style) == (2000, 1024)
+    assert llm_service.prompt_usage(messages, langchain_style) == (2000, 768)
+    # No usage on the reply: counted locally, nothing cached.
+    assert llm_service.prompt_usage(messages, FakeResponse("")) == (count_message_tokens(messages), 0)
+
+
+def test_response_reports_token_usage(monkeypatch):
+    reply = FakeResponse(
+        "```html\n<p>usage</p>\n```",
+        {"input_tokens": 1500, "output_tokens": 12},
+        {"token_usage": {"prompt_tokens_details": {"cached_tokens": 1024}}},
+    )
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeLLM(reply))
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    body = client.post(f"/sessions/{sid}/messages", json={"message": "x"}).json()
+    assert body["usage"] == {"prompt_tokens": 1500, "cached_prompt_tokens": 1024, "completion_tokens": 12}
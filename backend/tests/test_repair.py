@@ -0,0 +1,136 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import get_settings
+from app.graphs.agent import run_generation_sync
+from app.graphs.pipeline import GenerationValidationError, repair_stats
+from app.main import app
+from app.services import llm as llm_service
+from app.services.repair import stitch, truncation_issues
+from app.services.repository import repo
+from tests.fakes import FakeLLM, FakeResponse
+from vibe_core import prompts
+
+PAGE = "<!DOCTYPE html>\n<html>\n<head><style>p { color: red; }</style></head>\n<body>\n" + "".join(
+    f"  <p>paragraph {i}</p>\n" for i in range(40)
+) + "</body>\n</html>"
+CUT = PAGE.index("  <p>paragraph 25") + 7  # mid-line, mid-tag
+REPLY = f"Here it is:\n```html\n{PAGE}\n```"
+
+
+class TruncatingLLM:
+    """Stops at `CUT` (finish_reason "length"); a continuation call re-sends the last line, then finishes."""
+
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+
+    def _reply(self, messages) -> FakeResponse:
+        if messages[-1].content != prompts.CONTINUE_INSTRUCTION:
+            self.calls.append("initial")
+            return FakeResponse(REPLY[: REPLY.index(PAGE) + CUT], finish_reason="length")
+        self.calls.append("continue")
+        restart = PAGE.rindex("\n", 0, CUT) + 1
+        return FakeResponse(PAGE[restart:] + "\n```", finish_reason="stop")
+
+    def invoke(self, messages):
+        return self._reply(messages)
+
+    async def ainvoke(self, messages):
+        return self._reply(messages)
+
+    async def astream(self, messages):
+        resp = self._reply(messages)
+        yield FakeResponse(resp.content[:20])
+        yield FakeResponse(resp.content[20:], finish_reason=resp.response_metadata["finish_reason"])
+
+
+@pytest.fixture(autouse=True)
+def _reset_repair_stats():
+    repair_stats.reset()
+    yield
+    repair_stats.reset()
+
+
+def test_truncation_signals():
+    assert truncation_issues(REPLY) == []
+    assert truncation_issues(REPLY, "length") == ["max_tokens"]
+    assert truncation_issues(REPLY[:-200]) == ["unclosed_fence", "unclosed_tags"]
+    assert truncation_issues(REPLY[:-200], "stop") == []  # the provider says it finished
+    # Fragments and prose never open structural tags; <p> and <li> end tags are optional.
+    assert truncation_issues("```html\n<p>a<p>b\n<ul><li>x</ul>\n```") == []
+
+
+def test_refusal_is_rejected_and_stores_nothing(monkeypatch):
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeLLM("Sorry, I can't help with that."))
+    session = repo.create_session()
+    with pytest.raises(GenerationValidationError, match="missing_code_fence"):
+        run_generation_sync(session, "make a page")
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    r = client.post(f"/sessions/{sid}/messages", json={"message": "make a page", "cache": False})
+    assert r.status_code == 502 and r.json()["detail"] == "invalid_generation"
+    for stored in (repo.get_session(session.id), repo.get_session(sid)):
+        assert stored.current_version == 0 and stored.code is None and stored.messages == []
+
+
+def test_stitch_drops_repeats_and_reopened_fences():
+    partial = REPLY[: REPLY.index(PAGE) + CUT]
+    tail = PAGE[CUT:] + "\n```"
+    assert stitch(partial, tail) == REPLY
+    two_lines_back = PAGE.rindex("\n", 0, PAGE.rindex("\n", 0, CUT)) + 1
+    assert stitch(partial, PAGE[two_lines_back:] + "\n```") == REPLY  # repeated lines
+    assert stitch(partial, "```html\n" + tail) == REPLY  # fence re-opened
+    assert stitch(partial, f"```html\n{PAGE}\n```") == f"```html\n{PAGE}\n```"  # restarted and finished
+    # Repeated markup is only trimmed when the continuation re-sends the unfinished line.
+    items = "```html\n" + "  <li>x</li>\n" * 5
+    assert stitch(items, "  <li>x</li>\n```") == items + "  <li>x</li>\n```"
+    assert stitch(items + "  <li", "  <li>x</li>\n```") == items + "  <li>x</li>\n```"
+
+
+def test_cut_off_reply_is_continued_not_regenerated(monkeypatch):
+    fake = TruncatingLLM()
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: fake)
+    session = repo.create_session()
+    result = run_generation_sync(session, "make a page")
+    assert result["code"] == PAGE and result["continuations"] == 1
+    assert fake.calls == ["initial", "continue"] and "repair" in result["timings"]
+    assert repo.get_session(session.id).code == PAGE
+    stats = repair_stats.snapshot()
+    assert (stats["truncated"], stats["regenerations_avoided"], stats["unrepaired"]) == (1, 1, 0)
+    assert stats["output_tokens_saved"] > 0
+
+
+def test_repair_disabled_stores_the_code_without_the_fence(monkeypatch):
+    monkeypatch.setattr(get_settings(), "repair_max_continuations", 0)
+    fake = TruncatingLLM()
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: fake)
+    result = run_generation_sync(repo.create_session(), "make a page")
+    assert result["code"] == PAGE[:CUT].strip() and result["continuations"] == 0
+    assert fake.calls == ["initial"] and repair_stats.snapshot()["unrepaired"] == 1
+
+
+def test_generate_code_continues_too(monkeypatch):
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: TruncatingLLM())
+    text, code = llm_service.generate_code(repo.create_session(), "make a page")
+    assert text == REPLY and code == PAGE
+
+
+def test_api_reports_continuations_and_sse_sends_the_tail(monkeypatch):
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: TruncatingLLM())
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    body = client.post(f"/sessions/{sid}/messages", json={"message": "page"}).json()
+    assert body["code"] == PAGE and body["continuations"] == 1
+    assert client.get("/stats").json()["repair"]["regenerations_avoided"] == 1
+    assert 'vibe_generation_repairs_total{outcome="repaired"}' in client.get("/metrics").text
+    # A cached reply is the repaired one: no second continuation.
+    again = client.post(f"/sessions/{client.post('/sessions').json()['session_id']}/messages", json={"message": "page"})
+    assert again.json()["continuations"] == 0 and again.json()["code"] == PAGE
+    r = client.post(
+        f"/sessions/{sid}/messages", json={"message": "again", "cache": False}, headers={"Accept": "text/event-stream"}
+    )
+    events = [json.loads(block.split("data: ", 1)[1]) for block in r.text.strip().split("\n\n")]
+    assert "".join(e["text"] for e in events if e["type"] == "token") == REPLY
+    assert {"type": "code", "code": PAGE} in events
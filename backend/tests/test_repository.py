@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.graphs.agent import run_generation
+from app.main import app
+from app.services import diff as diff_service
+from app.services import llm as llm_service
+from app.services.repository import InMemoryRepo
+from tests.fakes import FakeLLM
+
+
+def test_lru_eviction_by_count():
+    repo = InMemoryRepo(max_sessions=2, max_bytes=0, idle_ttl=0, spill_dir="")
+    a, b = repo.create_session(), repo.create_session()
+    repo.get_session(a.id)  # a becomes most recently used
+    repo.create_session()
+    assert repo.get_session(a.id) is a
+    with pytest.raises(KeyError):
+        repo.get_session(b.id)
+    assert repo.stats()["evicted_lru"] == 1
+
+
+def test_byte_limit_and_spill_rehydrate(tmp_path):
+    repo = InMemoryRepo(max_sessions=0, max_bytes=1500, idle_ttl=0, spill_dir=str(tmp_path))
+    a = repo.create_session()
+    repo.add_message(a.id, "user", "x" * 1000)
+    b = repo.create_session()
+    repo.add_message(b.id, "user", "y" * 1000)  # pushes a out to disk
+    assert repo.stats()["live_sessions"] == 1
+    assert (tmp_path / f"{a.id}.pkl").exists()
+    restored = repo.get_session(a.id)
+    assert restored.messages[0].content == "x" * 1000
+    stats = repo.stats()
+    assert stats["spilled"] == 2 and stats["rehydrated"] == 1  # b spilled to make room
+    assert stats["bytes_held"] == 1000
+
+
+def test_idle_ttl_expiry():
+    repo = InMemoryRepo(max_sessions=0, max_bytes=0, idle_ttl=0.05, spill_dir="")
+    a = repo.create_session()
+    time.sleep(0.1)
+    b = repo.create_session()
+    assert repo.get_session(b.id) is b
+    assert repo.stats()["evicted_ttl"] == 1
+    with pytest.raises(KeyError):
+        repo.get_session(a.id)
+
+
+def test_pinned_sessions_are_never_evicted():
+    repo = InMemoryRepo(max_sessions=1, max_bytes=0, idle_ttl=0.05, spill_dir="")
+    a = repo.create_session()
+    with repo.pin(a.id):
+        b = repo.create_session()
+        time.sleep(0.1)
+        repo.create_session()  # over the count limit, and a is past its TTL
+        assert repo.get_session(a.id) is a
+        assert repo.stats()["pinned_sessions"] == 1
+        with pytest.raises(KeyError):
+            repo.get_session(b.id)
+    repo.create_session()
+    with pytest.raises(KeyError):
+        repo.get_session(a.id)  # released: evicted like any other
+    assert repo.stats()["pinned_sessions"] == 0
+
+
+def test_generation_survives_eviction_pressure(monkeypatch):
+    memory = InMemoryRepo(max_sessions=1, max_bytes=0, idle_ttl=0, spill_dir="")
+
+    class BusyLLM(FakeLLM):
+        async def ainvoke(self, messages):
+            for _ in range(3):  # other users' sessions arrive while the reply is generated
+                memory.create_session()
+            return self.invoke(messages)
+
+    monkeypatch.setattr("app.graphs.agent.repo", memory)
+    monkeypatch.setattr("app.graphs.pipeline.repo", memory)
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: BusyLLM("```html\n<p>kept</p>\n```"))
+    session = memory.create_session()
+    result = asyncio.run(run_generation(session, "make a page", use_cache=False))
+    assert result["version"] == 1 and memory.get_session(session.id).code == "<p>kept</p>"
+
+
+def test_rollback_survives_eviction_during_the_diff(monkeypatch):
+    memory = InMemoryRepo(max_sessions=1, max_bytes=0, idle_ttl=0, spill_dir="")
+    session = memory.create_session()
+    memory.add_version(session.id, "<p>one</p>", None, origin="generation")
+    memory.add_version(session.id, "<p>two</p>", None, origin="generation")
+    real_diff = diff_service.aunified_diff
+
+    async def busy_diff(old, new):
+        for _ in range(3):  # other users' sessions arrive while the diff runs
+            memory.create_session()
+        return await real_diff(old, new)
+
+    monkeypatch.setattr("app.api.routes.repo", memory)
+    monkeypatch.setattr(diff_service, "aunified_diff", busy_diff)
+    r = TestClient(app).post(f"/sessions/{session.id}/rollback", params={"to": 1})
+    assert r.status_code == 200 and r.json()["version"] == 3
+    assert memory.get_session(session.id).code == "<p>one</p>"
+
+
+def test_byte_limit_counts_materialized_versions():
+    repo = InMemoryRepo(max_sessions=0, max_bytes=0, idle_ttl=0, spill_dir="")
+    a = repo.create_session()
+    for i in range(6):
+        repo.add_version(a.id, f"<p>{i}</p>\n" * 200, None)
+    held = repo.stats()["bytes_held"]
+    assert held == repo.footprint(a.id)["total_bytes"]
+    repo.get_version_code(a.id, 1)  # replays a delta chain into the LRU
+    repo.get_version_diff(a.id, 2)
+    assert repo.stats()["bytes_held"] == repo.footprint(a.id)["total_bytes"] > held
+    repo.add_message(a.id, "user", "hi")
+    repo.update_code(a.id, "")
+    assert repo.stats()["bytes_held"] == repo.footprint(a.id)["total_bytes"] == a.size_bytes
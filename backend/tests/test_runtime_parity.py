@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from app.core.config import get_settings
+from app.graphs.agent import run_generation, run_generation_sync
+from app.graphs.pipeline import GenerationValidationError, pipeline_stats
+from app.services import llm as llm_service
+from app.services.repository import repo
+from tests.fakes import FakeLLM, FakeResponse
+
+# `DirectRunner` reads StateGraph internals (nodes, edges, branches); these
+# runs pin down that it walks the graph exactly as LangGraph does.
+PAGE = "<html>\n<body>\n" + "  <p>filler paragraph</p>\n" * 200 + "</body>\n</html>"
+FAILED_PATCH = "<<<<<<< SEARCH\nmissing\n=======\nx\n>>>>>>> REPLACE"
+SCENARIOS = {
+    "full": (
+        ["```html\n<p>a</p>\n```"], {},
+        ["context", "llm", "extract", "validate", "diff", "persist"],
+    ),
+    "dry_run": (
+        ["```html\n<p>a</p>\n```"], {"persist": False},
+        ["context", "llm", "extract", "validate", "diff"],
+    ),
+    "patch_fallback": (
+        [FAILED_PATCH, "```html\n<p>full</p>\n```"], {"edit_mode": "patch"},
+        ["context", "llm", "extract", "context", "llm", "extract", "validate", "diff", "persist"],
+    ),
+    "repair": (
+        [
+            FakeResponse("```html\n<html>\n<body>\n<p>a", finish_reason="length"),
+            FakeResponse("</p>\n</body>\n</html>\n```", finish_reason="stop"),
+        ],
+        {},
+        ["context", "llm", "extract", "validate", "repair", "extract", "validate", "diff", "persist"],
+    ),
+    "refusal": (["Sorry, I can't help with that."], {}, ["context", "llm", "rejected"]),
+}
+
+
+def _visited(monkeypatch, runtime: str, mode: str, replies: list, options: dict) -> list[str]:
+    monkeypatch.setattr(get_settings(), "pipeline_runtime", runtime)
+    fake = FakeLLM(*replies)
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: fake)
+    session = repo.create_session()
+    repo.add_version(session.id, PAGE, None, origin="generation")
+    session = repo.get_session(session.id)
+    visited: list[str] = []
+    monkeypatch.setattr(pipeline_stats, "observe", lambda name, seconds: visited.append(name))
+    try:
+        if mode == "sync":
+            run_generation_sync(session, "edit", use_cache=False, **options)
+        else:
+            asyncio.run(run_generation(session, "edit", use_cache=False, **options))
+    except GenerationValidationError:
+        visited.append("rejected")
+    return visited
+
+
+@pytest.mark.parametrize(
+    "name, mode",
+    # `run_generation` always persists: the dry run is sync only.
+    [(name, mode) for name in SCENARIOS for mode in ("sync", "async") if mode == "sync" or name != "dry_run"],
+)
+def test_direct_runner_visits_the_same_nodes_as_langgraph(monkeypatch, name, mode):
+    replies, options, expected = SCENARIOS[name]
+    runs = {runtime: _visited(monkeypatch, runtime, mode, replies, dict(options)) for runtime in ("direct", "langgraph")}
+    assert runs["direct"] == runs["langgraph"] == expected
@@ -0,0 +1,45 @@
+import asyncio
+
+from app.services.session_locks import SessionCoordinator
+
+
+def test_duplicates_are_coalesced():
+    coord = SessionCoordinator()
+    calls = 0
+
+    async def generate():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"version": calls}
+
+    async def main():
+        key = ("s1", "same message", 0, None)
+        return await asyncio.gather(*(coord.run_coalesced(key, "s1", generate) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert results == [{"version": 1}] * 5
+    assert coord.coalesced == 4
+    assert coord.stats()["locked_sessions"] == 0
+
+
+def test_different_messages_are_serialized_per_session():
+    coord = SessionCoordinator()
+    active = 0
+    peak = 0
+
+    async def generate():
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+
+    async def main():
+        await asyncio.gather(*(coord.run_coalesced(("s1", f"m{i}"), "s1", generate) for i in range(3)))
+        await asyncio.gather(*(coord.run_coalesced((f"s{i}", "m"), f"s{i}", generate) for i in range(3)))
+
+    asyncio.run(main())
+    assert peak == 3  # only reached by the second batch (different sessions)
+    assert coord.waited == 2
@@ -0,0 +1,66 @@
+import pytest
+
+from app.services.sqlite_repo import SQLiteRepo
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "sessions.db")
+
+
+def test_session_round_trip_across_instances(db_path):
+    repo = SQLiteRepo(db_path, pool_size=2)
+    session = repo.create_session()
+    repo.add_message(session.id, "user", "hi")
+    v1 = repo.add_version(session.id, "<p>one</p>", "d1")
+    v2 = repo.add_version(session.id, "<p>two</p>", "d2")
+    assert (v1.version, v2.version) == (1, 2)
+    repo.close()
+
+    # A second worker / restarted process sees the same data.
+    other = SQLiteRepo(db_path, pool_size=2)
+    loaded = other.get_session(session.id)
+    assert loaded.code == "<p>two</p>" and loaded.current_version == 2
+    assert other.get_version_code(session.id, 1) == "<p>one</p>"
+    assert other.get_version_diff(session.id, 2) == "d2"
+    assert other.get_version(session.id, 3) is None
+
+
+def test_rollback_content_is_deduplicated(db_path):
+    repo = SQLiteRepo(db_path)
+    sid = repo.create_session().id
+    repo.add_version(sid, "<p>one</p>" * 50, "")
+    repo.add_version(sid, "<p>two</p>", "")
+    repo.add_version(sid, "<p>one</p>" * 50, "", summary="rollback to 1", origin="rollback")
+    fp = repo.footprint(sid)
+    assert fp["versions"]["versions"] == 3
+    assert fp["versions"]["unique_contents"] == 2
+
+
+def test_unknown_session(db_path):
+    repo = SQLiteRepo(db_path)
+    with pytest.raises(KeyError):
+        repo.get_session("missing")
+    with pytest.raises(KeyError):
+        repo.add_message("missing", "user", "x")
+
+
+def test_deferred_diff_is_computed_and_stored(db_path):
+    repo = SQLiteRepo(db_path)
+    sid = repo.create_session().id
+    repo.add_version(sid, "<p>one</p>\n", None)
+    repo.add_version(sid, "<p>two</p>\n", None)
+    assert repo.get_version(sid, 2).diff_blob is None
+    assert "-<p>one</p>\n+<p>two</p>" in repo.get_version_diff(sid, 2)
+    assert repo.get_version(sid, 2).diff_blob is not None
+
+
+def test_list_versions_pages_newest_first(db_path):
+    repo = SQLiteRepo(db_path)
+    sid = repo.create_session().id
+    for n in range(1, 6):
+        repo.add_version(sid, f"<p>{n}</p>", "")
+    assert [v.version for v in repo.list_versions(sid, limit=2)] == [5, 4]
+    assert [v.version for v in repo.list_versions(sid, before=4, limit=10)] == [3, 2, 1]
+    with pytest.raises(KeyError):
+        repo.list_versions("nope")
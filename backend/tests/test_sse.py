@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from app.api import routes
+from app.main import app
+from app.services import llm as llm_service
+from app.services.repository import repo
+from tests.fakes import FakeStreamingLLM
+
+
+def _parse_sse(body: str) -> list[dict]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        event = json.loads(lines["data"])
+        assert event["type"] == lines["event"]
+        events.append(event)
+    return events
+
+
+def test_sse_streams_the_same_events_as_the_websocket(monkeypatch):
+    text = "```html\n<p>sse</p>\n```"
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeStreamingLLM([text[:9], text[9:]]))
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    r = client.post(
+        f"/sessions/{sid}/messages", json={"message": "x"}, headers={"Accept": "text/event-stream"}
+    )
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(r.text)
+    kinds = [e["type"] for e in events]
+    assert kinds[0] == "ack" and kinds[-1] == "final"
+    assert "".join(e["text"] for e in events if e["type"] == "token") == text
+    assert {"type": "version", "version": 1} in events
+    assert client.get(f"/sessions/{sid}/code").json()["code"] == "<p>sse</p>"
+
+
+def test_sse_base_version_conflict_is_a_plain_409():
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    r = client.post(
+        f"/sessions/{sid}/messages",
+        json={"message": "x", "base_version": 3},
+        headers={"Accept": "text/event-stream"},
+    )
+    assert r.status_code == 409
+
+
+def test_closing_the_sse_stream_cancels_the_llm_call(monkeypatch):
+    fake = FakeStreamingLLM(["```html\n"] + ["<p>x</p>\n"] * 1000, delay=0.01)
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: fake)
+    session = repo.create_session()
+    req = routes.MessageRequest(message="x")
+
+    async def main():
+        stream = routes._sse_stream(session.id, req)
+        seen = [await stream.__anext__()]
+        while not seen[-1].startswith("event: token"):
+            seen.append(await stream.__anext__())
+        await stream.aclose()  # what Starlette does when the client goes away
+        return seen
+
+    assert asyncio.run(main())[0].startswith("event: ack")
+    assert fake.closed
+    assert repo.get_session(session.id).current_version == 0
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from vibe_core.extract import CodeStreamParser
+from vibe_core.sse import SSEDecoder, completion_delta, sse_event
+
+
+def _chunk(text: str) -> str:
+    return json.dumps({"choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}]})
+
+
+def test_sse_decoder_handles_split_events_and_utf8():
+    body = f": OPENROUTER PROCESSING\n\ndata: {_chunk('héllo')}\r\n\r\ndata: {_chunk(' 世界')}\n\ndata: [DONE]\n\n".encode()
+    decoder = SSEDecoder()
+    payloads = []
+    for i in range(0, len(body), 7):  # splits lines and multi-byte characters
+        payloads.extend(decoder.feed(body[i:i + 7]))
+    assert payloads[-1] == "[DONE]"
+    assert "".join(completion_delta(p)[0] for p in payloads[:-1]) == "héllo 世界"
+
+
+def test_completion_delta_raises_on_stream_error():
+    assert completion_delta(json.dumps({"choices": [{"delta": {}, "finish_reason": "stop"}]})) == ("", "stop")
+    with pytest.raises(RuntimeError, match="overloaded"):
+        completion_delta(json.dumps({"error": {"message": "overloaded"}}))
+
+
+def test_code_parser_matches_full_extraction_for_any_split():
+    reply = "Sure:\n```html\n<p>a ``inline`` b</p>\n```\nDone."
+    for size in (1, 2, 3, 5, 64):
+        parser = CodeStreamParser()
+        code = "".join(parser.feed(reply[i:i + size]) for i in range(0, len(reply), size))
+        assert code == "<p>a ``inline`` b</p>\n"
+
+
+def test_sse_event_format():
+    assert sse_event({"type": "token", "text": "é"}) == 'event: token\ndata: {"type":"token","text":"é"}\n\n'
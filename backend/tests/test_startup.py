@@ -0,0 +1,66 @@
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+from app.core.config import Settings, get_settings
+from app.main import app
+from app.services import warmup as warmup_module
+from app.services.warmup import Warmup
+
+_LLM_STACK = ("langchain_core", "langchain_openai", "langgraph.graph", "openai", "httpx", "tiktoken")
+
+
+def test_app_import_leaves_the_llm_stack_unloaded():
+    # Cold start: `import app.main` must not pay for LangChain / LangGraph (see benchmarks/bench_startup.py).
+    code = f"import sys, app.main; print(sorted(m for m in {_LLM_STACK!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    assert out.strip() == "[]"
+
+
+def test_settings_read_the_environment_when_instantiated(monkeypatch):
+    monkeypatch.setenv("GENERATION_MAX_TOKENS", "123")
+    monkeypatch.setenv("FALLBACK_MODELS", "a, b,")
+    monkeypatch.setenv("LLM_WARMUP", "no")
+    s = Settings()
+    assert (s.generation_max_tokens, s.fallback_models, s.llm_warmup) == (123, ["a", "b"], False)
+
+
+def test_warmup_runs_once_in_the_background():
+    w = Warmup()
+    assert w.snapshot()["state"] == "not_started" and not w.ready
+    w.start()
+    w.start()
+    assert w.wait(60)
+    assert w.ready and w.snapshot()["state"] == "done" and w.seconds is not None
+
+
+def test_ready_is_separate_from_health(monkeypatch):
+    monkeypatch.setattr(get_settings(), "llm_warmup", True)
+    pending = Warmup()
+    monkeypatch.setattr("app.main.warmup", pending)
+    client = TestClient(app)  # no lifespan: the warm-up has not started
+    assert client.get("/health").status_code == 200
+    r = client.get("/ready")
+    assert r.status_code == 503 and r.json()["warmup"]["state"] == "not_started"
+    with TestClient(app) as started:  # lifespan starts it
+        assert pending.wait(60)
+        r = started.get("/ready")
+    assert r.status_code == 200 and r.json()["status"] == "ready"
+
+
+def test_failed_warmup_is_not_ready(monkeypatch):
+    def broken():
+        raise ImportError("no module named langchain_openai")
+
+    monkeypatch.setattr(get_settings(), "llm_warmup", True)
+    monkeypatch.setattr(warmup_module, "warm", broken)
+    failed = Warmup()
+    monkeypatch.setattr("app.main.warmup", failed)
+    failed.start()
+    assert failed.wait(10)
+    r = TestClient(app).get("/ready")
+    assert r.status_code == 503 and r.json()["warmup"]["error"].startswith("ImportError")
+    # Without warm-up the stack loads on the first generation; nothing to wait for.
+    monkeypatch.setattr(get_settings(), "llm_warmup", False)
+    assert TestClient(app).get("/ready").status_code == 200
@@ -0,0 +1,90 @@
+import random
+import time
+
+from vibe_core.extract import CodeStreamParser, LiveDiff, extract_code_block
+
+REPLY = "Sure! Here is `the` page:\n```html\n<html>\n<body>\n<p>a ``b`` c</p>\n</body>\n</html>\n```\nEnjoy ```html\nnot this\n```"
+
+
+def _chunks(text: str, rng: random.Random) -> list[str]:
+    out, i = [], 0
+    while i < len(text):
+        n = rng.randint(1, 7)
+        out.append(text[i:i + n])
+        i += n
+    return out
+
+
+def _stream(text: str, seed: int) -> str:
+    parser = CodeStreamParser()
+    return "".join(parser.feed(c) for c in _chunks(text, random.Random(seed)))
+
+
+def test_deltas_match_extract_code_block_for_any_chunking():
+    for seed in range(50):
+        assert _stream(REPLY, seed).strip() == extract_code_block(REPLY)
+
+
+def test_bare_fence_and_other_language_fences():
+    assert _stream("```\n<p>x</p>\n```", 1).strip() == "<p>x</p>"
+    text = "```python\nprint(1)\n```html\n<p>y</p>\n```"
+    assert _stream(text, 2).strip() == extract_code_block(text)
+
+
+def test_feed_is_linear():
+    body = "<p>" + "x" * 200_000 + "</p>"
+    parser = CodeStreamParser()
+    start = time.perf_counter()
+    out = [parser.feed(ch) for ch in "```html\n" + body + "\n```"]
+    assert "".join(out).strip() == body
+    assert time.perf_counter() - start < 2.0
+
+
+def _apply_hunks(old: str, hunks: str) -> str:
+    """Apply zero-context unified hunks."""
+    old_lines = old.splitlines()
+    out, pos = [], 0
+    lines = hunks.splitlines()
+    i = 0
+    while i < len(lines):
+        header = lines[i].split()
+        old_start, old_n = map(int, header[1][1:].split(","))
+        first_old = old_start - 1 if old_n else old_start
+        out.extend(old_lines[pos:first_old])
+        pos = first_old + old_n
+        i += 1
+        while i < len(lines) and not lines[i].startswith("@@"):
+            if lines[i].startswith("+"):
+                out.append(lines[i][1:])
+            i += 1
+    out.extend(old_lines[pos:])
+    return "\n".join(out)
+
+
+def test_live_diff_hunks_reconstruct_new_code():
+    rng = random.Random(7)
+    old = "\n".join(f"<p>line {i}</p>" for i in range(60))
+    for _ in range(20):
+        new_lines = old.split("\n")
+        for _ in range(5):
+            j = rng.randrange(len(new_lines))
+            op = rng.choice(["edit", "insert", "delete"])
+            if op == "edit":
+                new_lines[j] = f"<p>edited {rng.random()}</p>"
+            elif op == "insert":
+                new_lines.insert(j, f"<div>{rng.random()}</div>")
+            else:
+                del new_lines[j]
+        new = "\n".join(new_lines)
+        live = LiveDiff(old)
+        hunks = "".join(live.feed(c) for c in _chunks(new, rng)) + live.finish()
+        assert _apply_hunks(old, hunks) == new
+        assert hunks.count("@@ ") <= 2 * 5 * 2
+
+
+def test_live_diff_emits_hunks_before_the_end():
+    old = "a\nb\nc\nd\ne"
+    live = LiveDiff(old)
+    assert live.feed("a\nB\nc\n") == "@@ -2,1 +2,1 @@\n-b\n+B\n"
+    assert live.feed("d\ne") == ""
+    assert live.finish() == ""
@@ -0,0 +1,66 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import llm as llm_service
+from tests.fakes import FakeLLM
+
+
+def _session_with_versions(client, monkeypatch, bodies):
+    sid = client.post("/sessions").json()["session_id"]
+    for body in bodies:
+        monkeypatch.setattr(llm_service, "build_llm", lambda model_name, b=body: FakeLLM(f"```html\n{b}\n```"))
+        client.post(f"/sessions/{sid}/messages", json={"message": f"make {body}", "diff": False})
+    return sid
+
+
+def test_versions_are_paginated_newest_first(monkeypatch):
+    client = TestClient(app)
+    sid = _session_with_versions(client, monkeypatch, [f"<p>{n}</p>" for n in range(1, 6)])
+    first = client.get(f"/sessions/{sid}/versions", params={"limit": 2}).json()
+    assert [v["version"] for v in first["versions"]] == [5, 4]
+    assert first["current_version"] == 5 and first["next_before"] == 4
+    assert "code" not in first["versions"][0]
+    second = client.get(f"/sessions/{sid}/versions", params={"limit": 2, "before": 4}).json()
+    third = client.get(f"/sessions/{sid}/versions", params={"limit": 2, "before": second["next_before"]}).json()
+    assert [v["version"] for v in second["versions"] + third["versions"]] == [3, 2, 1]
+    assert third["next_before"] is None
+
+
+def test_version_and_list_support_conditional_get(monkeypatch):
+    client = TestClient(app)
+    sid = _session_with_versions(client, monkeypatch, ["<p>one</p>", "<p>two</p>"])
+    r = client.get(f"/sessions/{sid}/versions/1")
+    assert r.status_code == 200 and r.json()["code"] == "<p>one</p>"
+    assert r.headers["etag"] == f'"{r.json()["content_hash"]}"'
+    again = client.get(f"/sessions/{sid}/versions/1", headers={"If-None-Match": r.headers["etag"]})
+    assert again.status_code == 304 and again.content == b""
+
+    listing = client.get(f"/sessions/{sid}/versions")
+    etag = listing.headers["etag"]
+    assert client.get(f"/sessions/{sid}/versions", headers={"If-None-Match": etag}).status_code == 304
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeLLM("```html\n<p>three</p>\n```"))
+    client.post(f"/sessions/{sid}/messages", json={"message": "three"})
+    assert client.get(f"/sessions/{sid}/versions", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_diff_between_any_two_versions(monkeypatch):
+    client = TestClient(app)
+    sid = _session_with_versions(client, monkeypatch, ["<p>one</p>", "<p>two</p>", "<p>three</p>"])
+    latest = client.get(f"/sessions/{sid}/diff").json()
+    assert (latest["from_version"], latest["to_version"]) == (2, 3)
+    assert "-<p>two</p>" in latest["diff"] and "+<p>three</p>" in latest["diff"]
+    r = client.get(f"/sessions/{sid}/diff", params={"from": 3, "to": 1})
+    assert "-<p>three</p>" in r.json()["diff"] and "+<p>one</p>" in r.json()["diff"]
+    cached = client.get(f"/sessions/{sid}/diff", params={"from": 3, "to": 1}, headers={"If-None-Match": r.headers["etag"]})
+    assert cached.status_code == 304
+    assert "+<p>one</p>" in client.get(f"/sessions/{sid}/diff", params={"from": 0, "to": 1}).json()["diff"]
+
+
+def test_unknown_version_or_session():
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    assert client.get(f"/sessions/{sid}/versions/1").json()["detail"] == "version_not_found"
+    assert client.get(f"/sessions/{sid}/diff", params={"to": 2}).status_code == 404
+    assert client.get(f"/sessions/{sid}/diff").json()["diff"] == ""
+    assert client.get("/sessions/nope/versions").json()["detail"] == "session_not_found"
+    assert client.get("/sessions/nope/versions/1").status_code == 404
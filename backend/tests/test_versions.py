@@ -0,0 +1,59 @@
+from app.services.versions import VersionStore, apply_delta, make_delta
+
+
+def _page(i: int) -> str:
+    return "<html>\n" + "".join(f"<p>line {n} rev {i if n == i % 50 else 0}</p>\n" for n in range(50)) + "</html>\n"
+
+
+def test_delta_round_trip():
+    a, b = _page(1), _page(2)
+    assert apply_delta(a, make_delta(a, b)) == b
+
+
+def test_store_reconstructs_every_version():
+    store = VersionStore(snapshot_interval=4, cache_size=2)
+    pages = [_page(i) for i in range(1, 13)]
+    for p in pages:
+        store.append(p, "", None, "generation")
+    # Cache only holds the last two; older versions replay delta chains.
+    for n, p in enumerate(pages, start=1):
+        assert store.code(n) == p
+    fp = store.footprint()
+    assert fp["versions"] == 12 and fp["snapshots"] == 3
+    assert fp["blob_bytes"] < sum(map(len, pages)) // 4
+
+
+def test_rollback_reuses_content():
+    store = VersionStore()
+    store.append(_page(1), "", None, "generation")
+    store.append(_page(2), "d", None, "generation")
+    before = store.footprint()["blob_bytes"]
+    v3 = store.append(_page(1), "d2", "rollback to 1", "rollback")
+    assert v3.version == 3
+    assert v3.content_hash == store.get(1).content_hash
+    assert store.footprint()["blob_bytes"] == before
+    assert store.diff(3) == "d2"
+
+
+def test_diff_is_computed_on_first_read():
+    store = VersionStore()
+    store.append(_page(1), None, None, "generation")
+    store.append(_page(2), None, None, "generation")
+    assert store.footprint()["diff_bytes"] == 0
+    assert "+<p>line 2 rev 2</p>" in store.diff(2)
+    assert "@@ -0,0 +1,52 @@" in store.diff(1)
+    assert store.footprint()["diff_bytes"] > 0
+
+
+def test_running_totals_match_the_stored_bytes():
+    store = VersionStore(snapshot_interval=3, cache_size=2)
+    for i in range(1, 8):
+        store.append(_page(i), None if i % 2 else "d", None, "generation")
+    for n in range(1, 8):
+        store.code(n)
+        store.diff(n)
+    assert store.nbytes == (
+        sum(len(b.data) for b in store._blobs.values())
+        + sum(len(v.diff_blob) for v in store)
+        + sum(len(t) for t in store._cache.values())
+    )
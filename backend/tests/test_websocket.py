@@ -0,0 +1,112 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import llm as llm_service
+from tests.fakes import FakeStreamingLLM
+
+
+def _page_tokens(body: str) -> list[str]:
+    text = f"```html\n<html><body>{body}</body></html>\n```"
+    return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+
+def _receive_turn(ws) -> list[dict]:
+    frames = []
+    while True:
+        frame = ws.receive_json()
+        frames.append(frame)
+        if frame["type"] in ("final", "error", "cancelled"):
+            return frames
+
+
+def test_multiple_turns_on_one_connection(monkeypatch):
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    with client.websocket_connect(f"/ws/sessions/{sid}") as ws:
+        for n, body in enumerate(("one", "two"), start=1):
+            monkeypatch.setattr(llm_service, "build_llm", lambda model_name, b=body: FakeStreamingLLM(_page_tokens(b)))
+            ws.send_json({"type": "user_message", "message": body})
+            frames = _receive_turn(ws)
+            assert frames[0]["type"] == "ack"
+            assert {"type": "version", "version": n} in frames
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+    assert client.get(f"/sessions/{sid}/code").json()["code"] == "<html><body>two</body></html>"
+
+
+def test_tokens_are_batched_by_size(monkeypatch):
+    tokens = _page_tokens("x" * 400)
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeStreamingLLM(tokens))
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    with client.websocket_connect(f"/ws/sessions/{sid}?batch_ms=10000&batch_bytes=64&live=0") as ws:
+        ws.send_json({"type": "user_message", "message": "x"})
+        frames = _receive_turn(ws)
+    token_frames = [f["text"] for f in frames if f["type"] == "token"]
+    assert "".join(token_frames) == "".join(tokens)
+    assert len(token_frames) <= len(tokens) // 16 + 1
+
+
+def test_cancel_stops_generation_without_new_version(monkeypatch):
+    monkeypatch.setattr(
+        llm_service, "build_llm", lambda model_name: FakeStreamingLLM(_page_tokens("slow") * 50, delay=0.01)
+    )
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    with client.websocket_connect(f"/ws/sessions/{sid}?batch_ms=0&batch_bytes=0") as ws:
+        ws.send_json({"type": "user_message", "message": "x"})
+        assert ws.receive_json()["type"] == "ack"
+        ws.send_json({"type": "cancel"})
+        assert _receive_turn(ws)[-1]["type"] == "cancelled"
+        ws.send_json({"type": "resume", "version": 0})
+        assert ws.receive_json() == {"type": "sync", "version": 0, "up_to_date": True}
+
+
+def test_resume_sends_code_and_diff_since_version(monkeypatch):
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeStreamingLLM(_page_tokens("hi")))
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    with client.websocket_connect(f"/ws/sessions/{sid}") as ws:
+        ws.send_json({"type": "user_message", "message": "x"})
+        _receive_turn(ws)
+    with client.websocket_connect(f"/ws/sessions/{sid}") as ws:
+        ws.send_json({"type": "resume", "version": 0})
+        sync = ws.receive_json()
+    assert sync["version"] == 1 and not sync["up_to_date"]
+    assert sync["code"] == "<html><body>hi</body></html>"
+    assert "+<html><body>hi</body></html>" in sync["diff"]
+
+
+def test_msgpack_framing(monkeypatch):
+    msgpack = pytest.importorskip("msgpack")
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: FakeStreamingLLM(_page_tokens("bin")))
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    with client.websocket_connect(f"/ws/sessions/{sid}?encoding=msgpack") as ws:
+        ws.send_bytes(msgpack.packb({"type": "user_message", "message": "x"}))
+        types = []
+        while not types or types[-1] != "final":
+            types.append(msgpack.unpackb(ws.receive_bytes())["type"])
+    assert types[0] == "ack" and "code" in types
+
+
+def test_live_code_deltas_and_diff_hunks(monkeypatch):
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    old = "\n".join(f"<p>{i}</p>" for i in range(20))
+    new = old.replace("<p>5</p>", "<p>five</p>")
+    with client.websocket_connect(f"/ws/sessions/{sid}?live=1&batch_ms=0&batch_bytes=0") as ws:
+        for page in (old, new):
+            text = f"```html\n{page}\n```"
+            tokens = [text[i:i + 5] for i in range(0, len(text), 5)]
+            monkeypatch.setattr(llm_service, "build_llm", lambda model_name, t=tokens: FakeStreamingLLM(t))
+            ws.send_json({"type": "user_message", "message": "x"})
+            frames = _receive_turn(ws)
+    code = next(f["code"] for f in frames if f["type"] == "code")
+    assert "".join(f["text"] for f in frames if f["type"] == "code_delta").strip() == code
+    hunks = "".join(f["text"] for f in frames if f["type"] == "diff_hunk")
+    assert hunks == "@@ -6,1 +6,1 @@\n-<p>5</p>\n+<p>five</p>\n"
+    # The hunk arrives while the reply is still streaming.
+    kinds = [f["type"] for f in frames]
+    assert kinds.index("diff_hunk") < max(i for i, k in enumerate(kinds) if k == "token")
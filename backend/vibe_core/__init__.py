@@ -0,0 +1,35 @@
+"""Runtime-independent core shared by the FastAPI backend and the Cloudflare worker.
+
+Standard library only: no pydantic, LangChain or settings. Callers pass
+budgets and options explicitly. Modules:
+
+- `prompts`: system prompts and prompt templates;
+- `extract`: fenced-code extraction, whole or streamed, and the live diff;
+- `diff`: the histogram diff engine;
+- `sse`: Server-Sent Events encoding and decoding.
+
+Importing the package loads nothing else. The names below resolve to their
+module on first access, so a caller that only needs prompts never pays for
+the diff engine.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "SYSTEM_PROMPTS": "prompts",
+    "extract_code_block": "extract",
+    "page_code": "extract",
+    "InvalidGeneration": "extract",
+    "CodeStreamParser": "extract",
+    "compute_diff": "diff",
+    "unified_diff": "diff",
+    "sse_event": "sse",
+    "SSEDecoder": "sse",
+}
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f"{__name__}.{module}"), name)
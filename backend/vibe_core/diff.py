@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+"""Unified diffs between page versions (standard library only).
+
+`difflib.SequenceMatcher` is roughly quadratic when a page has many lines that
+repeat often but not often enough to count as junk (tag-per-line or
+half-minified HTML). 40k such lines take ~4 s. On a single-line minified page
+it reports "the whole line changed". This engine instead:
+
+- interns lines to ints once and trims the common prefix and suffix;
+- aligns the rest with histogram diff (as in git). The rarest line common to
+  both sides anchors the longest matching run around it, and the gaps on
+  either side are diffed the same way. Lines that occur more than
+  `_MAX_CHAIN` times never anchor, which bounds the work per region. Where
+  every line is that frequent, the runs of `_SHINGLE` lines that are unique
+  on both sides anchor instead (patience diff);
+- splits lines longer than `long_line` characters into tag / statement
+  tokens. A one-word change in minified HTML then yields a small hunk. Such
+  hunks are for display only: their ranges count tokens, and their headers
+  end in "tokens";
+- enforces a time budget and an output size budget. Past either, the result
+  degrades to a one-line summary (see `diff_summary`).
+
+Budgets are explicit arguments here. The backend's `app.services.diff` fills
+them from the DIFF_* settings and adds stats, metrics and an async variant.
+"""
+
+import re
+import time
+from bisect import bisect_left
+from typing import Optional
+
+DEFAULT_TIMEOUT = 1.0  # seconds
+DEFAULT_MAX_BYTES = 1024 * 1024
+DEFAULT_LONG_LINE = 1000  # characters; 0 disables token mode
+_MAX_CHAIN = 64  # lines occurring more often than this in a region never anchor
+_SHINGLE = 4  # lines per key when single lines are all too frequent to anchor
+_TOKEN = re.compile(r"<[^<>]*>|[^<;{}]*[;{}]|[^<;{}]+|<")
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+class DiffResult:
+    # A plain class: `dataclasses` (via `inspect`) would add ~6 ms to the worker's cold start.
+    __slots__ = ("text", "mode", "seconds")
+
+    def __init__(self, text: str, mode: str, seconds: float) -> None:
+        self.text = text
+        self.mode = mode  # "lines" | "tokens" | "summary"
+        self.seconds = seconds
+
+
+def _intern(a: list[str], b: list[str]) -> tuple[list[int], list[int]]:
+    ids: dict[str, int] = {}
+    return [ids.setdefault(x, len(ids)) for x in a], [ids.setdefault(x, len(ids)) for x in b]
+
+
+def _anchor(a: list[int], alo: int, ahi: int, b: list[int], blo: int, bhi: int) -> Optional[tuple[int, int, int]]:
+    """Histogram step: (i, j, n) of the matching run with the rarest lines, longest first on ties."""
+    positions: dict[int, list[int]] = {}
+    for i in range(alo, ahi):
+        positions.setdefault(a[i], []).append(i)
+    best: Optional[tuple[int, int, int]] = None
+    best_count = _MAX_CHAIN
+    j = blo
+    while j < bhi:
+        chain = positions.get(b[j])
+        next_j = j + 1
+        if chain is None or len(chain) > best_count:
+            j = next_j
+            continue
+        i_min = alo
+        for i in chain:
+            if i < i_min:
+                continue  # already inside the run found from an earlier position
+            count = len(chain)
+            si, sj, ei, ej = i, j, i + 1, j + 1
+            while si > alo and sj > blo and a[si - 1] == b[sj - 1]:
+                si, sj = si - 1, sj - 1
+                count = min(count, len(positions[a[si]]))
+            while ei < ahi and ej < bhi and a[ei] == b[ej]:
+                count = min(count, len(positions[a[ei]]))
+                ei, ej = ei + 1, ej + 1
+            next_j = max(next_j, ej)
+            i_min = ei
+            if best is None or count < best_count or (count == best_count and ei - si > best[2]):
+                best, best_count = (si, sj, ei - si), count
+        j = next_j
+    return best
+
+
+def _longest_increasing(pairs: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Longest subsequence of `pairs` (sorted by i) whose j values increase."""
+    tails: list[int] = []  # tails[k]: j of the best run of length k + 1
+    tail_idx: list[int] = []
+    back: list[int] = []
+    for idx, (_, j) in enumerate(pairs):
+        k = bisect_left(tails, j)
+        back.append(tail_idx[k - 1] if k else -1)
+        if k == len(tails):
+            tails.append(j)
+            tail_idx.append(idx)
+        else:
+            tails[k] = j
+            tail_idx[k] = idx
+    out: list[tuple[int, int]] = []
+    idx = tail_idx[-1] if tail_idx else -1
+    while idx != -1:
+        out.append(pairs[idx])
+        idx = back[idx]
+    return out[::-1]
+
+
+def _shingle_blocks(
+    a: list[int], alo: int, ahi: int, b: list[int], blo: int, bhi: int, k: int = _SHINGLE
+) -> list[tuple[int, int, int]]:
+    """Patience step over runs of `k` lines, for regions where every single line is too frequent.
+
+    Runs that occur once on each side and keep their order become matching blocks.
+    """
+    if ahi - alo < k or bhi - blo < k:
+        return []
+    seen_a: dict[tuple, int] = {}  # run -> position, or -1 if repeated
+    for i in range(alo, ahi - k + 1):
+        key = tuple(a[i:i + k])
+        seen_a[key] = -1 if key in seen_a else i
+    seen_b: dict[tuple, int] = {}
+    for j in range(blo, bhi - k + 1):
+        key = tuple(b[j:j + k])
+        if key in seen_a:
+            seen_b[key] = -1 if key in seen_b else j
+    pairs = sorted((seen_a[key], j) for key, j in seen_b.items() if j != -1 and seen_a[key] != -1)
+    blocks: list[tuple[int, int, int]] = []
+    for i, j in _longest_increasing(pairs):
+        if blocks:
+            pi, pj, pn = blocks[-1]
+            if i - pi == j - pj and i <= pi + pn:  # overlapping runs on one diagonal
+                blocks[-1] = (pi, pj, i + k - pi)
+                continue
+            if i < pi + pn or j < pj + pn:
+                continue
+        blocks.append((i, j, k))
+    return blocks
+
+
+def _matching_blocks(a: list[int], b: list[int], deadline: float) -> list[tuple[int, int, int]]:
+    """Increasing (i, j, n) runs with a[i:i+n] == b[j:j+n], ending with (len(a), len(b), 0)."""
+    blocks: list[tuple[int, int, int]] = []
+    regions = [(0, len(a), 0, len(b))]
+    while regions:
+        alo, ahi, blo, bhi = regions.pop()
+        n = 0
+        while alo + n < ahi and blo + n < bhi and a[alo + n] == b[blo + n]:
+            n += 1
+        if n:
+            blocks.append((alo, blo, n))
+            alo, blo = alo + n, blo + n
+        n = 0
+        while ahi - n > alo and bhi - n > blo and a[ahi - n - 1] == b[bhi - n - 1]:
+            n += 1
+        if n:
+            blocks.append((ahi - n, bhi - n, n))
+            ahi, bhi = ahi - n, bhi - n
+        if alo == ahi or blo == bhi:
+            continue
+        if time.monotonic() > deadline:
+            raise _BudgetExceeded
+        found = _anchor(a, alo, ahi, b, blo, bhi)
+        anchors = [found] if found is not None else _shingle_blocks(a, alo, ahi, b, blo, bhi)
+        # No anchors: nothing usable in common, the whole region is replaced.
+        for i, j, n in anchors:
+            blocks.append((i, j, n))
+            regions.append((alo, i, blo, j))
+            alo, blo = i + n, j + n
+        if anchors:
+            regions.append((alo, ahi, blo, bhi))
+    blocks.sort()
+    merged: list[tuple[int, int, int]] = []
+    for i, j, n in blocks:
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+            pi, pj, pn = merged[-1]
+            merged[-1] = (pi, pj, pn + n)
+        else:
+            merged.append((i, j, n))
+    merged.append((len(a), len(b), 0))
+    return merged
+
+
+def matching_blocks(a: list[str], b: list[str], timeout: float = DEFAULT_TIMEOUT) -> Optional[list[tuple[int, int, int]]]:
+    """Matching (i, j, n) runs of two line lists like `difflib.SequenceMatcher.get_matching_blocks`.
+
+    Returns None when the time budget runs out.
+    """
+    ia, ib = _intern(a, b)
+    try:
+        return _matching_blocks(ia, ib, time.monotonic() + timeout)
+    except _BudgetExceeded:
+        return None
+
+
+def _grouped_opcodes(blocks: list[tuple[int, int, int]], context: int) -> list[list[tuple[str, int, int, int, int]]]:
+    """Same hunks as `difflib.SequenceMatcher.get_grouped_opcodes`, from matching blocks."""
+    codes: list[tuple[str, int, int, int, int]] = []
+    i = j = 0
+    for ai, bj, n in blocks:
+        if i < ai or j < bj:
+            tag = "replace" if i < ai and j < bj else ("delete" if i < ai else "insert")
+            codes.append((tag, i, ai, j, bj))
+        if n:
+            codes.append(("equal", ai, ai + n, bj, bj + n))
+        i, j = ai + n, bj + n
+    if not any(tag != "equal" for tag, *_ in codes):
+        return []
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = (tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = (tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+    groups: list[list[tuple[str, int, int, int, int]]] = []
+    group: list[tuple[str, int, int, int, int]] = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+    return groups
+
+
+def _range(start: int, stop: int) -> str:
+    length = stop - start
+    if length == 1:
+        return str(start + 1)
+    return f"{start + 1 if length else start},{length}"
+
+
+def _units(lines: list[str], long_line: int) -> list[str]:
+    out: list[str] = []
+    for line in lines:
+        if len(line) > long_line:
+            out.extend(_TOKEN.findall(line))
+        else:
+            out.append(line)
+    return out
+
+
+def _emit(body: list[str], prefix: str, unit: str, tokens: bool) -> None:
+    if unit.endswith("\n"):
+        body.append(prefix + unit)
+    elif tokens:
+        body.append(prefix + unit + "\n")
+    else:
+        body.append(prefix + unit + "\n\\ No newline at end of file\n")
+
+
+def _line_count(text: str) -> int:
+    return text.count("\n") + (1 if text and not text.endswith("\n") else 0)
+
+
+def diff_summary(old: str, new: str, reason: str, filename: str = "index.html") -> str:
+    """Stand-in for a diff that was not computed (`reason`: "time_budget" or "size_budget")."""
+    return (
+        f"--- a/{filename}\n+++ b/{filename}\n"
+        f"# diff omitted ({reason}): {_line_count(old)} -> {_line_count(new)} lines, "
+        f"{len(old)} -> {len(new)} chars\n"
+    )
+
+
+def compute_diff(
+    old: Optional[str],
+    new: Optional[str],
+    filename: str = "index.html",
+    context: int = 3,
+    timeout: float = DEFAULT_TIMEOUT,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    long_line: int = DEFAULT_LONG_LINE,
+) -> DiffResult:
+    """Unified diff of `old` -> `new` within a time and an output size budget (0: no size limit)."""
+    start = time.monotonic()
+    old, new = old or "", new or ""
+    result = _compute(old, new, filename, context, start + timeout, max_bytes, long_line)
+    result.seconds = time.monotonic() - start
+    return result
+
+
+def unified_diff(old: Optional[str], new: Optional[str], filename: str = "index.html") -> str:
+    return compute_diff(old, new, filename).text
+
+
+def _compute(
+    old: str, new: str, filename: str, context: int, deadline: float, max_bytes: int, long_line: int
+) -> DiffResult:
+    if old == new:
+        return DiffResult("", "lines", 0.0)
+    a_lines = old.splitlines(keepends=True)
+    b_lines = new.splitlines(keepends=True)
+    tokens = bool(long_line) and any(len(line) > long_line for line in (*a_lines, *b_lines))
+    if tokens:
+        a_lines, b_lines = _units(a_lines, long_line), _units(b_lines, long_line)
+    a, b = _intern(a_lines, b_lines)
+    try:
+        groups = _grouped_opcodes(_matching_blocks(a, b, deadline), context)
+    except _BudgetExceeded:
+        return DiffResult(diff_summary(old, new, "time_budget", filename), "summary", 0.0)
+    body = [f"--- a/{filename}\n", f"+++ b/{filename}\n"]
+    size = 0
+    suffix = " tokens" if tokens else ""
+    for group in groups:
+        mark = len(body)
+        first, last = group[0], group[-1]
+        body.append(f"@@ -{_range(first[1], last[2])} +{_range(first[3], last[4])} @@{suffix}\n")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                for unit in a_lines[i1:i2]:
+                    _emit(body, " ", unit, tokens)
+                continue
+            for unit in a_lines[i1:i2]:
+                _emit(body, "-", unit, tokens)
+            for unit in b_lines[j1:j2]:
+                _emit(body, "+", unit, tokens)
+        if max_bytes:
+            size += sum(len(part) for part in body[mark:])
+            if size > max_bytes:
+                return DiffResult(diff_summary(old, new, "size_budget", filename), "summary", 0.0)
+    return DiffResult("".join(body), "tokens" if tokens else "lines", 0.0)
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+"""Code extraction from model replies, whole or streamed.
+
+`extract_code_block` returns the first ```html (or bare ```) fenced block of
+a complete reply, or None when there is none. `page_code` is the policy both
+runtimes apply to a full-page reply: the fenced block (or, for a reply cut
+off mid-page, the code after a fence that is never closed), and
+`InvalidGeneration` for a reply without one. Prose (a refusal, a question
+back) is never stored as the page.
+
+`CodeStreamParser` follows the first ```html (or bare ```) fenced block while
+tokens arrive and returns only the new code characters per `feed`, matching
+what `extract_code_block` finds on the full reply (before its final
+`strip()`). It keeps at most a few characters of carry-over, so total work is
+linear in the reply length.
+
+`LiveDiff` consumes that code and emits zero-context unified diff hunks
+against the previous code as soon as each changed region is closed by a line
+that matches again. Old lines are found through a hash index and a forward
+cursor, so each new line costs O(log n). The result is a best-effort preview.
+The authoritative diff is still computed once the reply is complete.
+
+`LineRestorer` is used when the prompt context was sliced. It delays code by
+at most one line and expands `@keep` markers line by line, so that the deltas
+and the live diff refer to the real page.
+"""
+
+import re
+from bisect import bisect_left
+from typing import Callable, Optional
+
+_FENCE = "```"
+_LANG = "html\n"
+_CODE_BLOCK = re.compile(r"```(?:html)?\n(.*?)(?:```)", re.DOTALL)
+_OPEN_FENCE = re.compile(r"```(?:html)?\n")
+
+
+class InvalidGeneration(ValueError):
+    """A full-page reply that holds no page: "missing_code_fence" or "empty_code"."""
+
+
+def extract_code_block(text: str) -> Optional[str]:
+    m = _CODE_BLOCK.search(text)
+    if m:
+        return m.group(1).strip()
+    return None
+
+
+def unclosed_code_block(text: str) -> Optional[str]:
+    """Code after an opening fence that is never closed, or None."""
+    fence = _OPEN_FENCE.search(text)
+    if fence is None or "```" in text[fence.end():]:
+        return None
+    return text[fence.end():]
+
+
+def page_code(text: str) -> str:
+    """The page a full-page reply carries; raises `InvalidGeneration` if none."""
+    code = extract_code_block(text)
+    if code is None:
+        code = unclosed_code_block(text)
+        if code is None:
+            raise InvalidGeneration("missing_code_fence")
+    if not code.strip():
+        raise InvalidGeneration("empty_code")
+    return code
+
+
+class CodeStreamParser:
+    def __init__(self) -> None:
+        self.state = "before"  # before | inside | after
+        self._carry = ""
+
+    @property
+    def done(self) -> bool:
+        return self.state == "after"
+
+    def feed(self, text: str) -> str:
+        """Return the code characters revealed by `text` (possibly empty)."""
+        if self.state == "after" or not text:
+            return ""
+        buf = self._carry + text
+        self._carry = ""
+        if self.state == "before":
+            start = self._open_fence(buf)
+            if start is None:
+                return ""
+            buf = buf[start:]
+            self.state = "inside"
+        end = buf.find(_FENCE)
+        if end != -1:
+            self.state = "after"
+            return buf[:end]
+        # Hold back trailing backticks that may start the closing fence.
+        keep = len(buf) - len(buf.rstrip("`"))
+        keep = min(keep, len(_FENCE) - 1)
+        if keep:
+            self._carry = buf[-keep:]
+            return buf[:-keep]
+        return buf
+
+    def _open_fence(self, buf: str) -> Optional[int]:
+        """Index just past an opening fence, or None (carrying a possible partial fence)."""
+        pos = 0
+        while True:
+            idx = buf.find(_FENCE, pos)
+            if idx == -1:
+                self._carry = buf[-(len(_FENCE) - 1):]
+                return None
+            rest = buf[idx + len(_FENCE):]
+            if rest.startswith("\n"):
+                return idx + len(_FENCE) + 1
+            if rest.startswith(_LANG):
+                return idx + len(_FENCE) + len(_LANG)
+            if _LANG.startswith(rest):  # undecided until more text arrives
+                self._carry = buf[idx:]
+                return None
+            pos = idx + 1
+
+
+class LineRestorer:
+    def __init__(self, restore: Callable[[str], str]) -> None:
+        self.restore = restore
+        self._partial = ""
+
+    def feed(self, code_delta: str) -> str:
+        text = self._partial + code_delta
+        cut = text.rfind("\n") + 1
+        self._partial = text[cut:]
+        return self.restore(text[:cut]) if cut else ""
+
+    def finish(self) -> str:
+        text, self._partial = self._partial, ""
+        return self.restore(text) if text else ""
+
+
+class LiveDiff:
+    def __init__(self, previous_code: str, max_skip: int = 200) -> None:
+        self.old = previous_code.splitlines()
+        self.max_skip = max_skip
+        self._index: dict[str, list[int]] = {}
+        for i, line in enumerate(self.old):
+            self._index.setdefault(line, []).append(i)
+        self._cursor = 0  # next unmatched old line
+        self._new_no = 0  # new lines consumed
+        self._partial = ""
+        self._removed: list[str] = []
+        self._added: list[str] = []
+        self._hunk_old = 0
+        self._hunk_new = 0
+
+    def feed(self, code_delta: str) -> str:
+        """Consume code text; return hunks completed by it (may be empty)."""
+        if not code_delta:
+            return ""
+        lines = (self._partial + code_delta).split("\n")
+        self._partial = lines.pop()
+        return "".join(self._line(line) for line in lines)
+
+    def finish(self) -> str:
+        """Flush the last partial line and any trailing deletions."""
+        out = self._line(self._partial) if self._partial else ""
+        self._partial = ""
+        if self._cursor < len(self.old):
+            self._start_hunk()
+            self._removed.extend(self.old[self._cursor:])
+            self._cursor = len(self.old)
+        return out + self._close_hunk()
+
+    def _line(self, line: str) -> str:
+        self._new_no += 1
+        if self._cursor < len(self.old) and self.old[self._cursor] == line:
+            self._cursor += 1
+            return self._close_hunk()
+        target = self._find(line)
+        if target is not None:
+            self._start_hunk()
+            self._removed.extend(self.old[self._cursor:target])
+            self._cursor = target + 1
+            return self._close_hunk()
+        self._start_hunk()
+        self._added.append(line)
+        return ""
+
+    def _find(self, line: str) -> Optional[int]:
+        if not line.strip():
+            return None  # blank lines are too common to resynchronize on
+        positions = self._index.get(line)
+        if not positions:
+            return None
+        i = bisect_left(positions, self._cursor)
+        if i < len(positions) and positions[i] - self._cursor <= self.max_skip:
+            return positions[i]
+        return None
+
+    def _start_hunk(self) -> None:
+        if not self._removed and not self._added:
+            self._hunk_old = self._cursor
+            self._hunk_new = self._new_no - 1
+
+    def _close_hunk(self) -> str:
+        if not self._removed and not self._added:
+            return ""
+        old_n, new_n = len(self._removed), len(self._added)
+        old_start = self._hunk_old + 1 if old_n else self._hunk_old
+        new_start = self._hunk_new + 1 if new_n else self._hunk_new
+        body = [f"@@ -{old_start},{old_n} +{new_start},{new_n} @@\n"]
+        body.extend(f"-{ln}\n" for ln in self._removed)
+        body.extend(f"+{ln}\n" for ln in self._added)
+        self._removed, self._added = [], []
+        return "".join(body)
+
+
+class LiveCodeStream:
+    """Parser, optional marker restoration and live diff for one streamed reply."""
+
+    def __init__(self, previous_code: str, restore: Optional[Callable[[str], str]] = None) -> None:
+        self.parser = CodeStreamParser()
+        self.restorer = LineRestorer(restore) if restore is not None else None
+        self.diff = LiveDiff(previous_code)
+
+    def feed(self, token: str) -> tuple[str, str]:
+        """Return (code_delta, completed diff hunks) for one streamed token."""
+        delta = self.parser.feed(token)
+        if delta and self.restorer is not None:
+            delta = self.restorer.feed(delta)
+        return delta, self.diff.feed(delta)
+
+    def finish(self) -> tuple[str, str]:
+        delta = self.restorer.finish() if self.restorer is not None else ""
+        return delta, self.diff.feed(delta) + self.diff.finish()
@@ -87,4 +87,31 @@ When a user requests a web page generation, please:
 
 Always prioritize user experience to create web applications that are both aesthetically pleasing and functional."""
 
-USER_INSTRUCTION_TEMPLATE = """User request:\n{message}\n\nExisting code (may be empty):\n```html\n{existing_code}\n```\n\nReturn ONLY the new full file in a fenced code block."""
+SYSTEM_PROMPT_COMPACT = """You are a senior front-end developer. Build modern, fast, accessible web pages.
+
+Output: one complete HTML file. CSS in a <style> tag in <head>, JavaScript in a <script> tag at the end of <body>. 2-space indentation, kebab-case CSS classes, camelCase JavaScript, brief comments on non-obvious logic. Stay under 50,000 tokens; if needed, keep the core features and simplify the rest.
+
+HTML: semantic tags (header, nav, main, section, article, footer), properly closed tags, double-quoted attributes, valid W3C markup.
+CSS: Flexbox/Grid, CSS variables, mobile-first responsive layout, Tailwind-style utility naming, at most 5 primary colors, readable type and contrast, smooth transitions and hover micro-interactions.
+JavaScript: modular ES6+, event delegation, error handling for edge cases, lazy-loaded images.
+UX: clear visual hierarchy and navigation, loading and error states, keyboard and screen-reader support, fast first load."""
+
+SYSTEM_PROMPTS = {"full": SYSTEM_PROMPT, "compact": SYSTEM_PROMPT_COMPACT}
+
+# The user turn is the existing code first (cache-friendly: identical for every
+# turn on the same version, and shared up to the first edit with the previous
+# one), then the request-specific instructions.
+CODE_BLOCK_TEMPLATE = """Existing code (may be empty):\n```html\n{existing_code}\n```\n\n"""
+
+USER_INSTRUCTION_TEMPLATE = """User request:\n{message}\n\nReturn ONLY the new full file in a fenced code block."""
+
+
+ELIDED_SECTIONS_NOTE = """\n\nNote: to save space, some unchanged sections of the existing code were replaced by markers like `<!-- @keep:s3 ... -->`. Copy every marker verbatim, in place, for sections you do not need to change (they are restored automatically). Only drop a marker if that section should be removed."""
+
+PATCH_INSTRUCTION_TEMPLATE = """User request:\n{message}\n\nEDIT MODE: do NOT return the full file. Return only the changes as one or more search/replace blocks:\n<<<<<<< SEARCH\n(exact lines copied from the existing code, enough to be unique)\n=======\n(the new lines)\n>>>>>>> REPLACE\n\nKeep each SEARCH short but unique, copy it character for character (including indentation), and use several blocks for several places. Output nothing but the blocks."""
+
+PATCH_ELIDED_NOTE = """\n\nNote: some sections of the existing code are not shown and appear as `<!-- @keep:s3 ... -->` markers. SEARCH blocks may only quote code that is shown; leave the markers alone."""
+
+# Sent after a reply that was cut off (see app.services.repair): the original
+# messages and the partial reply stay in front, so the prompt prefix is cached.
+CONTINUE_INSTRUCTION = """Your reply was cut off. Continue exactly where it stopped: output only the remaining part of the file, starting with the very next character. Do not repeat anything already written, do not restart the file and add no explanation. Finish with the closing ``` fence."""
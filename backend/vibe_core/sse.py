@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+"""Server-Sent Events, both directions.
+
+- `sse_event` formats a turn event as both runtimes send it: `event: <type>`
+  plus a JSON `data:` line.
+- `SSEDecoder` turns upstream SSE bytes into `data:` payloads, across
+  arbitrary chunk boundaries (including split UTF-8 sequences).
+- `completion_delta` reads the text of one OpenAI-style chat completion chunk.
+
+Each chunk costs time linear in its own size, so per-token overhead stays
+flat however long the reply grows.
+"""
+
+import codecs
+import json
+from typing import List, Optional, Tuple
+
+
+class SSEDecoder:
+    def __init__(self) -> None:
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._buf = ""
+        self._data: List[str] = []
+
+    def feed(self, chunk: bytes) -> List[str]:
+        """Payloads of the events completed by `chunk`, in order."""
+        self._buf += self._decoder.decode(chunk)
+        if "\n" not in self._buf:
+            return []
+        *lines, self._buf = self._buf.split("\n")
+        payloads = []
+        for line in lines:
+            line = line.rstrip("\r")
+            if not line:  # a blank line ends the event
+                if self._data:
+                    payloads.append("\n".join(self._data))
+                    self._data = []
+            elif line.startswith("data:"):
+                value = line[5:]
+                self._data.append(value[1:] if value.startswith(" ") else value)
+            # Comments (": OPENROUTER PROCESSING") and other fields are ignored.
+        return payloads
+
+
+def completion_delta(payload: str) -> Tuple[str, Optional[str]]:
+    """(content delta, finish_reason) of one chunk; raises RuntimeError on an in-stream error."""
+    data = json.loads(payload)
+    if "error" in data:
+        error = data["error"]
+        raise RuntimeError(f"LLM error: {error.get('message', error) if isinstance(error, dict) else error}")
+    choices = data.get("choices") or [{}]
+    return (choices[0].get("delta") or {}).get("content") or "", choices[0].get("finish_reason")
+
+
+def sse_event(event: dict) -> str:
+    data = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+    return f"event: {event['type']}\ndata: {data}\n\n"
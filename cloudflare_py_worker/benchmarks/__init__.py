@@ -0,0 +1,5 @@
+import os
+import sys
+
+# `vibe_core` from the backend tree, as the wrangler build step bundles it.
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "backend"))
@@ -0,0 +1,129 @@
+"""Cold start and response latency of the worker against a mock upstream.
+
+Usage (from cloudflare_py_worker/):
+    python -m benchmarks.bench_worker
+
+Runs `worker.py` under CPython with `benchmarks.local_runtime` standing in for
+the Workers `js` module, so absolute numbers differ from Pyodide; compare the
+rows with each other.
+
+- cold start: a fresh interpreter imports the worker and answers its first
+  request (median of 5 processes).
+- latency: one message turn whose mock upstream sends its first token after
+  300 ms and then one token every 2 ms. Buffered and streaming modes are
+  compared on time to first byte, first code character and last byte.
+- overhead: CPU per upstream chunk with a zero-latency upstream (the
+  streaming row includes the mock's own JSON encoding and one event-loop turn
+  per chunk), and the route dispatch cost of `GET /health`.
+"""
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks import local_runtime
+
+local_runtime.install()
+
+import worker  # noqa: E402  (needs the `js` module installed above)
+
+_COLD = """
+import time, asyncio
+t0 = time.perf_counter()
+from benchmarks import local_runtime
+local_runtime.install()
+import worker
+t1 = time.perf_counter()
+asyncio.run(worker.handle_request(local_runtime.Request("POST", "https://w.dev/sessions"), local_runtime.ENV, None))
+print(t1 - t0, time.perf_counter() - t1)
+"""
+
+
+def _page_tokens(n: int) -> list:
+    body = "".join(f'  <p class="item">Paragraph {i} of the page</p>\n' for i in range(n))
+    text = f"Here is the page:\n```html\n<html>\n<body>\n{body}</body>\n</html>\n```\nDone."
+    return [text[i:i + 16] for i in range(0, len(text), 16)]
+
+
+def cold_start() -> None:
+    interp, imports, first = [], [], []
+    for _ in range(5):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        interp.append(time.perf_counter() - start)
+        out = subprocess.run([sys.executable, "-c", _COLD], check=True, capture_output=True, text=True).stdout
+        a, b = map(float, out.split())
+        imports.append(a)
+        first.append(b)
+    print(f"cold start: interpreter {1000 * statistics.median(interp):.1f} ms, "
+          f"import worker {1000 * statistics.median(imports):.1f} ms, "
+          f"first request {1000 * statistics.median(first):.2f} ms")
+
+
+async def _session() -> str:
+    resp = await worker.handle_request(local_runtime.Request("POST", "https://w.dev/sessions"), local_runtime.ENV, None)
+    return json.loads(resp.body)["session_id"]
+
+
+async def _turn(sid: str, streaming: bool) -> dict:
+    """Seconds from request to first byte, first code character and last byte."""
+    headers = {"Accept": "text/event-stream"} if streaming else {}
+    body = json.dumps({"message": "make a page"})
+    request = local_runtime.Request("POST", f"https://w.dev/sessions/{sid}/messages", body, headers)
+    ctx = local_runtime.Context()
+    start = time.perf_counter()
+    resp = await worker.handle_request(request, local_runtime.ENV, ctx)
+    if not streaming:
+        done = time.perf_counter() - start
+        return {"ttfb": done, "first_code": done, "last_byte": done}
+    marks = {}
+    async for chunk in resp.body.chunks():
+        elapsed = time.perf_counter() - start
+        marks.setdefault("ttfb", elapsed)
+        if b"event: code_delta" in chunk:
+            marks.setdefault("first_code", elapsed)
+    marks["last_byte"] = time.perf_counter() - start
+    await asyncio.gather(*ctx.tasks)
+    return marks
+
+
+async def latency() -> None:
+    local_runtime.UPSTREAM = local_runtime.Upstream(_page_tokens(60), first_token_s=0.3, token_interval_s=0.002)
+    sid = await _session()
+    print(f"\nlatency, {len(local_runtime.UPSTREAM.tokens)} upstream chunks "
+          f"(300 ms to first token, 2 ms apart), ms:")
+    print(f"{'mode':10} {'TTFB':>8} {'first code':>11} {'last byte':>10}")
+    for mode, streaming in (("buffered", False), ("streaming", True)):
+        runs = [await _turn(sid, streaming) for _ in range(3)]
+        med = {k: statistics.median(r[k] for r in runs) for k in runs[0]}
+        print(f"{mode:10} {1000 * med['ttfb']:8.1f} {1000 * med['first_code']:11.1f} {1000 * med['last_byte']:10.1f}")
+
+
+async def overhead() -> None:
+    local_runtime.UPSTREAM = local_runtime.Upstream(_page_tokens(2000), first_token_s=0, token_interval_s=0)
+    chunks = len(local_runtime.UPSTREAM.tokens)
+    sid = await _session()
+    print(f"\noverhead with a zero-latency upstream ({chunks} chunks):")
+    for mode, streaming in (("buffered", False), ("streaming", True)):
+        cpu = time.process_time()
+        await _turn(sid, streaming)
+        cpu = time.process_time() - cpu
+        print(f"  {mode:10} {1000 * cpu:7.1f} ms CPU per turn, {1e6 * cpu / chunks:6.1f} µs per chunk")
+    request = local_runtime.Request("GET", "https://w.dev/health")
+    n = 20000
+    start = time.perf_counter()
+    for _ in range(n):
+        await worker.handle_request(request, local_runtime.ENV, None)
+    print(f"  GET /health dispatch: {1e6 * (time.perf_counter() - start) / n:.1f} µs per request")
+
+
+def main() -> None:
+    cold_start()
+    asyncio.run(latency())
+    asyncio.run(overhead())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Just enough of the Workers `js` module to run `worker.py` under CPython.
+
+`install()` registers a `js` module whose `fetch` is a mock OpenRouter
+upstream. The mock replies after `first_token_s` and then sends one token per
+`token_interval_s`, either as one JSON body or as SSE chunks. It also provides
+`Response`, `TransformStream` and `TextEncoder` with the call shapes the worker
+uses. The code is only for benchmarks and is never deployed.
+"""
+import asyncio
+import json
+import sys
+import types
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+
+class Upstream:
+    """Mock chat completions endpoint settings."""
+
+    def __init__(self, tokens: List[str], first_token_s: float = 0.3, token_interval_s: float = 0.005) -> None:
+        self.tokens = tokens
+        self.first_token_s = first_token_s
+        self.token_interval_s = token_interval_s
+
+
+UPSTREAM = Upstream(["```html\n", "<p>hi</p>\n", "```"])
+
+
+class _Chunk(bytes):
+    def to_bytes(self) -> bytes:  # Uint8Array proxies expose their bytes this way
+        return bytes(self)
+
+
+class _SSEReader:
+    def __init__(self, upstream: Upstream) -> None:
+        self.upstream = upstream
+        self.sent = 0
+        self.cancelled = False
+
+    async def read(self):
+        if self.cancelled or self.sent == len(self.upstream.tokens):
+            return SimpleNamespace(done=True, value=None)
+        await asyncio.sleep(self.upstream.first_token_s if self.sent == 0 else self.upstream.token_interval_s)
+        token = self.upstream.tokens[self.sent]
+        self.sent += 1
+        chunk = {"choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+        event = f"data: {json.dumps(chunk)}\n\n"
+        if self.sent == len(self.upstream.tokens):
+            event += "data: [DONE]\n\n"
+        return SimpleNamespace(done=False, value=_Chunk(event.encode("utf-8")))
+
+    async def cancel(self) -> None:
+        self.cancelled = True
+
+
+class _UpstreamResponse:
+    ok = True
+    status = 200
+
+    def __init__(self, upstream: Upstream, stream: bool) -> None:
+        self.upstream = upstream
+        self.body = SimpleNamespace(getReader=lambda: _SSEReader(upstream)) if stream else None
+
+    async def text(self) -> str:
+        u = self.upstream
+        await asyncio.sleep(u.first_token_s + u.token_interval_s * (len(u.tokens) - 1))
+        return json.dumps({"choices": [{"message": {"role": "assistant", "content": "".join(u.tokens)}}]})
+
+
+async def fetch(url: str, init: Dict[str, Any]):
+    return _UpstreamResponse(UPSTREAM, bool(json.loads(init["body"]).get("stream")))
+
+
+class _Writer:
+    def __init__(self, queue: "asyncio.Queue[Optional[bytes]]") -> None:
+        self.queue = queue
+
+    async def write(self, data: bytes) -> None:
+        self.queue.put_nowait(data)
+
+    async def close(self) -> None:
+        self.queue.put_nowait(None)
+
+
+class _Readable:
+    def __init__(self, queue: "asyncio.Queue[Optional[bytes]]") -> None:
+        self.queue = queue
+
+    async def chunks(self):
+        while True:
+            data = await self.queue.get()
+            if data is None:
+                return
+            yield data
+
+
+class TransformStream:
+    @staticmethod
+    def new():
+        queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue()
+        return SimpleNamespace(readable=_Readable(queue), writable=SimpleNamespace(getWriter=lambda: _Writer(queue)))
+
+
+class TextEncoder:
+    @staticmethod
+    def new():
+        return SimpleNamespace(encode=lambda text: text.encode("utf-8"))
+
+
+class LocalResponse:
+    def __init__(self, body, init: Dict[str, Any]) -> None:
+        self.body = body
+        self.status = init.get("status", 200)
+        self.headers = init.get("headers", {})
+
+
+class Response:
+    @staticmethod
+    def new(body, init: Dict[str, Any]) -> LocalResponse:
+        return LocalResponse(body, init)
+
+
+class Request:
+    def __init__(self, method: str, url: str, body: str = "", headers: Optional[Dict[str, str]] = None) -> None:
+        self.method = method
+        self.url = url
+        self._body = body
+        self.headers = {k.lower(): v for k, v in (headers or {}).items()}
+
+    async def text(self) -> str:
+        return self._body
+
+
+class Context:
+    def __init__(self) -> None:
+        self.tasks: list = []
+
+    def waitUntil(self, task) -> None:
+        self.tasks.append(task)
+
+
+ENV = SimpleNamespace(OPENROUTER_API_KEY="local")
+
+
+def install() -> None:
+    js = types.ModuleType("js")
+    for name in ("fetch", "Response", "TransformStream", "TextEncoder"):
+        setattr(js, name, globals()[name])
+    sys.modules["js"] = js
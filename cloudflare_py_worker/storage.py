@@ -0,0 +1,256 @@
+"""Durable session storage for the Python Worker.
+
+Sessions outlive the isolate that created them. Which backend is used
+depends on the bindings declared in `wrangler.toml`:
+
+- `SESSIONS_DB` (D1): one row per session and one per message. A turn is a
+  single `batch` (a transaction), so concurrent turns never interleave
+  partially. This is the recommended backend.
+- `SESSIONS_KV` (Workers KV): `session:<id>:code` holds the current code and
+  `session:<id>:turn:<time>` holds one key per turn. Writes are blind (no
+  read-modify-write). KV is eventually consistent across locations, so a
+  session used from two regions at once may briefly see an older page.
+- Neither: an isolate-local dict with the KV layout. It is NOT durable and is
+  only meant for `wrangler dev` and tests.
+
+`LocalD1` and `LocalKV` are stand-ins with the same call shapes as the real
+bindings, backed by sqlite3 and a dict, so every store runs outside the
+Workers runtime.
+
+The hot path (`get_code`) reads only the current code: one KV `get` or one
+D1 row. Code is zlib-compressed and base64-encoded above `COMPRESS_MIN_CHARS`
+(HTML pages shrink ~4-6x). Assistant messages are stored without their code
+block, because that code is exactly the session code stored next to them.
+"""
+import base64
+import json
+import re
+import time
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+COMPRESS_MIN_CHARS = 1024
+CODE_PLACEHOLDER = "```html\n<!-- stored as the session code -->\n```"
+
+_CODE_BLOCK = re.compile(r"```(?:html)?\n.*?```", re.DOTALL)
+
+
+def encode_text(text: str) -> str:
+    """Compact string form of `text` for KV values and D1 TEXT columns."""
+    if len(text) < COMPRESS_MIN_CHARS:
+        return "t:" + text
+    return "z:" + base64.b64encode(zlib.compress(text.encode("utf-8"), 6)).decode("ascii")
+
+
+def decode_text(value: str) -> str:
+    if value.startswith("z:"):
+        return zlib.decompress(base64.b64decode(value[2:])).decode("utf-8")
+    return value[2:]
+
+
+def compact_reply(text: str) -> str:
+    """Assistant message with its code block replaced by a placeholder."""
+    return _CODE_BLOCK.sub(lambda _: CODE_PLACEHOLDER, text, count=1)
+
+
+def _js_object(options: Dict[str, Any]):
+    """Options dict as a JS object (inside Workers), or unchanged (stand-ins)."""
+    try:
+        from js import Object  # type: ignore
+        from pyodide.ffi import to_js  # type: ignore
+    except ImportError:  # outside the Workers runtime
+        return options
+    return to_js(options, dict_converter=Object.fromEntries)
+
+
+class SessionStore(ABC):
+    """Async session storage. `get_code` returns None for an unknown session."""
+
+    async def setup(self) -> None:
+        """Prepare the backend once per isolate (e.g. create tables)."""
+
+    @abstractmethod
+    async def create(self, session_id: str) -> None: ...
+
+    @abstractmethod
+    async def get_code(self, session_id: str) -> Optional[str]: ...
+
+    @abstractmethod
+    async def append_turn(self, session_id: str, user_message: str, assistant_message: str, code: str) -> None:
+        """Record one exchange and make `code` the current code."""
+
+    @abstractmethod
+    async def history(self, session_id: str) -> List[Dict[str, str]]:
+        """Messages of a session, oldest first, as {"role", "content"} dicts."""
+
+
+class KVStore(SessionStore):
+    """Sessions in a Workers KV namespace (or anything with its get/put/list shape)."""
+
+    def __init__(self, namespace) -> None:
+        self.ns = namespace
+
+    @staticmethod
+    def _code_key(session_id: str) -> str:
+        return f"session:{session_id}:code"
+
+    async def create(self, session_id: str) -> None:
+        await self.ns.put(self._code_key(session_id), encode_text(""))
+
+    async def get_code(self, session_id: str) -> Optional[str]:
+        value = await self.ns.get(self._code_key(session_id))
+        return None if value is None else decode_text(value)
+
+    async def append_turn(self, session_id: str, user_message: str, assistant_message: str, code: str) -> None:
+        # Time-ordered key with a random suffix: appending needs no read and never collides.
+        turn_key = f"session:{session_id}:turn:{time.time_ns():020d}{uuid.uuid4().hex[:6]}"
+        turn = json.dumps({"user": user_message, "assistant": compact_reply(assistant_message)}, ensure_ascii=False)
+        await self.ns.put(turn_key, encode_text(turn))
+        await self.ns.put(self._code_key(session_id), encode_text(code))
+
+    async def history(self, session_id: str) -> List[Dict[str, str]]:
+        prefix = f"session:{session_id}:turn:"
+        names: List[str] = []
+        cursor = None
+        while True:
+            options: Dict[str, Any] = {"prefix": prefix}
+            if cursor:
+                options["cursor"] = cursor
+            page = await self.ns.list(_js_object(options))
+            names.extend(k.name for k in page.keys)
+            if page.list_complete:
+                break
+            cursor = page.cursor
+        messages: List[Dict[str, str]] = []
+        for name in sorted(names):
+            value = await self.ns.get(name)
+            if value is None:  # listed but not yet readable here (eventual consistency)
+                continue
+            turn = json.loads(decode_text(value))
+            messages.append({"role": "user", "content": turn["user"]})
+            messages.append({"role": "assistant", "content": turn["assistant"]})
+        return messages
+
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS sessions ("
+    "id TEXT PRIMARY KEY, code TEXT NOT NULL, turns INTEGER NOT NULL DEFAULT 0, updated_at INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS messages ("
+    "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+    "PRIMARY KEY (session_id, seq)) WITHOUT ROWID",
+)
+
+_INSERT_MESSAGE = "INSERT INTO messages SELECT id, turns * 2 + ?, ?, ? FROM sessions WHERE id = ?"
+
+
+class D1Store(SessionStore):
+    """Sessions in a D1 database (or `LocalD1`)."""
+
+    def __init__(self, db) -> None:
+        self.db = db
+
+    async def setup(self) -> None:
+        await self.db.batch([self.db.prepare(sql) for sql in _SCHEMA])
+
+    async def create(self, session_id: str) -> None:
+        await self.db.prepare("INSERT INTO sessions (id, code, updated_at) VALUES (?, ?, ?)").bind(
+            session_id, encode_text(""), int(time.time())
+        ).run()
+
+    async def get_code(self, session_id: str) -> Optional[str]:
+        value = await self.db.prepare("SELECT code FROM sessions WHERE id = ?").bind(session_id).first("code")
+        return None if value is None else decode_text(value)
+
+    async def append_turn(self, session_id: str, user_message: str, assistant_message: str, code: str) -> None:
+        # Message numbers come from sessions.turns inside the same transaction: no read round trip.
+        await self.db.batch(
+            [
+                self.db.prepare(_INSERT_MESSAGE).bind(0, "user", user_message, session_id),
+                self.db.prepare(_INSERT_MESSAGE).bind(1, "assistant", compact_reply(assistant_message), session_id),
+                self.db.prepare("UPDATE sessions SET code = ?, turns = turns + 1, updated_at = ? WHERE id = ?").bind(
+                    encode_text(code), int(time.time()), session_id
+                ),
+            ]
+        )
+
+    async def history(self, session_id: str) -> List[Dict[str, str]]:
+        result = await self.db.prepare(
+            "SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq"
+        ).bind(session_id).all()
+        return [{"role": row.role, "content": row.content} for row in result.results]
+
+
+class LocalKV:
+    """In-memory stand-in for a KV namespace (get / put / list by prefix)."""
+
+    def __init__(self) -> None:
+        self.data: Dict[str, str] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        return self.data.get(key)
+
+    async def put(self, key: str, value: str, options=None) -> None:
+        self.data[key] = value
+
+    async def list(self, options: Dict[str, Any]):
+        names = sorted(k for k in self.data if k.startswith(options.get("prefix", "")))
+        return SimpleNamespace(keys=[SimpleNamespace(name=n) for n in names], list_complete=True, cursor=None)
+
+
+class _LocalStatement:
+    def __init__(self, conn, sql: str, params: tuple = ()) -> None:
+        self.conn, self.sql, self.params = conn, sql, params
+
+    def bind(self, *params) -> "_LocalStatement":
+        return _LocalStatement(self.conn, self.sql, params)
+
+    def _execute(self):
+        return self.conn.execute(self.sql, self.params)
+
+    async def run(self) -> None:
+        with self.conn:
+            self._execute()
+
+    async def first(self, column: Optional[str] = None):
+        row = self._execute().fetchone()
+        if row is None:
+            return None
+        return row[column] if column is not None else SimpleNamespace(**dict(row))
+
+    async def all(self):
+        return SimpleNamespace(results=[SimpleNamespace(**dict(row)) for row in self._execute().fetchall()])
+
+
+class LocalD1:
+    """sqlite3 stand-in for a D1 binding (prepare / bind / first / all / run / batch)."""
+
+    def __init__(self, path: str = ":memory:") -> None:
+        import sqlite3  # stand-in only: keep it out of the worker's cold start
+
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+
+    def prepare(self, sql: str) -> _LocalStatement:
+        return _LocalStatement(self.conn, sql)
+
+    async def batch(self, statements: List[_LocalStatement]) -> None:
+        with self.conn:  # one transaction, like D1
+            for statement in statements:
+                statement._execute()
+
+
+_LOCAL = KVStore(LocalKV())
+
+
+def store_from_env(env) -> SessionStore:
+    """D1 if `SESSIONS_DB` is bound, else KV if `SESSIONS_KV` is, else isolate memory."""
+    db = getattr(env, "SESSIONS_DB", None)
+    if db is not None:
+        return D1Store(db)
+    kv = getattr(env, "SESSIONS_KV", None)
+    if kv is not None:
+        return KVStore(kv)
+    return _LOCAL
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The worker imports its modules flat (`from storage import ...`), as the runtime does, and
+# `vibe_core` from the backend tree (the wrangler build step copies it next to worker.py).
+_HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [_HERE, os.path.join(os.path.dirname(_HERE), "backend")]
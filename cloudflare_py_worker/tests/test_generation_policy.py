@@ -0,0 +1,93 @@
+"""The backend and the worker accept and reject the same replies (`vibe_core.extract.page_code`)."""
+import asyncio
+import json
+
+import pytest
+
+from benchmarks import local_runtime
+
+local_runtime.install()
+
+import worker  # noqa: E402  (needs the `js` module installed above)
+
+PAGE = "<html>\n<body>\n<p>hi</p>\n</body>\n</html>"
+REPLIES = {
+    "fenced": (f"Here it is:\n```html\n{PAGE}\n```\nEnjoy.", PAGE),
+    "cut_off": ("```html\n<html>\n<body>\n<p>h", "<html>\n<body>\n<p>h"),
+    "refusal": ("Sorry, I can't help with that.", None),
+    "empty_fence": ("```html\n\n```", None),
+}
+
+
+class _Reply:
+    def __init__(self, content: str) -> None:
+        self.content = content
+        self.response_metadata = {"finish_reason": "stop"}
+
+
+class _FixedLLM:
+    def __init__(self, content: str) -> None:
+        self.content = content
+
+    async def ainvoke(self, messages):
+        return _Reply(self.content)
+
+    async def astream(self, messages):
+        yield _Reply(self.content)
+
+
+def _backend_turn(monkeypatch, reply: str, streaming: bool) -> tuple[int, dict]:
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.services import llm as llm_service
+
+    monkeypatch.setattr(llm_service, "build_llm", lambda model_name: _FixedLLM(reply))
+    client = TestClient(app)
+    sid = client.post("/sessions").json()["session_id"]
+    headers = {"Accept": "text/event-stream"} if streaming else {}
+    r = client.post(f"/sessions/{sid}/messages", json={"message": "make a page", "cache": False}, headers=headers)
+    return r.status_code, _outcome(r.text, streaming) | {"stored": client.get(f"/sessions/{sid}/code").json()["code"]}
+
+
+def _worker_turn(reply: str, streaming: bool) -> tuple[int, dict]:
+    local_runtime.UPSTREAM = local_runtime.Upstream([reply], first_token_s=0, token_interval_s=0)
+
+    async def scenario():
+        env, ctx = local_runtime.ENV, local_runtime.Context()
+        created = await worker.handle_request(local_runtime.Request("POST", "https://w.dev/sessions"), env, ctx)
+        sid = json.loads(created.body)["session_id"]
+        headers = {"Accept": "text/event-stream"} if streaming else {}
+        body = json.dumps({"message": "make a page"})
+        request = local_runtime.Request("POST", f"https://w.dev/sessions/{sid}/messages", body, headers)
+        resp = await worker.handle_request(request, env, ctx)
+        text = b"".join([c async for c in resp.body.chunks()]).decode() if streaming else resp.body
+        await asyncio.gather(*ctx.tasks)
+        code = await worker.handle_request(local_runtime.Request("GET", f"https://w.dev/sessions/{sid}/code"), env, ctx)
+        return resp.status, _outcome(text, streaming) | {"stored": json.loads(code.body)["code"]}
+
+    return asyncio.run(scenario())
+
+
+def _outcome(text: str, streaming: bool) -> dict:
+    """The code a turn returned, or its error detail."""
+    if not streaming:
+        body = json.loads(text)
+        return {"code": body.get("code"), "error": body.get("detail")}
+    events = [json.loads(block.split("data: ", 1)[1]) for block in text.strip().split("\n\n")]
+    codes = [e["code"] for e in events if e["type"] == "code"]
+    errors = [e["detail"] for e in events if e["type"] == "error"]
+    return {"code": codes[0] if codes else None, "error": errors[0] if errors else None}
+
+
+@pytest.mark.parametrize("streaming", [False, True], ids=["buffered", "sse"])
+@pytest.mark.parametrize("name", REPLIES)
+def test_both_runtimes_apply_the_same_page_policy(name, streaming, monkeypatch):
+    reply, page = REPLIES[name]
+    results = {"backend": _backend_turn(monkeypatch, reply, streaming), "worker": _worker_turn(reply, streaming)}
+    for runtime, (status, outcome) in results.items():
+        if page is None:
+            assert outcome["error"] == "invalid_generation", runtime
+            assert status == (200 if streaming else 502) and outcome["stored"] == "", runtime
+        else:
+            assert status == 200 and outcome["code"] == outcome["stored"] == page, runtime
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from storage import CODE_PLACEHOLDER, D1Store, KVStore, LocalD1, LocalKV, SessionStore, decode_text, encode_text
+
+PAGE = "<html>\n<body>\n" + "  <p>filler paragraph</p>\n" * 200 + "</body>\n</html>"
+
+
+@pytest.fixture(params=["kv", "d1"])
+def store(request, tmp_path):
+    if request.param == "kv":
+        return KVStore(LocalKV())
+    s = D1Store(LocalD1(str(tmp_path / "sessions.db")))
+    asyncio.run(s.setup())
+    return s
+
+
+def test_codec_round_trips_and_compresses():
+    assert encode_text("short") == "t:short"
+    encoded = encode_text(PAGE)
+    assert encoded.startswith("z:") and len(encoded) * 4 < len(PAGE)
+    assert decode_text(encoded) == PAGE and decode_text(encode_text("")) == ""
+
+
+def test_session_lifecycle(store):
+    async def scenario():
+        assert await store.get_code("missing") is None
+        await store.create("s1")
+        assert await store.get_code("s1") == ""
+        await store.append_turn("s1", "make a page", f"Here it is:\n```html\n{PAGE}\n```\nEnjoy.", PAGE)
+        await store.append_turn("s1", "make it blue", "```html\n<p>blue</p>\n```", "<p>blue</p>")
+        return await store.get_code("s1"), await store.history("s1")
+
+    code, history = asyncio.run(scenario())
+    assert code == "<p>blue</p>"
+    assert [m["role"] for m in history] == ["user", "assistant", "user", "assistant"]
+    assert history[0]["content"] == "make a page" and history[2]["content"] == "make it blue"
+    # The code is stored once, as the session code, not again inside the reply.
+    assert history[1]["content"] == f"Here it is:\n{CODE_PLACEHOLDER}\nEnjoy."
+
+
+def test_d1_sessions_survive_a_new_isolate(tmp_path):
+    path = str(tmp_path / "sessions.db")
+
+    async def first_isolate():
+        s = D1Store(LocalD1(path))
+        await s.setup()
+        await s.create("s1")
+        await s.append_turn("s1", "hi", "```html\n<p>x</p>\n```", "<p>x</p>")
+
+    async def second_isolate():
+        s = D1Store(LocalD1(path))
+        await s.setup()  # idempotent
+        return await s.get_code("s1"), len(await s.history("s1"))
+
+    asyncio.run(first_isolate())
+    assert asyncio.run(second_isolate()) == ("<p>x</p>", 2)
+
+
+def test_incomplete_store_fails_at_construction():
+    class CodeOnly(SessionStore):
+        async def get_code(self, session_id):
+            return None
+
+    with pytest.raises(TypeError, match="append_turn"):
+        CodeOnly()
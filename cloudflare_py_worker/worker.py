@@ -2,49 +2,48 @@
 
 Disclaimer:
  1. Python Workers are in beta; APIs / flags may change. Validate with current Cloudflare docs.
- 2. Global in‑memory dict `SESSIONS` is NOT durable across isolates / deployments / evictions.
-    For production use Durable Objects / KV / D1.
+ 2. Sessions live in D1 or KV when bound (see `storage.py`); without a binding they fall back
+    to isolate memory, which is NOT durable across isolates / deployments / evictions.
  3. Avoid large third‑party libraries (e.g. full LangChain) due to bundle size & cold start.
- 4. This keeps only minimal logic: prompt assembly, OpenRouter call, diff.
+ 4. This keeps only minimal logic: prompt assembly, OpenRouter call, diff. Prompts, code
+    extraction, the diff engine and SSE framing come from `vibe_core`, shared with the FastAPI
+    backend (copied next to this file by the `[build]` step in wrangler.toml).
+ 5. `POST /sessions/{id}/messages` with `Accept: text/event-stream` streams the reply as it is
+    generated (see `_stream_reply`); otherwise the full completion is awaited, as before.
 """
-import json, uuid, re, difflib
+import asyncio, json, uuid, re
 from typing import Any, Dict
+from urllib.parse import urlsplit
 
-# NOTE: Python Worker provides `fetch` / `Response` / `Request` objects from JS via polyglot.
-from js import fetch, Response  # type: ignore
+from storage import SessionStore, store_from_env
+from vibe_core import prompts
+from vibe_core.extract import CodeStreamParser, InvalidGeneration, page_code
+from vibe_core.sse import SSEDecoder, completion_delta, sse_event
 
-SYSTEM_PROMPT = (
-    "You are an AI coding assistant that generates or updates a single self-contained web page.\n"
-    "Return FULL updated index.html each time inside one fenced code block. Include HTML, minimal CSS, and JavaScript in one file.\n"
-    "If user asks for a change, apply it to existing code while preserving prior content unless explicitly removed.\n"
-    "Only output the raw code block – no commentary unless user asks for explanation."
-)
+# NOTE: Python Worker provides `fetch` / `Response` / `Request` objects from JS via polyglot.
+from js import fetch, Response, TextEncoder, TransformStream  # type: ignore
 
-USER_TEMPLATE = (
-    "User request:\n{message}\n\n"
-    "Existing code (may be empty):\n```html\n{existing}\n```\n\n"
-    "Return ONLY the new full file in a fenced code block."
-)
+_STORE: SessionStore | None = None
 
-SESSIONS: Dict[str, Dict[str, Any]] = {}
 
+async def get_store(env) -> SessionStore:
+    """The session store for this isolate's bindings, set up on first use."""
+    global _STORE
+    if _STORE is None:
+        store = store_from_env(env)
+        await store.setup()
+        _STORE = store
+    return _STORE
 
-def unified_diff(old: str, new: str, filename: str = "index.html") -> str:
-    old_lines = old.splitlines(keepends=True)
-    new_lines = new.splitlines(keepends=True)
-    diff = difflib.unified_diff(old_lines, new_lines, fromfile=f"a/{filename}", tofile=f"b/{filename}", lineterm="")
-    return "\n".join(diff)
 
+def unified_diff(old: str, new: str) -> str:
+    from vibe_core.diff import unified_diff as diff  # only turns that return a diff load the engine
 
-def extract_code_block(text: str) -> str:
-    pattern = re.compile(r"```(?:html)?\n(.*?)(?:```)", re.DOTALL)
-    m = pattern.search(text)
-    if m:
-        return m.group(1).strip()
-    return text.strip()
+    return diff(old, new)
 
 
-async def call_openrouter(env, existing: str, user_message: str) -> tuple[str, str]:
+def _llm_request(env, existing: str, user_message: str, stream: bool = False) -> tuple[str, Dict[str, Any]]:
+    """URL and fetch() init of a chat completion call."""
     model = getattr(env, "MODEL", "deepseek/deepseek-chat-v3-0324")
     base_url = getattr(env, "OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
     api_key = getattr(env, "OPENROUTER_API_KEY", None)
@@ -53,37 +52,48 @@ async def call_openrouter(env, existing: str, user_message: str) -> tuple[str, s
     temperature = float(getattr(env, "TEMPERATURE", "0.2"))
     max_tokens = int(getattr(env, "GENERATION_MAX_TOKENS", "2000"))
 
+    system = prompts.SYSTEM_PROMPTS.get(getattr(env, "PROMPT_VARIANT", "full"), prompts.SYSTEM_PROMPT)
+    # Same layout as the backend: stable prefix (system prompt, existing code) first for prompt caching.
+    user = prompts.CODE_BLOCK_TEMPLATE.format(existing_code=existing) + prompts.USER_INSTRUCTION_TEMPLATE.format(message=user_message)
     payload = {
         "model": model,
         "messages": [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": USER_TEMPLATE.format(message=user_message, existing=existing)},
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
         ],
         "temperature": temperature,
         "max_tokens": max_tokens,
     }
+    if stream:
+        payload["stream"] = True
 
-    resp = await fetch(
-        f"{base_url}/chat/completions",
-        {
-            "method": "POST",
-            "headers": {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json",
-                # OpenRouter optional attribution headers
-                "HTTP-Referer": "https://vibe-coding-worker.example",
-                "X-Title": "Vibe Coding Python Worker",
-            },
-            "body": json.dumps(payload),
+    return f"{base_url}/chat/completions", {
+        "method": "POST",
+        "headers": {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            # OpenRouter optional attribution headers
+            "HTTP-Referer": "https://vibe-coding-worker.example",
+            "X-Title": "Vibe Coding Python Worker",
         },
-    )
+        "body": json.dumps(payload),
+    }
+
+
+async def _fetch_llm(env, existing: str, user_message: str, stream: bool = False):
+    resp = await fetch(*_llm_request(env, existing, user_message, stream))
     if not resp.ok:
         status = resp.status
         txt = await resp.text()
         if status == 403 and ("permission" in txt.lower() or "forbidden" in txt.lower()):
             raise PermissionError("llm_permission_denied")
         raise RuntimeError(f"LLM error {status}: {txt}")
+    return resp
 
+
+async def call_openrouter(env, existing: str, user_message: str) -> tuple[str, str]:
+    """(reply, page); raises `InvalidGeneration` for a reply without a page, as the backend does."""
+    resp = await _fetch_llm(env, existing, user_message)
     text_data = await resp.text()
     try:
         data = json.loads(text_data)
@@ -91,73 +101,158 @@ async def call_openrouter(env, existing: str, user_message: str) -> tuple[str, s
         raise RuntimeError("Invalid JSON from LLM")
 
     content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-    code = extract_code_block(content)
-    return content, code
+    return content, page_code(content)
+
+
+CORS_HEADERS = {"Access-Control-Allow-Origin": "*", "Access-Control-Allow-Headers": "*", "Access-Control-Allow-Methods": "GET,POST,OPTIONS"}
 
 
 def json_response(obj: Any, status: int = 200, headers: Dict[str, str] | None = None):
-    base = {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*", "Access-Control-Allow-Headers": "*", "Access-Control-Allow-Methods": "GET,POST,OPTIONS"}
+    base = {"Content-Type": "application/json", **CORS_HEADERS}
     if headers:
         base.update(headers)
     return Response.new(json.dumps(obj), {"status": status, "headers": base})
 
 
+async def _stream_reply(upstream, writer, store: SessionStore, sid: str, previous_code: str, user_msg: str, with_diff: bool):
+    """Pipe upstream SSE chunks to the client as backend-style events, then persist the turn.
+
+    One upstream read becomes at most one `token` and one `code_delta` event. If the
+    client goes away (a write fails) the upstream body is cancelled and nothing is stored.
+    """
+    encoder = TextEncoder.new()
+    reader = upstream.body.getReader()
+    decoder, parser = SSEDecoder(), CodeStreamParser()
+    parts: list[str] = []
+
+    async def send(event: dict) -> None:
+        await writer.write(encoder.encode(sse_event(event)))
+
+    try:
+        await send({"type": "ack"})
+        while True:
+            chunk = await reader.read()
+            if chunk.done:
+                break
+            text = ""
+            for payload in decoder.feed(chunk.value.to_bytes()):
+                if payload != "[DONE]":
+                    text += completion_delta(payload)[0]
+            if not text:
+                continue
+            parts.append(text)
+            await send({"type": "token", "text": text})
+            code_delta = parser.feed(text)
+            if code_delta:
+                await send({"type": "code_delta", "text": code_delta})
+        assistant_text = "".join(parts)
+        new_code = page_code(assistant_text)
+        await store.append_turn(sid, user_msg, assistant_text, new_code)
+        await send({"type": "assistant_message_complete", "raw": assistant_text})
+        await send({"type": "code", "code": new_code})
+        if with_diff:
+            await send({"type": "diff", "diff": unified_diff(previous_code, new_code)})
+        await send({"type": "final"})
+    except Exception as e:  # upstream error mid-stream, or the client disconnected
+        try:
+            await reader.cancel()
+            detail = "invalid_generation" if isinstance(e, InvalidGeneration) else str(e)
+            await send({"type": "error", "detail": detail})
+        except Exception:
+            pass
+    finally:
+        try:
+            await writer.close()
+        except Exception:
+            pass
+
+
+async def health(request, env, ctx):
+    return json_response({"status": "ok"})
+
+
+async def create_session(request, env, ctx):
+    store = await get_store(env)
+    sid = str(uuid.uuid4())
+    await store.create(sid)
+    return json_response({"session_id": sid})
+
+
+async def get_code(request, env, ctx, store: SessionStore, sid: str, previous_code: str):
+    return json_response({"code": previous_code})
+
+
+async def post_message(request, env, ctx, store: SessionStore, sid: str, previous_code: str):
+    body_text = await request.text()
+    try:
+        payload = json.loads(body_text)
+    except Exception:
+        return json_response({"detail": "invalid_json"}, 400)
+    user_msg = (payload.get("message") or "").strip()
+    if not user_msg:
+        return json_response({"detail": "empty_message"}, 400)
+    with_diff = payload.get("diff", True) is not False
+    streaming = "text/event-stream" in (request.headers.get("accept") or "")
+    try:
+        if streaming:
+            # Upstream status errors still get a plain JSON error; only the body is streamed.
+            upstream = await _fetch_llm(env, previous_code, user_msg, stream=True)
+        else:
+            assistant_text, new_code = await call_openrouter(env, previous_code, user_msg)
+    except PermissionError:
+        return json_response({"detail": "llm_permission_denied"}, 403)
+    except InvalidGeneration:  # no fenced code block: keep the current page
+        return json_response({"detail": "invalid_generation"}, 502)
+    except Exception as e:  # other runtime errors
+        return json_response({"detail": str(e)}, 500)
+    if streaming:
+        stream = TransformStream.new()
+        task = asyncio.ensure_future(
+            _stream_reply(upstream, stream.writable.getWriter(), store, sid, previous_code, user_msg, with_diff)
+        )
+        ctx.waitUntil(task)  # keep the isolate alive until the turn is persisted
+        headers = {"Content-Type": "text/event-stream", "Cache-Control": "no-cache", **CORS_HEADERS}
+        return Response.new(stream.readable, {"status": 200, "headers": headers})
+    await store.append_turn(sid, user_msg, assistant_text, new_code)
+    return json_response({
+        "assistant_message": assistant_text,
+        "code": new_code,
+        "diff": unified_diff(previous_code, new_code) if with_diff else None,
+    })
+
+
+# Route table, built once per isolate: path -> {method: handler}. Session routes
+# receive the store, the session id and the current code (404 if unknown).
+_ROUTES = {"/health": {"GET": health}, "/sessions": {"POST": create_session}}
+_SESSION_ROUTES = {"code": {"GET": get_code}, "messages": {"POST": post_message}}
+_SESSION_PATH = re.compile(r"/sessions/([^/]+)/(code|messages)")
+
+
 async def handle_request(request, env, ctx):  # noqa: D401
     method = request.method
-    url = request.url  # string
 
     # Preflight CORS
     if method == "OPTIONS":
         return json_response({}, 204)
 
-    # Basic path parse (no query needed here)
-    from urllib.parse import urlparse
-    path = urlparse(url).path.rstrip("/") or "/"
-
-    if path == "/health":
-        return json_response({"status": "ok"})
-
-    if path == "/sessions" and method == "POST":
-        sid = str(uuid.uuid4())
-        SESSIONS[sid] = {"id": sid, "messages": [], "code": ""}
-        return json_response({"session_id": sid})
-
-    # /sessions/{id}/code or /sessions/{id}/messages
-    parts = path.split("/")
-    if len(parts) >= 3 and parts[1] == "sessions":
-        sid = parts[2]
-        session = SESSIONS.get(sid)
-        if not session:
-            return json_response({"detail": "session_not_found"}, 404)
-        if len(parts) == 4 and parts[3] == "code" and method == "GET":
-            return json_response({"code": session.get("code") or ""})
-        if len(parts) == 4 and parts[3] == "messages" and method == "POST":
-            body_text = await request.text()
-            try:
-                payload = json.loads(body_text)
-            except Exception:
-                return json_response({"detail": "invalid_json"}, 400)
-            user_msg = (payload.get("message") or "").strip()
-            if not user_msg:
-                return json_response({"detail": "empty_message"}, 400)
-            previous_code = session.get("code") or ""
-            try:
-                assistant_text, new_code = await call_openrouter(env, previous_code, user_msg)
-            except PermissionError:
-                return json_response({"detail": "llm_permission_denied"}, 403)
-            except Exception as e:  # other runtime errors
-                return json_response({"detail": str(e)}, 500)
-            session["messages"].append({"role": "user", "content": user_msg})
-            session["messages"].append({"role": "assistant", "content": assistant_text})
-            session["code"] = new_code
-            diff_txt = unified_diff(previous_code, new_code)
-            return json_response({
-                "assistant_message": assistant_text,
-                "code": new_code,
-                "diff": diff_txt,
-            })
-
-    return json_response({"detail": "not_found"}, 404)
+    path = urlsplit(request.url).path.rstrip("/") or "/"
+    routes = _ROUTES.get(path)
+    if routes is not None:
+        handler = routes.get(method)
+        if handler is not None:
+            return await handler(request, env, ctx)
+        return json_response({"detail": "not_found"}, 404)
+
+    m = _SESSION_PATH.fullmatch(path)
+    handler = _SESSION_ROUTES[m.group(2)].get(method) if m else None
+    if handler is None:
+        return json_response({"detail": "not_found"}, 404)
+    sid = m.group(1)
+    store = await get_store(env)
+    previous_code = await store.get_code(sid)  # the only read on the hot path
+    if previous_code is None:
+        return json_response({"detail": "session_not_found"}, 404)
+    return await handler(request, env, ctx, store, sid, previous_code)
 
 
 # Entry point expected by Python Worker runtime (beta names may differ)